@@ -2,6 +2,59 @@ import { join } from "node:path";
 import * as ort from "onnxruntime-node";
 import registryData from "../registry.json";
 
+// Set MODEL_FORMAT=onnx to always load model.onnx
+const preferOrt = process.env.MODEL_FORMAT !== "onnx";
+
+type OrtMetadata = {
+	sourceSha256: string;
+	ortSha256: string;
+};
+
+function ortPathOf(modelPath: string) {
+	return modelPath.replace(/\.onnx$/, ".ort");
+}
+
+function sha256(data: ArrayBuffer) {
+	return new Bun.CryptoHasher("sha256").update(data).digest("hex");
+}
+
+// model.ort is model.onnx pre-optimized at build time (see
+// examples/adult-income/ort_export.py). It is used only if model.ort.json
+// ties it to these exact model.onnx bytes.
+async function loadOptimized(
+	modelPath: string,
+	modelBuffer: ArrayBuffer,
+): Promise<ort.InferenceSession | null> {
+	const ortPath = ortPathOf(modelPath);
+	const metadataFile = Bun.file(`${ortPath}.json`);
+	if (!preferOrt || ortPath === modelPath || !(await metadataFile.exists())) {
+		return null;
+	}
+	try {
+		const metadata = (await metadataFile.json()) as OrtMetadata;
+		if (sha256(modelBuffer) !== metadata.sourceSha256) {
+			console.warn(
+				`${ortPath} was built from another model.onnx, using ${modelPath}`,
+			);
+			return null;
+		}
+		const ortBuffer = await Bun.file(ortPath).arrayBuffer();
+		if (sha256(ortBuffer) !== metadata.ortSha256) {
+			console.warn(
+				`${ortPath} does not match its metadata, using ${modelPath}`,
+			);
+			return null;
+		}
+		// Already optimized offline; don't repeat it at startup
+		return await ort.InferenceSession.create(ortBuffer, {
+			graphOptimizationLevel: "disabled",
+		});
+	} catch (err) {
+		console.warn(`Could not load ${ortPath}, using ${modelPath}:`, err);
+		return null;
+	}
+}
+
 // Models keyed by numeric ID, with hash lookup
 export type ModelRegistry = {
 	sessions: Map<number, ort.InferenceSession>;
@@ -15,9 +68,14 @@ export async function loadAllModels(): Promise<ModelRegistry> {
 	async function loadModel(modelId: number, modelPath: string) {
 		const modelFile = Bun.file(modelPath);
 		const modelBuffer = await modelFile.arrayBuffer();
-		const session = await ort.InferenceSession.create(modelBuffer);
+		const started = performance.now();
+		const optimized = await loadOptimized(modelPath, modelBuffer);
+		const session =
+			optimized ?? (await ort.InferenceSession.create(modelBuffer));
 		sessions.set(modelId, session);
-		console.log(`Loaded model ${modelId} from ${modelPath}`);
+		const loadedFrom = optimized ? ortPathOf(modelPath) : modelPath;
+		const ms = (performance.now() - started).toFixed(1);
+		console.log(`Loaded model ${modelId} from ${loadedFrom} (${ms}ms)`);
 	}
 
 	// Try production path first, fallback to dev
@@ -0,0 +1,134 @@
+"""Benchmark: in-memory LabelEncoder path vs the streaming encoder.
+
+Builds a scaled-up copy of dataset.csv (rows are tiled, so the vocabulary is
+unchanged), then encodes it once with the original pandas/LabelEncoder code and
+once per chunk size with `encoding.py`. Every run happens in a fresh child
+process so the reported peak RSS belongs to that run alone.
+
+    uv run bench_encoding.py --rows 3000000 --chunk-sizes 50000 200000
+"""
+import argparse
+import json
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from build import hash_file
+
+CATEGORICAL_COLS = ['workclass', 'education', 'marital.status', 'occupation',
+                    'relationship', 'race', 'sex', 'native.country']
+TARGET = 'income'
+
+
+def make_dataset(src, dst, rows):
+    with open(src) as f:
+        header = f.readline()
+        body = f.readlines()
+    with open(dst, 'w') as out:
+        out.write(header)
+        written = 0
+        while written < rows:
+            take = body[:rows - written]
+            out.writelines(take)
+            written += len(take)
+
+
+def run_legacy(src, dst):
+    # The encoding block main.py used before the streaming encoder
+    import pandas as pd
+    from sklearn.preprocessing import LabelEncoder
+
+    data = pd.read_csv(src, sep=',', quotechar='"')
+    X = data.drop(TARGET, axis=1)
+    y = (data[TARGET] == '>50K').astype(int)
+    for col in CATEGORICAL_COLS:
+        le = LabelEncoder()
+        X[col] = le.fit_transform(X[col].astype(str))
+    X[TARGET] = y
+    for col in X.columns:
+        X[col] = X[col].astype(int)
+    X.to_csv(dst, index=False)
+    return len(X)
+
+
+def run_stream(src, dst, chunk_size):
+    from encoding import build_vocabulary, encode_csv
+
+    vocab = build_vocabulary(src, CATEGORICAL_COLS, TARGET, chunk_size)
+    stats = encode_csv(src, dst, vocab, TARGET, '>50K', chunk_size=chunk_size)
+    return stats['written']
+
+
+def peak_rss_mb():
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is KiB on Linux and bytes on macOS
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+
+def worker(mode, src, dst, chunk_size):
+    start = time.perf_counter()
+    rows = run_legacy(src, dst) if mode == 'legacy' else run_stream(src, dst, chunk_size)
+    seconds = time.perf_counter() - start
+    print(json.dumps({'rows': rows, 'seconds': seconds, 'peakRssMb': peak_rss_mb()}))
+
+
+def spawn(mode, src, dst, chunk_size=0):
+    out = subprocess.run(
+        [sys.executable, __file__, '--worker', mode, '--src', str(src), '--dst', str(dst),
+         '--chunk-size', str(chunk_size)],
+        check=True, capture_output=True, text=True,
+    )
+    result = json.loads(out.stdout.strip().splitlines()[-1])
+    result['mode'] = mode if mode == 'legacy' else f'stream/{chunk_size}'
+    result['rowsPerSec'] = result['rows'] / result['seconds']
+    result['sha256'] = hash_file(dst)
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=1_000_000)
+    parser.add_argument('--chunk-sizes', type=int, nargs='+', default=[20_000, 100_000, 500_000])
+    parser.add_argument('--skip-legacy', action='store_true', help="skip the in-memory baseline (e.g. when it would not fit)")
+    parser.add_argument('--json', help="write the results to this file")
+    parser.add_argument('--worker', choices=['legacy', 'stream'], help=argparse.SUPPRESS)
+    parser.add_argument('--src', help=argparse.SUPPRESS)
+    parser.add_argument('--dst', help=argparse.SUPPRESS)
+    parser.add_argument('--chunk-size', type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        worker(args.worker, args.src, args.dst, args.chunk_size)
+        return
+
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp = Path(tmp)
+        src = tmp / 'dataset.csv'
+        make_dataset(Path(__file__).with_name('dataset.csv'), src, args.rows)
+        print(f"Benchmark dataset: {args.rows:,} rows, {src.stat().st_size / 1e6:.1f} MB\n")
+
+        results = []
+        if not args.skip_legacy:
+            results.append(spawn('legacy', src, tmp / 'legacy.csv'))
+        for chunk_size in args.chunk_sizes:
+            results.append(spawn('stream', src, tmp / f'stream_{chunk_size}.csv', chunk_size))
+
+    print(f"{'mode':<16}{'rows/sec':>14}{'seconds':>10}{'peak RSS (MB)':>16}")
+    for r in results:
+        print(f"{r['mode']:<16}{r['rowsPerSec']:>14,.0f}{r['seconds']:>10.2f}{r['peakRssMb']:>16.1f}")
+
+    if len({r['sha256'] for r in results}) > 1:
+        print("\nWARNING: encoded outputs differ between modes")
+    else:
+        print("\nAll modes produced byte-identical dataset_encoded.csv")
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({'rows': args.rows, 'results': results}, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,401 @@
+"""Load generator and latency benchmark for the provider server (apps/server).
+
+Sends real feature vectors to POST /predict: rows sampled from
+calibration_dataset.csv, with every categorical code checked against
+label_encoders.json. Each query runs through the server's whole path: ONNX
+inference, the zkfair_query_logs insert, the batching check and the signed
+receipt. Two ways to drive the server:
+
+- open loop (`--qps`): requests start on a fixed schedule (or Poisson with
+  `--arrivals poisson`) whether or not earlier ones have returned. Latency is
+  measured from the scheduled start, so time spent waiting for a connection
+  counts, and a stalled server can't hide its backlog.
+- closed loop (`--concurrency`): N clients each send their next request as soon
+  as the previous one returns. This measures peak throughput.
+
+After the run, the benchmark reads the server's SQLite database. For every
+served query it measures the time from the query's timestamp to the
+committedAt of its zkfair_batches row. With `--force-commit` it calls POST
+/demo/commit-batch until every query is batched, instead of waiting for the
+size or age trigger. Results, including the git commit, are written as JSON.
+`--compare` prints the change against an earlier result file.
+
+    cd ../../apps/server && bun start                           # PRIVATE_KEY=... in the environment
+    uv run bench_load.py --qps 50 --duration 30
+    uv run bench_load.py --concurrency 16 --duration 30 --force-commit
+    uv run bench_load.py --qps 50 --compare .build/bench/load_3f2a9c1.json
+"""
+import argparse
+import asyncio
+import json
+import random
+import sqlite3
+import subprocess
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from urllib.parse import urlsplit
+
+import numpy as np
+
+from build import write_json
+
+SERVER_DIR = Path(__file__).resolve().parents[2] / 'apps' / 'server'
+PERCENTILES = (50, 95, 99)
+
+
+def load_samples(calibration_path, encoders_path) -> tuple[list[str], np.ndarray]:
+    """Feature rows (label dropped) of the calibration set, restricted to codes label_encoders.json knows."""
+    import pandas as pd
+
+    df = pd.read_csv(calibration_path)
+    with open(encoders_path) as f:
+        encoders = json.load(f)
+    valid = np.ones(len(df), dtype=bool)
+    for column, mapping in encoders.items():
+        if column in df.columns:
+            valid &= df[column].isin(list(mapping.values())).to_numpy()
+    if not valid.all():
+        print(f" Skipping {int((~valid).sum())} rows with codes missing from {encoders_path}")
+    # The label is the last column of every encoded CSV
+    features = df.iloc[:, :-1][valid]
+    return list(features.columns), features.to_numpy(dtype=np.float64)
+
+
+def model_hash(name: str, registry_path) -> str:
+    """The weights hash /predict expects, from the server's registry.json."""
+    with open(registry_path) as f:
+        registry = json.load(f)
+    for entry in registry['models']:
+        if entry['name'] == name:
+            return entry['hash']
+    raise SystemExit(f"Model {name!r} is not in {registry_path}")
+
+
+class HttpConnection:
+    """A minimal keep-alive HTTP/1.1 client connection (JSON bodies, Content-Length or chunked replies)."""
+
+    def __init__(self, host: str, port: int):
+        self.host, self.port = host, port
+        self.reader = self.writer = None
+
+    async def request(self, method: str, path: str, body=None) -> tuple[int, bytes]:
+        if self.writer is None:
+            self.reader, self.writer = await asyncio.open_connection(self.host, self.port)
+        payload = b'' if body is None else json.dumps(body, separators=(',', ':')).encode()
+        head = (f"{method} {path} HTTP/1.1\r\nHost: {self.host}:{self.port}\r\n"
+                f"Content-Type: application/json\r\nContent-Length: {len(payload)}\r\n\r\n")
+        try:
+            self.writer.write(head.encode() + payload)
+            await self.writer.drain()
+            return await self._read_response()
+        except BaseException:
+            # A half-read reply would corrupt the next request on this connection
+            self.close()
+            raise
+
+    async def _read_response(self) -> tuple[int, bytes]:
+        status_line = await self.reader.readline()
+        if not status_line:
+            raise ConnectionError("server closed the connection")
+        status = int(status_line.split()[1])
+        headers = {}
+        while (line := await self.reader.readline()) not in (b'\r\n', b''):
+            key, _, value = line.decode('latin-1').partition(':')
+            headers[key.strip().lower()] = value.strip()
+        if headers.get('transfer-encoding', '').lower() == 'chunked':
+            body = b''
+            while size := int((await self.reader.readline()).split(b';')[0], 16):
+                body += await self.reader.readexactly(size)
+                await self.reader.readline()
+            await self.reader.readline()
+        else:
+            body = await self.reader.readexactly(int(headers.get('content-length', 0)))
+        if headers.get('connection', '').lower() == 'close':
+            self.close()
+        return status, body
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+        self.reader = self.writer = None
+
+
+@dataclass
+class Sample:
+    start: float  # perf_counter() of the scheduled (open loop) or actual (closed loop) start
+    latency: float | None = None
+    status: int | None = None
+    error: str | None = None
+    seq: int | None = None
+
+
+class LoadGenerator:
+    def __init__(self, url: str, model_hash: str, features: np.ndarray, connections: int, timeout: float,
+                 seed: int):
+        parts = urlsplit(url)
+        self.host, self.port = parts.hostname, parts.port or 80
+        self.model_hash = model_hash
+        self.features = features
+        self.timeout = timeout
+        self.rng = random.Random(seed)
+        self.pool: asyncio.Queue = asyncio.Queue()
+        for _ in range(connections):
+            self.pool.put_nowait(HttpConnection(self.host, self.port))
+
+    async def get(self, path: str) -> dict:
+        conn = HttpConnection(self.host, self.port)
+        try:
+            status, body = await asyncio.wait_for(conn.request('GET', path), self.timeout)
+        finally:
+            conn.close()
+        if status != 200:
+            raise RuntimeError(f"GET {path} returned {status}: {body[:200]!r}")
+        return json.loads(body)
+
+    async def post(self, path: str, body=None) -> tuple[int, bytes]:
+        conn = await self.pool.get()
+        try:
+            return await asyncio.wait_for(conn.request('POST', path, body), self.timeout)
+        finally:
+            self.pool.put_nowait(conn)
+
+    async def query(self, start: float) -> Sample:
+        sample = Sample(start)
+        row = self.features[self.rng.randrange(len(self.features))]
+        try:
+            status, body = await self.post('/predict', {'modelHash': self.model_hash, 'input': row.tolist()})
+            sample.status = status
+            if status == 200:
+                sample.seq = json.loads(body)['receipt']['seqNum']
+            else:
+                sample.error = f"HTTP {status}"
+        except asyncio.TimeoutError:
+            sample.error = 'timeout'
+        except (OSError, ConnectionError, asyncio.IncompleteReadError, ValueError, KeyError) as e:
+            sample.error = type(e).__name__
+        sample.latency = time.perf_counter() - start
+        return sample
+
+    async def open_loop(self, qps: float, duration: float, arrivals: str) -> list[Sample]:
+        tasks = []
+        begin = time.perf_counter()
+        t = 0.0
+        while t < duration:
+            delay = begin + t - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            tasks.append(asyncio.create_task(self.query(begin + t)))
+            t += self.rng.expovariate(qps) if arrivals == 'poisson' else 1 / qps
+        return list(await asyncio.gather(*tasks))
+
+    async def closed_loop(self, concurrency: int, duration: float) -> list[Sample]:
+        end = time.perf_counter() + duration
+
+        async def client():
+            samples = []
+            while time.perf_counter() < end:
+                samples.append(await self.query(time.perf_counter()))
+            return samples
+
+        per_client = await asyncio.gather(*(client() for _ in range(concurrency)))
+        return sorted((s for samples in per_client for s in samples), key=lambda s: s.start)
+
+    def close(self):
+        while not self.pool.empty():
+            self.pool.get_nowait().close()
+
+
+def percentiles_ms(seconds) -> dict:
+    if len(seconds) == 0:
+        return {f'p{p}': None for p in PERCENTILES} | {'mean': None, 'max': None}
+    ms = np.asarray(seconds) * 1000
+    return {f'p{p}': float(np.percentile(ms, p)) for p in PERCENTILES} | {'mean': float(ms.mean()),
+                                                                           'max': float(ms.max())}
+
+
+def latency_report(measured: list[Sample]) -> dict:
+    ok = [s for s in measured if s.error is None]
+    errors = {}
+    for s in measured:
+        if s.error is not None:
+            errors[s.error] = errors.get(s.error, 0) + 1
+    span = (max(s.start + s.latency for s in measured) - min(s.start for s in measured)) if measured else 0
+    return {
+        'requests': len(measured),
+        'succeeded': len(ok),
+        'errorRate': (len(measured) - len(ok)) / len(measured) if measured else None,
+        'errors': errors,
+        'throughputQps': len(ok) / span if span else None,
+        'latencyMs': percentiles_ms([s.latency for s in ok]),
+    }
+
+
+def _commit_times(db_path, seqs: list[int]) -> dict[int, tuple[int, int | None]]:
+    """seq -> (query timestamp, committedAt of its batch or None) for the given queries."""
+    out = {}
+    con = sqlite3.connect(f'file:{db_path}?mode=ro', uri=True)
+    try:
+        for i in range(0, len(seqs), 500):
+            chunk = seqs[i:i + 500]
+            rows = con.execute(
+                'SELECT q.seq, q.timestamp, b.committed_at FROM zkfair_query_logs q '
+                'LEFT JOIN zkfair_batches b ON q.batch_id = b.id '
+                f"WHERE q.seq IN ({','.join('?' * len(chunk))})", chunk).fetchall()
+            out.update((seq, (ts, committed)) for seq, ts, committed in rows)
+    finally:
+        con.close()
+    return out
+
+
+async def wait_for_commits(gen: LoadGenerator, db_path, seqs: list[int], wait: float, force: bool,
+                           poll: float = 1.0) -> dict:
+    """Poll the server's database until every query's batch is committed (or `wait` seconds pass)."""
+    deadline = time.perf_counter() + wait
+    while True:
+        times = _commit_times(db_path, seqs)
+        pending = [seq for seq in seqs if times.get(seq, (None, None))[1] is None]
+        if not pending or time.perf_counter() >= deadline:
+            break
+        if force:
+            # Each call batches up to the provider's batchSize oldest unbatched queries
+            status, body = await gen.post('/demo/commit-batch')
+            if status != 200:
+                print(f" /demo/commit-batch returned {status}: {body[:200]!r}")
+                force = False
+            continue
+        await asyncio.sleep(poll)
+
+    delays = [(committed - ts) / 1000 for ts, committed in times.values() if committed is not None]
+    return {
+        'queries': len(seqs),
+        'committed': len(delays),
+        'pending': len(seqs) - len(delays),
+        'queryToCommitMs': percentiles_ms(delays),
+    }
+
+
+def git_commit() -> str | None:
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              check=True, cwd=Path(__file__).parent).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+async def run(args) -> dict:
+    columns, features = load_samples(args.calibration, args.label_encoders)
+    if args.model_hash:
+        hash_ = args.model_hash
+    else:
+        hash_ = model_hash(args.model, args.registry)
+    gen = LoadGenerator(args.url, hash_, features, args.connections, args.timeout, args.seed)
+    try:
+        health = await gen.get('/health')
+        print(f" Server up, models loaded: {health.get('loadedModels')}")
+        mode = f"open loop at {args.qps} qps" if args.qps else f"closed loop, {args.concurrency} clients"
+        print(f" Driving {args.url} for {args.duration}s ({mode}), {len(features):,} sample rows\n")
+
+        begin = time.perf_counter()
+        if args.qps:
+            samples = await gen.open_loop(args.qps, args.duration, args.arrivals)
+        else:
+            samples = await gen.closed_loop(args.concurrency, args.duration)
+        measured = [s for s in samples if s.start >= begin + args.warmup]
+        report = latency_report(measured)
+
+        batching = None
+        seqs = [s.seq for s in measured if s.seq is not None]
+        if args.db and seqs:
+            batching = await wait_for_commits(gen, args.db, seqs, args.commit_wait, args.force_commit)
+    finally:
+        gen.close()
+
+    return {
+        'gitCommit': git_commit(),
+        'timestamp': int(time.time()),
+        'config': {
+            'url': args.url, 'model': args.model, 'modelHash': hash_,
+            'mode': 'open' if args.qps else 'closed', 'qps': args.qps, 'arrivals': args.arrivals,
+            'concurrency': None if args.qps else args.concurrency, 'connections': args.connections,
+            'duration': args.duration, 'warmup': args.warmup, 'seed': args.seed,
+            'features': len(columns), 'forceCommit': args.force_commit,
+        },
+        **report,
+        'batching': batching,
+    }
+
+
+def print_report(result, baseline=None):
+    def row(label, value, old=None, unit='ms'):
+        if value is None:
+            return
+        line = f"   {label:<22}{value:>10.2f} {unit}"
+        if old is not None:
+            change = (value - old) / old * 100 if old else float('inf')
+            line += f"   (was {old:.2f}, {change:+.1f}%)"
+        print(line)
+
+    base = baseline or {}
+    print(f" Requests: {result['requests']:,}, succeeded: {result['succeeded']:,}, "
+          f"error rate: {(result['errorRate'] or 0) * 100:.2f}%")
+    for error, count in result['errors'].items():
+        print(f"   {error}: {count}")
+    row('throughput', result['throughputQps'], base.get('throughputQps'), 'qps')
+    print(" Latency:")
+    for key, value in result['latencyMs'].items():
+        row(key, value, base.get('latencyMs', {}).get(key))
+    if result['batching']:
+        b = result['batching']
+        print(f" Query to batch commit ({b['committed']:,} of {b['queries']:,} committed):")
+        old = (base.get('batching') or {}).get('queryToCommitMs', {})
+        for key, value in b['queryToCommitMs'].items():
+            row(key, value, old.get(key))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--url', default='http://localhost:5000')
+    parser.add_argument('--model', default='adult-income', help="registry.json name of the model to query")
+    parser.add_argument('--model-hash', help="weights hash to send instead of looking --model up")
+    parser.add_argument('--registry', default=SERVER_DIR / 'registry.json')
+    parser.add_argument('--calibration', default='calibration_dataset.csv')
+    parser.add_argument('--label-encoders', default='label_encoders.json')
+    load = parser.add_mutually_exclusive_group()
+    load.add_argument('--qps', type=float, help="open loop: start requests at this rate")
+    load.add_argument('--concurrency', type=int, default=8, help="closed loop: clients sending back to back")
+    parser.add_argument('--arrivals', choices=['uniform', 'poisson'], default='uniform')
+    parser.add_argument('--duration', type=float, default=30, help="seconds of load")
+    parser.add_argument('--warmup', type=float, default=2, help="leave out requests started in the first N seconds")
+    parser.add_argument('--connections', type=int, default=64, help="keep-alive connections (open loop)")
+    parser.add_argument('--timeout', type=float, default=10, help="per-request timeout in seconds")
+    parser.add_argument('--db', default=SERVER_DIR / 'zkfair.db',
+                        help="the server's SQLite database, for query-to-commit times ('' to skip)")
+    parser.add_argument('--commit-wait', type=float, default=60, help="seconds to wait for batches to commit")
+    parser.add_argument('--force-commit', action='store_true', help="trigger batches via /demo/commit-batch")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--json', help="result file (default: .build/bench/load_<commit>.json)")
+    parser.add_argument('--compare', help="an earlier result file to compare against")
+    args = parser.parse_args()
+    if args.qps is not None and args.qps <= 0:
+        parser.error("--qps must be positive")
+    if args.concurrency is not None and args.concurrency < 1:
+        parser.error("--concurrency must be at least 1")
+    if not args.qps:
+        # Closed loop needs one connection per client
+        args.connections = max(args.connections, args.concurrency)
+
+    result = asyncio.run(run(args))
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+    print_report(result, baseline)
+
+    out = Path(args.json or f".build/bench/load_{result['gitCommit'] or 'unknown'}.json")
+    write_json(out, result)
+    print(f"\n Saved: {out}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,108 @@
+"""Benchmark: 500-point ROC interpolation vs the exact threshold sweep.
+
+Draws synthetic two-group scores (group 1 shifted and with a higher base rate,
+so the groups need different thresholds), then runs the interp1d grid search
+main.py used before `thresholds.py` and the exact optimiser for each objective.
+Both sets of thresholds are scored the same way, at THRESHOLD_SCALE
+resolution with the circuit's integer rates.
+
+    uv run bench_thresholds.py --rows 2000000 --tolerance 0.01
+"""
+import argparse
+import json
+import time
+
+import numpy as np
+
+from thresholds import OBJECTIVES, THRESHOLD_SCALE, optimize_thresholds, quantize_scores
+
+
+def make_scores(rows, seed):
+    rng = np.random.default_rng(seed)
+    groups = (rng.random(rows) < 0.67).astype(np.int64)
+    labels = (rng.random(rows) < np.where(groups == 1, 0.31, 0.11)).astype(np.int64)
+    scores = rng.normal(size=rows) + 1.8 * labels + 0.4 * groups - 2.0
+    return scores, labels, groups
+
+
+def run_grid(scores, labels, groups):
+    # The Algorithm 1 block main.py used before the exact sweep
+    from scipy.interpolate import interp1d
+    from sklearn.metrics import roc_curve
+
+    fpr_0, tpr_0, thresholds_0 = roc_curve(labels[groups == 0], scores[groups == 0])
+    fpr_1, tpr_1, thresholds_1 = roc_curve(labels[groups == 1], scores[groups == 1])
+    common_fpr = np.linspace(0, 1, 500)
+    tpr_0_interp = interp1d(fpr_0, tpr_0, bounds_error=False, fill_value=(0, 1))
+    tpr_1_interp = interp1d(fpr_1, tpr_1, bounds_error=False, fill_value=(0, 1))
+    tpr_diff = np.abs(tpr_0_interp(common_fpr) - tpr_1_interp(common_fpr))
+    target_fpr = common_fpr[np.argmin(tpr_diff)]
+    return [float(np.interp(target_fpr, fpr_0, thresholds_0)), float(np.interp(target_fpr, fpr_1, thresholds_1))]
+
+
+def evaluate(thresholds_scaled, scores, labels, groups):
+    """Accuracy and circuit-arithmetic gaps for scaled thresholds, as the circuit config stores them."""
+    q = quantize_scores(scores)
+    scaled = np.asarray(thresholds_scaled, dtype=np.int64)
+    pred = (q >= scaled[groups]).astype(np.int64)
+    rates = {'positive_rate': [], 'tpr': [], 'fpr': []}
+    for g in (0, 1):
+        m = groups == g
+        p, y = pred[m], labels[m]
+        rates['positive_rate'].append(int(p.sum()) * THRESHOLD_SCALE // int(m.sum()))
+        rates['tpr'].append(int((p & y).sum()) * THRESHOLD_SCALE // int(y.sum()))
+        rates['fpr'].append(int((p & (1 - y)).sum()) * THRESHOLD_SCALE // int((1 - y).sum()))
+    gap = {k: abs(v[0] - v[1]) / THRESHOLD_SCALE for k, v in rates.items()}
+    return {
+        'accuracy': float((pred == labels).mean()),
+        'demographicParity': gap['positive_rate'],
+        'equalOpportunity': gap['tpr'],
+        'equalizedOdds': max(gap['tpr'], gap['fpr']),
+    }
+
+
+def timed(fn, repeat):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        out = fn()
+        best = min(best, time.perf_counter() - start)
+    return out, best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=1_000_000)
+    parser.add_argument('--tolerance', type=float, default=0.01)
+    parser.add_argument('--repeat', type=int, default=3, help="report the best of this many runs")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--json', help="write the results to this file")
+    args = parser.parse_args()
+
+    scores, labels, groups = make_scores(args.rows, args.seed)
+    print(f"Benchmark scores: {args.rows:,} rows, tolerance {args.tolerance}\n")
+
+    results = []
+    thresholds, seconds = timed(lambda: run_grid(scores, labels, groups), args.repeat)
+    results.append({'method': 'grid/500', 'seconds': seconds, 'thresholds': thresholds,
+                    # Float thresholds of the other methods, quantised to the config's scale
+                    **evaluate(np.round(np.asarray(thresholds) * THRESHOLD_SCALE), scores, labels, groups)})
+    for objective in OBJECTIVES:
+        res, seconds = timed(lambda: optimize_thresholds(scores, labels, groups, objective, args.tolerance),
+                             args.repeat)
+        results.append({'method': f'sweep/{objective}', 'seconds': seconds, 'thresholds': res.thresholds,
+                        **evaluate(res.thresholds_scaled, scores, labels, groups)})
+
+    print(f"{'method':<30}{'seconds':>9}{'accuracy':>10}{'DP gap':>9}{'EOpp gap':>10}{'EO gap':>9}  thresholds")
+    for r in results:
+        print(f"{r['method']:<30}{r['seconds']:>9.3f}{r['accuracy']:>10.4f}{r['demographicParity']:>9.4f}"
+              f"{r['equalOpportunity']:>10.4f}{r['equalizedOdds']:>9.4f}  "
+              + ', '.join(f"{t:.4f}" for t in r['thresholds']))
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({'rows': args.rows, 'tolerance': args.tolerance, 'results': results}, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
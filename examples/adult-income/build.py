@@ -0,0 +1,243 @@
+"""Content-hashed incremental build for the example pipeline.
+
+Each stage declares the files it reads, the files it writes and the parameters
+that influence its result. A stage is only rerun when the hash of those inputs
+(plus the stage's own source code, the local modules it imports, directly or
+through each other, and the helper functions listed in its `deps`) differs
+from the one recorded in the manifest, or when one of its outputs went
+missing or was edited by hand.
+
+Artifacts are written through `write_bytes`/`write_json`/`write_csv`, which
+leave a file untouched when the new contents are byte-identical. This keeps
+mtimes and content hashes stable for everything downstream, including the
+SDK's commitment cache in ~/.zkfair.
+"""
+import ast
+import contextlib
+import functools
+import hashlib
+import inspect
+import json
+import os
+import textwrap
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Callable
+
+from profiling import phase
+
+BUILD_DIR = Path('.build')
+MANIFEST_PATH = BUILD_DIR / 'manifest.json'
+MANIFEST_VERSION = 1
+
+_HASH_CHUNK = 1 << 20
+# The pipeline's own modules; imports of anything else (numpy, sklearn, ...) are not hashed
+SOURCE_DIR = Path(__file__).resolve().parent
+
+
+def hash_bytes(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+def hash_file(path: str | Path) -> str | None:
+    """SHA-256 of a file's contents, or None if it does not exist."""
+    path = Path(path)
+    if not path.is_file():
+        return None
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        while chunk := f.read(_HASH_CHUNK):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def write_bytes(path: str | Path, data: bytes) -> bool:
+    """Write `data` to `path` unless the file already holds exactly these bytes.
+
+    Returns True if the file was (re)written.
+    """
+    path = Path(path)
+    with phase('write'):
+        if path.is_file() and path.stat().st_size == len(data) and hash_file(path) == hash_bytes(data):
+            return False
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_name(path.name + '.tmp')
+        tmp.write_bytes(data)
+        os.replace(tmp, path)
+        return True
+
+
+def replace_if_changed(tmp: str | Path, path: str | Path) -> bool:
+    """Move a freshly streamed `tmp` file over `path` unless the contents are identical.
+
+    Used by stages that write too much data to hold in memory. Returns True if
+    `path` was replaced.
+    """
+    tmp, path = Path(tmp), Path(path)
+    with phase('write'):
+        if path.is_file() and path.stat().st_size == tmp.stat().st_size and hash_file(path) == hash_file(tmp):
+            os.remove(tmp)
+            return False
+        os.replace(tmp, path)
+        return True
+
+
+def write_json(path: str | Path, obj: Any) -> bool:
+    # Same formatting as json.dump(obj, f, indent=2) so existing artifacts stay byte-identical
+    return write_bytes(path, json.dumps(obj, indent=2).encode())
+
+
+def write_csv(path: str | Path, df) -> bool:
+    with phase('write', rows=len(df)):
+        data = df.to_csv(index=False).encode()
+    return write_bytes(path, data)
+
+
+@functools.lru_cache(maxsize=None)
+def _local_imports(source: str) -> frozenset[str]:
+    # Cached on the source text: every stage walks the same modules' ASTs
+    names = set()
+    for node in ast.walk(ast.parse(textwrap.dedent(source))):
+        if isinstance(node, ast.Import):
+            names.update(alias.name.split('.')[0] for alias in node.names)
+        elif isinstance(node, ast.ImportFrom) and node.module and not node.level:
+            names.add(node.module.split('.')[0])
+    return frozenset(name for name in names if (SOURCE_DIR / f'{name}.py').is_file())
+
+
+def code_hashes(source: str) -> dict[str, str]:
+    """Content hash of every local module `source` imports, directly or through each other."""
+    hashes = {}
+    pending = list(_local_imports(source))
+    while pending:
+        name = pending.pop()
+        if name in hashes:
+            continue
+        path = SOURCE_DIR / f'{name}.py'
+        hashes[name] = hash_file(path)
+        pending.extend(_local_imports(path.read_text()))
+    return hashes
+
+
+@dataclass
+class Stage:
+    name: str
+    run: Callable[[dict], None]
+    inputs: list[str] = field(default_factory=list)
+    outputs: list[str] = field(default_factory=list)
+    params: dict = field(default_factory=dict)
+    # Passed to `run` with the params but not part of the key: settings such as
+    # process counts that change how fast a stage runs, not what it writes
+    options: dict = field(default_factory=dict)
+    # Functions `run` calls from its own module (imported modules are found and hashed automatically)
+    deps: list[Callable] = field(default_factory=list)
+
+
+class Pipeline:
+    """Runs stages in declaration order, skipping those whose inputs are unchanged.
+
+    Stages must be declared in dependency order; dependencies are expressed
+    purely through files (a stage's inputs are some earlier stage's outputs).
+    """
+
+    def __init__(self, stages: list[Stage], manifest_path: Path = MANIFEST_PATH, profiler=None):
+        self.stages = stages
+        self.manifest_path = Path(manifest_path)
+        # profiling.Profiler measuring every stage that is built, if any
+        self.profiler = profiler
+        self.manifest = self._load_manifest()
+        # Seconds spent in each stage built by the last `run`
+        self.timings = {}
+
+    def _load_manifest(self) -> dict:
+        try:
+            manifest = json.loads(self.manifest_path.read_text())
+        except (OSError, ValueError):
+            return {'version': MANIFEST_VERSION, 'files': {}, 'stages': {}}
+        if manifest.get('version') != MANIFEST_VERSION:
+            return {'version': MANIFEST_VERSION, 'files': {}, 'stages': {}}
+        return manifest
+
+    def _save_manifest(self):
+        self.manifest_path.parent.mkdir(parents=True, exist_ok=True)
+        self.manifest_path.write_text(json.dumps(self.manifest, indent=2, sort_keys=True))
+
+    def file_hash(self, path: str) -> str | None:
+        """Content hash of `path`, reusing the cached value while size and mtime are unchanged."""
+        try:
+            st = os.stat(path)
+        except FileNotFoundError:
+            self.manifest['files'].pop(path, None)
+            return None
+        stamp = [st.st_size, st.st_mtime_ns, st.st_ino]
+        cached = self.manifest['files'].get(path)
+        if cached and cached['stamp'] == stamp:
+            return cached['sha256']
+        digest = hash_file(path)
+        self.manifest['files'][path] = {'stamp': stamp, 'sha256': digest}
+        return digest
+
+    def stage_key(self, stage: Stage) -> str:
+        missing = [p for p in stage.inputs if not os.path.exists(p)]
+        if missing:
+            raise FileNotFoundError(f"Stage '{stage.name}' is missing inputs: {', '.join(missing)}")
+        sources = [inspect.getsource(f) for f in (stage.run, *stage.deps)]
+        payload = {
+            'stage': stage.name,
+            'code': [hash_bytes(source.encode()) for source in sources],
+            'modules': {name: h for source in sources for name, h in code_hashes(source).items()},
+            'params': stage.params,
+            'inputs': {p: self.file_hash(p) for p in stage.inputs},
+        }
+        return hash_bytes(json.dumps(payload, sort_keys=True, default=str).encode())
+
+    def is_fresh(self, stage: Stage, key: str) -> bool:
+        record = self.manifest['stages'].get(stage.name)
+        if not record or record['key'] != key:
+            return False
+        return all(self.file_hash(p) == record['outputs'].get(p) for p in stage.outputs)
+
+    def run(self, force: bool = False, dry_run: bool = False) -> list[str]:
+        """Build every stale stage. Returns the names of the stages that ran."""
+        rebuilt = []
+        pending = set()
+        self.timings = {}
+        for stage in self.stages:
+            # A dry run never produces upstream outputs, so anything that reads
+            # the output of a stale stage is reported stale as well
+            if dry_run and any(p in pending or not os.path.exists(p) for p in stage.inputs):
+                print(f" [stale] {stage.name} (upstream stale)")
+                pending.update(stage.outputs)
+                rebuilt.append(stage.name)
+                continue
+            key = self.stage_key(stage)
+            if not force and self.is_fresh(stage, key):
+                print(f" [fresh] {stage.name}")
+                continue
+            if dry_run:
+                print(f" [stale] {stage.name}")
+                pending.update(stage.outputs)
+                rebuilt.append(stage.name)
+                continue
+
+            print(f" [build] {stage.name}")
+            start = time.perf_counter()
+            with self.profiler.stage(stage.name) if self.profiler else contextlib.nullcontext():
+                stage.run({**stage.params, **stage.options})
+            elapsed = time.perf_counter() - start
+            self.timings[stage.name] = elapsed
+
+            missing = [p for p in stage.outputs if not os.path.exists(p)]
+            if missing:
+                raise RuntimeError(f"Stage '{stage.name}' did not produce: {', '.join(missing)}")
+            self.manifest['stages'][stage.name] = {
+                'key': key,
+                'outputs': {p: self.file_hash(p) for p in stage.outputs},
+                'seconds': round(elapsed, 4),
+            }
+            self._save_manifest()
+            rebuilt.append(stage.name)
+
+        self._save_manifest()
+        return rebuilt
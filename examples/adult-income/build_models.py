@@ -0,0 +1,159 @@
+"""Build every example model at once.
+
+Each model directory with a pipeline.json (adult-income, heart-disease,
+student-performance, ...) is built by main.py's pipeline in its own process,
+so the heavy stages of different models (training, ONNX export and
+verification, the threshold search, commitment hashing) run on separate
+cores. Models are started largest dataset first, which keeps one big model
+from finishing last on its own. Each model's output goes to
+<model>/.build/build.log, and the per-stage timings of all models are written
+to .build/build_models.json.
+
+    uv run build_models.py                                      # every ../*/pipeline.json
+    uv run build_models.py ../heart-disease ../student-performance --force
+    uv run build_models.py --commit --registry ../../apps/server/registry.json
+"""
+import argparse
+import contextlib
+import json
+import os
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+
+from build import BUILD_DIR, write_bytes, write_json
+from main import CONFIG_FILE, MODEL_DIR, WEIGHTS_HASH, build_model, load_config
+
+EXAMPLES_DIR = MODEL_DIR.parent
+REPORT = BUILD_DIR / 'build_models.json'
+
+
+def discover(root=EXAMPLES_DIR) -> list[Path]:
+    return sorted(p.parent for p in Path(root).glob(f'*/{CONFIG_FILE}'))
+
+
+def _dataset_size(model_dir: Path) -> int:
+    return (model_dir / load_config(model_dir)['dataset']).stat().st_size
+
+
+def _build(model_dir: Path, options: dict, hash_weights: bool) -> dict:
+    """One model's build, with its output captured in <model>/.build/build.log."""
+    log_path = model_dir / BUILD_DIR / 'build.log'
+    log_path.parent.mkdir(parents=True, exist_ok=True)
+    start = time.perf_counter()
+    with open(log_path, 'w') as log, contextlib.redirect_stdout(log), contextlib.redirect_stderr(log):
+        try:
+            result = build_model(model_dir, **options)
+            if hash_weights:
+                # Written by the pipeline's weights_hash stage, which only reruns when weights.bin changes
+                with open(model_dir / WEIGHTS_HASH) as f:
+                    weights_hash = json.load(f)
+                result['weightsHash'] = weights_hash['weightsHash']
+                if 'error' in weights_hash:
+                    # Like the SDK's poseidon(), at most 16 weights (15 features + bias) can be hashed
+                    result['warning'] = f"not registrable: {weights_hash['error']}"
+        except Exception:
+            traceback.print_exc()
+            result = {'model': model_dir.name, 'stages': {}, 'error': traceback.format_exc(limit=1).strip()}
+    result['seconds'] = time.perf_counter() - start
+    result['log'] = str(log_path)
+    return result
+
+
+def update_registry(path, results):
+    """Add or update the registry.json entry (id, weights hash, name, model path) of every built model."""
+    path = Path(path)
+    with open(path) as f:
+        registry = json.load(f)
+    entries = {m['name']: m for m in registry['models']}
+    next_id = max((m['id'] for m in registry['models']), default=0) + 1
+    for r in results:
+        if 'error' in r or not r.get('weightsHash'):
+            continue
+        onnx_path = os.path.relpath(EXAMPLES_DIR / r['model'] / 'model.onnx', path.parent)
+        if r['model'] not in entries:
+            entries[r['model']] = {'id': next_id, 'hash': r['weightsHash'], 'name': r['model'], 'path': onnx_path}
+            registry['models'].append(entries[r['model']])
+            next_id += 1
+        else:
+            entries[r['model']].update(hash=r['weightsHash'], path=onnx_path)
+    # registry.json is tab-indented
+    write_bytes(path, (json.dumps(registry, indent='\t') + '\n').encode())
+
+
+def build_models(model_dirs, workers=None, hash_weights=False, **options) -> list[dict]:
+    """Build `model_dirs` on up to `workers` processes; results in the order given.
+
+    `options` are passed to `main.build_model`. With `hash_weights`, each result
+    also carries the Poseidon weights hash the registry and SDK key models by.
+    """
+    model_dirs = [Path(d).resolve() for d in model_dirs]
+    workers = min(workers or os.cpu_count() or 1, len(model_dirs))
+    # Longest first: dataset size is a good proxy for build time
+    order = sorted(model_dirs, key=_dataset_size, reverse=True)
+    # Share the cores between the commitment pools of the models building at once
+    options.setdefault('commit_workers', max(1, (os.cpu_count() or 1) // workers))
+
+    results = {}
+    if workers <= 1:
+        for model_dir in order:
+            results[model_dir] = _build(model_dir, options, hash_weights)
+            _print_result(results[model_dir])
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = {pool.submit(_build, model_dir, options, hash_weights): model_dir for model_dir in order}
+            for future in as_completed(futures):
+                results[futures[future]] = future.result()
+                _print_result(results[futures[future]])
+    return [results[d] for d in model_dirs]
+
+
+def _print_result(r):
+    status = "FAILED" if 'error' in r else f"{len(r['stages'])} stages built"
+    print(f" [{r['model']}] {status} in {r['seconds']:.2f}s (log: {r['log']})")
+    if 'error' in r:
+        print(f"    {r['error']}")
+    if 'warning' in r:
+        print(f"    {r['warning']}")
+
+
+def print_timings(results):
+    stages = list(dict.fromkeys(name for r in results for name in r['stages']))
+    if not stages:
+        return
+    print(f"\n {'model':<22}" + ''.join(f"{s:>18}" for s in stages) + f"{'total':>10}")
+    for r in results:
+        cells = ''.join(f"{r['stages'][s]:>17.2f}s" if s in r['stages'] else f"{'-':>18}" for s in stages)
+        print(f" {r['model']:<22}{cells}{r['seconds']:>9.2f}s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('models', nargs='*', help="model directories (default: every example with a pipeline.json)")
+    parser.add_argument('--workers', type=int, default=None, help="models built at once (default: all cores)")
+    parser.add_argument('--force', action='store_true', help="rebuild every stage even if its inputs are unchanged")
+    parser.add_argument('--circuit-gate', choices=['warn', 'enforce'], default='warn')
+    parser.add_argument('--commit', action='store_true', help="also build each dataset commitment")
+    parser.add_argument('--registry', help="add or update the built models in this registry.json")
+    args = parser.parse_args()
+
+    model_dirs = args.models or discover()
+    start = time.perf_counter()
+    results = build_models(model_dirs, args.workers, hash_weights=bool(args.registry), force=args.force,
+                           summary=False, circuit_gate=args.circuit_gate, commit=args.commit)
+    wall = time.perf_counter() - start
+    print_timings(results)
+    print(f"\n Wall time: {wall:.2f}s, sum of model times: {sum(r['seconds'] for r in results):.2f}s")
+
+    write_json(REPORT, {'wallSeconds': wall, 'models': results})
+    print(f" Saved: {REPORT}")
+    if args.registry:
+        update_registry(args.registry, results)
+        print(f" Updated: {args.registry}")
+    if any('error' in r for r in results):
+        raise SystemExit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,283 @@
+"""Single-file, memory-mappable bundle of a model's pipeline artifacts.
+
+Replaces the CSV/JSON/headerless-binary handoff to the SDK with one
+versioned file that Python (`np.memmap`) and Bun (`Bun.mmap`, see
+packages/sdk/bundle.ts) read without parsing or copying:
+
+    0   magic b'ZKFAIRB\\0'
+    8   uint32 format version
+    12  uint32 header length
+    16  header: UTF-8 JSON (columns, protected attribute, scales,
+        label encoders, source hashes and the section table)
+    ... sections, each starting on a 64-byte boundary
+    ... `fairness`: the fairness config (thresholds) as UTF-8 JSON, up to
+        the end of the file
+
+Sections are little-endian. `weights` holds the float32 weights exactly as in
+weights.bin (coefficients, then the intercept). `dataset` and `calibration`
+store int32 columns, column-major: column c of a section with shape
+[columns, stride] starts at offset + c * stride * 4. The stride is the row
+count rounded up to 16, so every column is 64-byte aligned as well.
+
+The fairness config is the last section and nothing else depends on its
+length, so the header and every other byte stay the same when only the
+thresholds change. `write_bundle` then rewrites just that tail of the
+existing file instead of repacking the dataset columns; the result is the
+same file a full write produces.
+
+`sourceHashes` maps each section to the SHA-256 of the file it was built
+from. The SDK derives the commitment's master salt from the weights and
+dataset hashes, so a bundle commits to the same root as its CSV/weights.bin.
+
+The dataset columns are filled from the encoded CSV in chunks through a
+writable memmap, so writing a bundle for a multi-million-row dataset needs
+one chunk of memory, not the whole table.
+
+    uv run bundle.py                   # weights.bin + dataset_encoded.csv + ... -> model.zkfb
+    uv run bundle.py --inspect model.zkfb
+"""
+import argparse
+import csv
+import json
+import struct
+from dataclasses import dataclass
+from pathlib import Path
+
+import numpy as np
+
+from build import hash_file, replace_if_changed
+from profiling import phase
+
+BUNDLE_MAGIC = b'ZKFAIRB\0'
+BUNDLE_VERSION = 2
+BUNDLE_PATH = 'model.zkfb'
+ALIGN = 64
+_PREAMBLE = struct.Struct('<8sII')
+_INT32 = np.iinfo(np.int32)
+
+
+def _align(n: int) -> int:
+    return -(-n // ALIGN) * ALIGN
+
+
+def _count_rows(path) -> int:
+    # Data rows of a CSV with a header line and no quoted newlines (the encoded CSVs are all integers)
+    rows = 0
+    with open(path, 'rb') as f:
+        while chunk := f.read(1 << 20):
+            rows += chunk.count(b'\n')
+        f.seek(-1, 2)
+        if f.read(1) != b'\n':
+            rows += 1
+    return rows - 1
+
+
+def _csv_columns(path) -> list[str]:
+    # The header line only; pandas (slow to import) is not needed unless the columns are repacked
+    with open(path, newline='') as f:
+        return next(csv.reader(f))
+
+
+def _fill_columns(out: np.ndarray, path, chunk_size: int):
+    """Copy an integer CSV into the (columns, stride) int32 array `out`, chunk by chunk."""
+    import pandas as pd
+
+    start = 0
+    with pd.read_csv(path, dtype=np.int64, chunksize=chunk_size) as reader:
+        for chunk in reader:
+            values = chunk.to_numpy()
+            if len(values) and (values.min() < _INT32.min or values.max() > _INT32.max):
+                raise ValueError(f"{path} has values outside the int32 range")
+            out[:, start:start + len(values)] = values.T
+            start += len(values)
+
+
+def _read_header_bytes(path) -> bytes | None:
+    """The raw header of an existing bundle of this version, or None."""
+    try:
+        with open(path, 'rb') as f:
+            preamble = f.read(_PREAMBLE.size)
+            if len(preamble) < _PREAMBLE.size:
+                return None
+            magic, version, header_len = _PREAMBLE.unpack(preamble)
+            if magic != BUNDLE_MAGIC or version != BUNDLE_VERSION:
+                return None
+            return f.read(header_len)
+    except FileNotFoundError:
+        return None
+
+
+def _patch_fairness(path: Path, offset: int, data: bytes) -> bool:
+    """Rewrite the trailing fairness section of `path` in place; returns True if it changed."""
+    with phase('write'):
+        with open(path, 'r+b') as f:
+            f.seek(offset)
+            if f.read() == data:
+                return False
+            f.seek(offset)
+            f.write(data)
+            f.truncate()
+        return True
+
+
+def write_bundle(path, weights_path, dataset_path, fairness_path, encoders_path=None,
+                 calibration_path=None, extra: dict | None = None, chunk_size: int = 100_000) -> dict:
+    """Write the bundle to `path` (only replacing it if the bytes changed); returns its header.
+
+    If `path` already holds these weights and tables (its header is the one
+    this call would write), only the fairness section is rewritten.
+    """
+    with open(fairness_path) as f:
+        fairness = json.load(f)
+    fairness_bytes = json.dumps(fairness, separators=(',', ':')).encode()
+    encoders = None
+    if encoders_path is not None:
+        with open(encoders_path) as f:
+            encoders = json.load(f)
+    weights = np.fromfile(weights_path, dtype='<f4')
+
+    tables = {'dataset': dataset_path}
+    if calibration_path is not None:
+        tables['calibration'] = calibration_path
+    columns = _csv_columns(dataset_path)
+    shapes = {}
+    for name, table in tables.items():
+        if _csv_columns(table) != columns:
+            raise ValueError(f"{table} does not have the columns of {dataset_path}")
+        rows = _count_rows(table)
+        shapes[name] = (rows, -(-rows // 16) * 16)
+
+    header = {
+        'columns': columns,
+        'label': columns[-1],
+        'features': len(columns) - 1,
+        'protectedAttribute': fairness.get('protectedAttribute'),
+        'protectedAttributeIndex': fairness.get('protectedAttributeIndex'),
+        'labelEncoders': encoders,
+        'sources': {name: Path(p).name for name, p in {'weights': weights_path, **tables}.items()},
+        # Section -> SHA-256 of its source file: the SDK's generateMasterSalt input
+        'sourceHashes': {name: hash_file(p) for name, p in {'weights': weights_path, **tables}.items()},
+        **(extra or {}),
+        'sections': {},
+    }
+
+    # Section offsets depend on the header length and vice versa; start the
+    # data after the header, and move it further out until the header fits
+    data_start = 0
+    while True:
+        offset = data_start
+        sections = {'weights': {'offset': offset, 'dtype': 'float32', 'shape': [len(weights)]}}
+        offset = _align(offset + weights.nbytes)
+        for name, (rows, stride) in shapes.items():
+            sections[name] = {'offset': offset, 'dtype': 'int32', 'shape': [len(columns), stride], 'rows': rows}
+            offset = _align(offset + len(columns) * stride * 4)
+        sections['fairness'] = {'offset': offset, 'dtype': 'json'}
+        header['sections'] = sections
+        header_bytes = json.dumps(header, separators=(',', ':')).encode()
+        needed = _align(_PREAMBLE.size + len(header_bytes))
+        if needed <= data_start:
+            break
+        data_start = needed
+
+    path = Path(path)
+    if _read_header_bytes(path) == header_bytes and path.stat().st_size >= offset:
+        _patch_fairness(path, offset, fairness_bytes)
+        return {**header, 'fairness': fairness}
+
+    tmp = path.with_name(path.name + '.tmp')
+    with open(tmp, 'wb') as f:
+        f.write(_PREAMBLE.pack(BUNDLE_MAGIC, BUNDLE_VERSION, len(header_bytes)))
+        f.write(header_bytes)
+        f.seek(offset)
+        f.write(fairness_bytes)
+    mm = np.memmap(tmp, dtype=np.uint8, mode='r+')
+    try:
+        w = sections['weights']
+        mm[w['offset']:w['offset'] + weights.nbytes] = weights.view(np.uint8)
+        for name, table in tables.items():
+            s = sections[name]
+            n_cols, stride = s['shape']
+            out = mm[s['offset']:s['offset'] + n_cols * stride * 4].view('<i4').reshape(n_cols, stride)
+            _fill_columns(out, table, chunk_size)
+        mm.flush()
+    finally:
+        del mm
+    replace_if_changed(tmp, path)
+    return {**header, 'fairness': fairness}
+
+
+@dataclass
+class Bundle:
+    header: dict
+    weights: np.ndarray
+    # Section name -> (columns, rows) int32 view over the mapped file
+    tables: dict
+
+    @property
+    def columns(self) -> list[str]:
+        return self.header['columns']
+
+    def column(self, name: str, table: str = 'dataset') -> np.ndarray:
+        return self.tables[table][self.columns.index(name)]
+
+    def rows(self, table: str = 'dataset') -> np.ndarray:
+        """Row-major copy (rows, columns), as in the encoded CSV."""
+        return np.ascontiguousarray(self.tables[table].T)
+
+
+def read_bundle(path) -> Bundle:
+    """Map a bundle; arrays are read-only views into the file, nothing is loaded eagerly.
+
+    The fairness section is parsed into `header['fairness']`.
+    """
+    with open(path, 'rb') as f:
+        magic, version, header_len = _PREAMBLE.unpack(f.read(_PREAMBLE.size))
+        if magic != BUNDLE_MAGIC:
+            raise ValueError(f"{path} is not a model bundle")
+        if version != BUNDLE_VERSION:
+            raise ValueError(f"{path} is bundle version {version}, this reader supports {BUNDLE_VERSION}")
+        header = json.loads(f.read(header_len))
+        f.seek(header['sections']['fairness']['offset'])
+        header['fairness'] = json.loads(f.read())
+
+    mm = np.memmap(path, dtype=np.uint8, mode='r')
+    w = header['sections']['weights']
+    weights = mm[w['offset']:w['offset'] + 4 * w['shape'][0]].view('<f4')
+    tables = {}
+    for name, s in header['sections'].items():
+        if s['dtype'] != 'int32':
+            continue
+        n_cols, stride = s['shape']
+        block = mm[s['offset']:s['offset'] + n_cols * stride * 4].view('<i4').reshape(n_cols, stride)
+        tables[name] = block[:, :s['rows']]
+    return Bundle(header, weights, tables)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--out', default=BUNDLE_PATH)
+    parser.add_argument('--weights', default='weights.bin')
+    parser.add_argument('--dataset', default='dataset_encoded.csv')
+    parser.add_argument('--calibration', default='calibration_dataset.csv')
+    parser.add_argument('--fairness-threshold', default='fairness_threshold.json')
+    parser.add_argument('--label-encoders', default='label_encoders.json')
+    parser.add_argument('--inspect', metavar='BUNDLE', help="print a bundle's header and section sizes")
+    args = parser.parse_args()
+
+    if args.inspect:
+        bundle = read_bundle(args.inspect)
+        header = {k: v for k, v in bundle.header.items() if k != 'labelEncoders'}
+        print(json.dumps(header, indent=2))
+        print(f" weights: {bundle.weights.tolist()}")
+        for name, table in bundle.tables.items():
+            print(f" {name}: {table.shape[1]} rows x {table.shape[0]} columns")
+        return
+
+    header = write_bundle(args.out, args.weights, args.dataset, args.fairness_threshold,
+                          args.label_encoders, args.calibration)
+    rows = {name: s['rows'] for name, s in header['sections'].items() if 'rows' in s}
+    print(f" Saved: {args.out} ({Path(args.out).stat().st_size:,} bytes, rows: {rows})")
+
+
+if __name__ == '__main__':
+    main()
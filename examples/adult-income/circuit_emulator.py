@@ -0,0 +1,300 @@
+"""Fixed-point emulator of the training and fairness_audit circuits.
+
+Reproduces the circuits' arithmetic on whole arrays so a dataset or a query
+batch can be checked in milliseconds before paying for a proof:
+
+- weights go through `weightsToFields` (x 1e6, negatives wrapped below 2^253 - 1)
+- `predict_logistic_regression` from zk-circuits/common: weights[0] is the
+  bias, weights[i + 1] multiplies feature i, the sum is reduced mod the BN254
+  modulus and `(logit as i64) > 0` keeps its low 64 bits as a signed integer
+- the per-group thresholds, signed integers at THRESHOLD_SCALE, go in as
+  fields the same way (`signedToField`)
+- group positive rates as u32 `positive * THRESHOLD_SCALE / total` and the
+  epsilon as `ceil(targetDisparity * 100) * 100`
+
+Weight fields are either small or 2^253 - 1 minus a small value. So the field
+sum splits into int64 parts A - B + (2^253 - 1) * K, with K the sum of the
+features under "negative" weights. Only that one term per row needs big-int
+arithmetic.
+
+Merkle membership is not emulated here; `commitment.py` rebuilds the tree.
+
+`--audit-batch` and `--audit-csv` check fairness_audit instead, on a batch of
+the server's query log or on a CSV of served queries. `--sample` picks the
+records the way the contract's sampleIndices do.
+
+    uv run circuit_emulator.py                                   # training circuit on dataset_encoded_small.csv
+    uv run circuit_emulator.py --dataset dataset_encoded.csv     # whole dataset, ignoring MAX_DATASET_SIZE
+    uv run circuit_emulator.py --audit-batch 1-100 --sample 0 7 19 23 42 51 60 77 88 99
+"""
+import argparse
+import json
+import math
+import sqlite3
+from pathlib import Path
+
+import numpy as np
+
+from commitment import WEIGHT_FIELD_MAX, signed_field, weights_to_fields
+from poseidon import FIELD_MODULUS
+
+# Circuit globals (training/src/main.nr, fairness_audit/src/main.nr)
+NUM_FEATURES = 14
+NUM_WEIGHTS = 15
+MAX_DATASET_SIZE = 10
+SAMPLE_SIZE = 10
+THRESHOLD_SCALE = 10000
+
+SERVER_DB = Path(__file__).resolve().parents[2] / 'apps' / 'server' / 'zkfair.db'
+
+_LOW_64 = (1 << 64) - 1
+# Weight fields above this are wrapped negatives (WEIGHT_FIELD_MAX - |w|)
+_NEGATIVE_FIELD = WEIGHT_FIELD_MAX // 2
+
+
+def circuit_logits(weight_fields: list[int], features) -> np.ndarray:
+    """`logit as i64` of predict_logistic_regression for every row of `features`."""
+    features = np.asarray(features, dtype=np.int64)
+    if features.shape[1] != NUM_FEATURES or len(weight_fields) != NUM_WEIGHTS:
+        raise ValueError(f"expected {NUM_WEIGHTS} weights and {NUM_FEATURES} features, "
+                         f"got {len(weight_fields)} and {features.shape[1]}")
+    if (features < 0).any():
+        raise ValueError("features must be non-negative integers (field elements)")
+
+    negative = [w > _NEGATIVE_FIELD for w in weight_fields]
+    small = np.array([WEIGHT_FIELD_MAX - w if neg else w for w, neg in zip(weight_fields, negative)],
+                     dtype=np.int64)
+    # Column 0 is the constant 1 multiplying the bias weight
+    x = np.column_stack([np.ones(len(features), dtype=np.int64), features])
+    neg = np.array(negative)
+    pos_sum = x[:, ~neg] @ small[~neg]
+    neg_sum = x[:, neg] @ small[neg]
+    wraps = x[:, neg].sum(axis=1)
+
+    # logit = pos_sum - neg_sum + WEIGHT_FIELD_MAX * wraps  (mod p), then the low 64 bits
+    field = ((pos_sum - neg_sum).astype(object) + WEIGHT_FIELD_MAX * wraps.astype(object)) % FIELD_MODULUS
+    low = (field & _LOW_64).astype(np.uint64)
+    return low.view(np.int64)
+
+
+def circuit_predict(weight_fields: list[int], features) -> np.ndarray:
+    return (circuit_logits(weight_fields, features) > 0).astype(np.int64)
+
+
+def float_predict(weights, features) -> np.ndarray:
+    """sklearn's prediction from weights.bin (coefficients, then intercept)."""
+    weights = np.asarray(weights, dtype=np.float64)
+    return (np.asarray(features, dtype=np.float64) @ weights[:-1] + weights[-1] > 0).astype(np.int64)
+
+
+def served_label(prediction):
+    """The 0/1 label of a served prediction (a label or a probability) as the audit leaves hold it.
+
+    The SDK's hashRecordLeaf uses `prediction >= 0.5`; this is the one Python
+    copy of that rule. Takes a scalar (no numpy overhead, for per-query loops) or a numpy array.
+    """
+    return (prediction >= 0.5) * 1
+
+
+def threshold_fields(thresholds: dict) -> list[int]:
+    """`_threshold_group_a/b` of fairness_threshold.json's signed scaled thresholds, as the SDK passes them."""
+    return [signed_field(thresholds['group_a']), signed_field(thresholds['group_b'])]
+
+
+def epsilon_percent(target_disparity: float) -> int:
+    # Math.ceil(thresholds.targetDisparity * 100), as passed by the SDK
+    return math.ceil(target_disparity * 100)
+
+
+def demographic_parity(predictions, sensitive) -> dict:
+    """Group counts and the u32 scaled rates/disparity exactly as the circuits compute them."""
+    predictions = np.asarray(predictions)
+    group_a = np.asarray(sensitive) == 0
+    a_total, b_total = int(group_a.sum()), int((~group_a).sum())
+    a_pos = int((predictions[group_a] == 1).sum())
+    b_pos = int((predictions[~group_a] == 1).sum())
+    rate_a = a_pos * THRESHOLD_SCALE // a_total if a_total else None
+    rate_b = b_pos * THRESHOLD_SCALE // b_total if b_total else None
+    return {
+        'groupATotal': a_total, 'groupAPositive': a_pos, 'rateAScaled': rate_a,
+        'groupBTotal': b_total, 'groupBPositive': b_pos, 'rateBScaled': rate_b,
+        'disparityScaled': abs(rate_a - rate_b) if a_total and b_total else None,
+    }
+
+
+def _disagreements(a, b, limit=20):
+    idx = np.flatnonzero(np.asarray(a) != np.asarray(b))
+    return int(len(idx)), idx[:limit].tolist()
+
+
+def check_training(weights, rows, protected_index: int, target_disparity: float) -> dict:
+    """Would the training circuit's fairness constraints hold for these committed rows?
+
+    `rows` are integer-encoded dataset rows (14 features, then the label).
+    Rows beyond MAX_DATASET_SIZE are evaluated too but reported via `fitsCircuit`.
+    """
+    rows = np.asarray(rows, dtype=np.int64)
+    features = rows[:, :NUM_FEATURES]
+    fields = weights_to_fields(weights)
+    fixed = circuit_predict(fields, features)
+    dp = demographic_parity(fixed, rows[:, protected_index])
+    threshold = epsilon_percent(target_disparity) * 100
+
+    failures = []
+    if len(rows) > MAX_DATASET_SIZE:
+        failures.append(f"dataset has {len(rows)} rows, circuit takes at most {MAX_DATASET_SIZE}")
+    if not dp['groupATotal'] or not dp['groupBTotal']:
+        failures.append("both groups need at least one row (assert group_a_total > 0 / group_b_total > 0)")
+    elif dp['disparityScaled'] > threshold:
+        failures.append(f"disparity {dp['disparityScaled']} > threshold {threshold} (of {THRESHOLD_SCALE})")
+
+    mismatches, examples = _disagreements(fixed, float_predict(weights, features))
+    return {
+        'circuit': 'training',
+        'rows': len(rows),
+        'fitsCircuit': len(rows) <= MAX_DATASET_SIZE,
+        'thresholdScaled': threshold,
+        **dp,
+        'circuitPositive': int(fixed.sum()),
+        'floatDisagreements': mismatches,
+        'floatDisagreementRows': examples,
+        'passes': not failures,
+        'failures': failures,
+    }
+
+
+def check_audit(weights, features, predictions, sensitive, target_disparity: float) -> dict:
+    """Would fairness_audit accept this sample of served queries?
+
+    `predictions` are the ones the provider served and will put in the leaves.
+    The circuit takes them as given, but disagreements with the fixed-point
+    model and with float sklearn are reported, since either means the logged
+    predictions don't come from the committed weights the way the circuit computes them.
+    """
+    features = np.rint(np.asarray(features, dtype=np.float64)).astype(np.int64)
+    predictions = np.asarray(predictions, dtype=np.int64)
+    dp = demographic_parity(predictions, sensitive)
+    threshold = epsilon_percent(target_disparity) * 100
+
+    failures = []
+    if len(predictions) == 0:
+        failures.append("sample is empty (assert _sample_count > 0)")
+    if len(predictions) > SAMPLE_SIZE:
+        failures.append(f"sample has {len(predictions)} queries, circuit takes at most {SAMPLE_SIZE}")
+    # The audit circuit skips the check when one group is missing from the sample
+    if dp['disparityScaled'] is not None and dp['disparityScaled'] > threshold:
+        failures.append(f"disparity {dp['disparityScaled']} > threshold {threshold} (of {THRESHOLD_SCALE})")
+
+    fixed = circuit_predict(weights_to_fields(weights), features[:, :NUM_FEATURES])
+    fixed_mismatches, fixed_rows = _disagreements(predictions, fixed)
+    float_mismatches, float_rows = _disagreements(predictions, float_predict(weights, features[:, :NUM_FEATURES]))
+    return {
+        'circuit': 'fairness_audit',
+        'samples': int(len(predictions)),
+        'fitsCircuit': 0 < len(predictions) <= SAMPLE_SIZE,
+        'thresholdScaled': threshold,
+        **dp,
+        'fixedPointDisagreements': fixed_mismatches,
+        'fixedPointDisagreementRows': fixed_rows,
+        'floatDisagreements': float_mismatches,
+        'floatDisagreementRows': float_rows,
+        'passes': not failures,
+        'failures': failures,
+    }
+
+
+def load_batch(db_path, batch_id: str, model_id: int = 1):
+    """Features, served predictions and sensitive attributes of a batch's queries, in seq order."""
+    from replay_verify import decode_features
+
+    connection = sqlite3.connect(f'file:{db_path}?mode=ro', uri=True)
+    try:
+        rows = connection.execute(
+            'SELECT features, prediction, sensitive_attr FROM zkfair_query_logs '
+            'WHERE batch_id = ? AND model_id = ? ORDER BY seq', (batch_id, model_id)).fetchall()
+    finally:
+        connection.close()
+    if not rows:
+        raise ValueError(f"no queries of model {model_id} in batch {batch_id}")
+    features = decode_features([r[0] for r in rows], NUM_FEATURES)[:, :NUM_FEATURES]
+    predictions = served_label(np.array([r[1] for r in rows], dtype=np.float64))
+    return features, predictions, np.array([r[2] for r in rows], dtype=np.int64)
+
+
+def load_predictions(path, protected_index: int):
+    """A CSV of served queries: NUM_FEATURES feature columns, `prediction` and optionally `sensitive_attr`.
+
+    Without `sensitive_attr` the protected feature column is used.
+    """
+    import pandas as pd
+
+    df = pd.read_csv(path)
+    predictions = served_label(df.pop('prediction').to_numpy(dtype=np.float64))
+    sensitive = df.pop('sensitive_attr').to_numpy(dtype=np.int64) if 'sensitive_attr' in df else None
+    features = df.to_numpy(dtype=np.float64)[:, :NUM_FEATURES]
+    if sensitive is None:
+        sensitive = features[:, protected_index].astype(np.int64)
+    return features, predictions, sensitive
+
+
+def print_check(result):
+    status = "PASS" if result['passes'] else "FAIL"
+    n = result.get('rows', result.get('samples'))
+    print(f"    {result['circuit']}: {status} ({n} rows)")
+    if result['disparityScaled'] is not None:
+        print(f"      rates a/b: {result['rateAScaled']}/{result['rateBScaled']}, disparity "
+              f"{result['disparityScaled']} <= {result['thresholdScaled']}?")
+    for failure in result['failures']:
+        print(f"      - {failure}")
+    if result.get('fixedPointDisagreements'):
+        print(f"      served vs fixed-point predictions differ on {result['fixedPointDisagreements']} rows "
+              f"(first: {result['fixedPointDisagreementRows']})")
+    if result['floatDisagreements']:
+        print(f"      {'served' if result['circuit'] == 'fairness_audit' else 'fixed-point'} vs float predictions "
+              f"differ on {result['floatDisagreements']} rows (first: {result['floatDisagreementRows']})")
+
+
+def main():
+    import pandas as pd
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--weights', default='weights.bin')
+    parser.add_argument('--dataset', default='dataset_encoded_small.csv')
+    parser.add_argument('--fairness-threshold', default='fairness_threshold.json')
+    audit = parser.add_mutually_exclusive_group()
+    audit.add_argument('--audit-batch', metavar='BATCH_ID',
+                       help="check fairness_audit on this batch of the query log instead of the training circuit")
+    audit.add_argument('--audit-csv', metavar='PATH',
+                       help="check fairness_audit on a CSV of served queries (features, prediction, sensitive_attr)")
+    parser.add_argument('--db', default=SERVER_DB, help="the provider server's SQLite database, for --audit-batch")
+    parser.add_argument('--model-id', type=int, default=1)
+    parser.add_argument('--sample', type=int, nargs='+', metavar='INDEX',
+                        help="record indices of the audit sample, like the contract's sampleIndices (default: all)")
+    parser.add_argument('--json', help="write the result to this file")
+    args = parser.parse_args()
+
+    weights = np.fromfile(args.weights, dtype='<f4')
+    with open(args.fairness_threshold) as f:
+        config = json.load(f)
+
+    if args.audit_batch or args.audit_csv:
+        if args.audit_batch:
+            features, predictions, sensitive = load_batch(args.db, args.audit_batch, args.model_id)
+        else:
+            features, predictions, sensitive = load_predictions(args.audit_csv, config['protectedAttributeIndex'])
+        if args.sample:
+            features, predictions, sensitive = features[args.sample], predictions[args.sample], sensitive[args.sample]
+        result = check_audit(weights, features, predictions, sensitive, config['targetDisparity'])
+    else:
+        rows = pd.read_csv(args.dataset, dtype=np.int64).to_numpy()
+        result = check_training(weights, rows, config['protectedAttributeIndex'], config['targetDisparity'])
+    print_check(result)
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(result, f, indent=2)
+    if not result['passes']:
+        raise SystemExit(1)
+
+
+if __name__ == '__main__':
+    main()
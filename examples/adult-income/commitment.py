@@ -0,0 +1,285 @@
+"""Native Python build of the SDK's dataset/weights commitment.
+
+Reproduces `CommitAPI.makeCommitment` from packages/sdk bit for bit: the
+Poseidon weights hash, the SHA-256 master salt and per-row salts, the
+Poseidon(row ++ salt) leaves, the Merkle root (last node duplicated on odd
+levels, like `merkleRoot`) and every leaf's proof in the circuit format of
+`generateAllMerkleProofs`.
+
+Instead of one proof walk per leaf (O(n^2) hashing), every tree level is
+hashed once into a flat array and all proofs are read out of those levels,
+so the whole commitment costs n leaf hashes + n pair hashes. Hashing is
+batched through `poseidon.hash_many` and spread over a process pool.
+
+    uv run commitment.py                                    # dataset_encoded.csv -> .build/commitment/
+    uv run commitment.py --dataset dataset_encoded_small.csv --sdk-cache
+"""
+import argparse
+import hashlib
+import json
+import math
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import numpy as np
+
+import poseidon
+from build import BUILD_DIR, write_bytes, write_json
+from poseidon import FIELD_MODULUS, hash_many
+
+MAX_TREE_HEIGHT = 15  # Same as the training circuit
+WEIGHT_SCALE = 1_000_000
+WEIGHT_FIELD_MAX = (1 << 253) - 1  # weightsToFields wraps negatives below this, not the field modulus
+
+COMMITMENT_DIR = BUILD_DIR / 'commitment'
+PROVER_TOML = Path(__file__).resolve().parents[2] / 'packages/zk-circuits/training/Prover.toml'
+
+# Rows per task handed to a pool worker; large enough to amortise the numpy round overhead
+_BATCH = 2048
+
+
+def to_hex(value: int) -> str:
+    """Plain 64-char hex, as returned by `hashPoseidonFields`."""
+    return format(int(value), '064x')
+
+
+def signed_field(value: int) -> int:
+    """A signed fixed-point integer as a field element, negatives wrapped below WEIGHT_FIELD_MAX (`signedToField`)."""
+    return int(value) % WEIGHT_FIELD_MAX
+
+
+def weights_to_fields(weights) -> list[int]:
+    """Fixed-point field encoding of float32 weights, like `weightsToFields`."""
+    fields = []
+    for w in np.asarray(weights, dtype=np.float32).astype(np.float64):
+        x = float(w) * WEIGHT_SCALE
+        # JS Math.round: nearest integer, ties towards +infinity
+        scaled = math.floor(x)
+        if x - scaled >= 0.5:
+            scaled += 1
+        fields.append(signed_field(scaled))
+    return fields
+
+
+def weights_hash(weights_path) -> str:
+    weights = np.fromfile(weights_path, dtype='<f4')
+    return '0x' + to_hex(poseidon.poseidon(weights_to_fields(weights)))
+
+
+def _sha256_file(path) -> str:
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        while chunk := f.read(1 << 20):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def master_salt(weights_path, dataset_path, metadata) -> str:
+    """Deterministic master salt, like `generateMasterSalt`, as a decimal string."""
+    # JSON.stringify drops undefined keys and uses no whitespace
+    meta = {k: metadata[k] for k in ('name', 'description', 'creator') if metadata.get(k) is not None}
+    meta_json = json.dumps(meta, separators=(',', ':'), ensure_ascii=False)
+    combined = (_sha256_file(weights_path) + _sha256_file(dataset_path)
+                + hashlib.sha256(meta_json.encode()).hexdigest())
+    return str(int(hashlib.sha256(combined.encode()).hexdigest(), 16) % FIELD_MODULUS)
+
+
+def derive_salts(master: str, count: int, weights_hash_hex: str) -> list[int]:
+    """row_salt[i] = SHA-256(master_salt || i || weightsHash) mod p, like `deriveSalts`."""
+    return [int(hashlib.sha256(f'{master}{i}{weights_hash_hex}'.encode()).hexdigest(), 16) % FIELD_MODULUS
+            for i in range(count)]
+
+
+def read_dataset(path) -> np.ndarray:
+    """Integer-encoded rows of a CSV (header skipped), as hashed by the SDK."""
+    import pandas as pd
+
+    rows = pd.read_csv(path, dtype=np.int64).to_numpy()
+    if len(rows) == 0:
+        raise ValueError(f"{path} contains no rows")
+    if (rows < 0).any():
+        raise ValueError(f"{path} contains negative values; the dataset must be non-negative integers")
+    return rows
+
+
+def _hash_columns(columns) -> list[int]:
+    return hash_many(columns).tolist()
+
+
+def hash_batched(columns, pool) -> np.ndarray:
+    """hash_many over `columns`, split into _BATCH-sized tasks when a pool is given."""
+    n = len(columns[0])
+    if pool is None or n <= _BATCH:
+        return hash_many(columns)
+    tasks = [[col[i:i + _BATCH] for col in columns] for i in range(0, n, _BATCH)]
+    out = np.empty(n, dtype=object)
+    for i, hashes in zip(range(0, n, _BATCH), pool.map(_hash_columns, tasks)):
+        out[i:i + len(hashes)] = hashes
+    return out
+
+
+def hash_leaves(rows: np.ndarray, salts: list[int], pool=None) -> np.ndarray:
+    """Poseidon(row ++ salt) for every row, like `hashRow`."""
+    columns = [rows[:, j].astype(object) for j in range(rows.shape[1])]
+    columns.append(np.array(salts, dtype=object))
+    return hash_batched(columns, pool)
+
+
+def build_levels(leaves: np.ndarray, pool=None) -> list[np.ndarray]:
+    """All tree levels from the leaves up to the root; odd levels duplicate their last node."""
+    levels = [leaves]
+    while len(levels[-1]) > 1:
+        level = levels[-1]
+        left = level[0::2]
+        right = level[1::2]
+        if len(right) < len(left):
+            right = np.append(right, level[-1:])
+        levels.append(hash_batched([left, right], pool))
+    return levels
+
+
+def merkle_proofs(levels: list[np.ndarray], max_height: int = MAX_TREE_HEIGHT):
+    """Circuit-format proofs for every leaf, like `generateAllMerkleProofs`.
+
+    Paths are padded with "0" (and truncated) to `max_height`; a flag is True
+    when the node on the path is a left child.
+    """
+    n = len(levels[0])
+    leaf_idx = np.arange(n)
+    depth = min(len(levels) - 1, max_height)
+    paths = np.full((n, max_height), '0', dtype=object)
+    flags = np.zeros((n, max_height), dtype=bool)
+    for height in range(depth):
+        level = levels[height]
+        hexes = np.array(['0x' + to_hex(v) for v in level], dtype=object)
+        idx = leaf_idx >> height
+        sibling = idx ^ 1
+        # A missing right sibling means the node was paired with itself
+        sibling = np.where(sibling < len(level), sibling, idx)
+        paths[:, height] = hexes[sibling]
+        flags[:, height] = (idx & 1) == 0
+    return paths.tolist(), flags.tolist()
+
+
+def make_pool(workers, leaf_inputs):
+    """Process pool for `hash_batched` (None for a single worker), primed for `leaf_inputs`-wide leaves."""
+    if workers <= 1:
+        return None
+    # Parameter derivation takes ~1s per width, so derive once and ship it to the workers
+    return ProcessPoolExecutor(max_workers=workers, initializer=poseidon.install_params,
+                               initargs=(poseidon.params(3), poseidon.params(leaf_inputs + 1)))
+
+
+def cli_metadata(model: dict) -> dict:
+    """model.json in the shape the CLI passes to the SDK (see apps/cli/impl/commit.ts)."""
+    return {
+        'name': model.get('name') or 'Unnamed Model',
+        'description': model.get('description') or 'No description',
+        'creator': model.get('creator') or '',
+        'inferenceUrl': model.get('inferenceUrl'),
+    }
+
+
+def build_commitment(dataset_path, weights_path, metadata, workers=None) -> dict:
+    """Everything the SDK stores in ~/.zkfair/<weightsHash>/ for this dataset and model."""
+    if workers is None:
+        workers = os.cpu_count() or 1
+    timings = {}
+    start = time.perf_counter()
+
+    w_hash = weights_hash(weights_path)
+    salt = master_salt(weights_path, dataset_path, metadata)
+    rows = read_dataset(dataset_path)
+    salts = derive_salts(salt, len(rows), w_hash)
+    timings['salts'] = time.perf_counter() - start
+
+    pool = make_pool(workers, rows.shape[1] + 1)
+    try:
+        t0 = time.perf_counter()
+        leaves = hash_leaves(rows, salts, pool)
+        timings['leaves'] = time.perf_counter() - t0
+
+        t0 = time.perf_counter()
+        levels = build_levels(leaves, pool)
+        timings['tree'] = time.perf_counter() - t0
+    finally:
+        if pool is not None:
+            pool.shutdown()
+
+    t0 = time.perf_counter()
+    merkle_paths, is_even_flags = merkle_proofs(levels)
+    timings['proofs'] = time.perf_counter() - t0
+    timings['total'] = time.perf_counter() - start
+
+    return {
+        'masterSalt': salt,
+        'salts': {str(i): str(s) for i, s in enumerate(salts)},
+        'weightsHash': w_hash,
+        'datasetMerkleRoot': '0x' + to_hex(levels[-1][0]),
+        'merklePaths': merkle_paths,
+        'isEvenFlags': is_even_flags,
+        'rows': len(rows),
+        'timings': timings,
+    }
+
+
+def write_commitment(out_dir, commitment, metadata=None, paths=None):
+    """Write the artifacts with the SDK's file names and JSON.stringify(x, null, 2) formatting."""
+    out_dir = Path(out_dir)
+    write_bytes(out_dir / 'master_salt.txt', commitment['masterSalt'].encode())
+    write_json(out_dir / 'salts.json', commitment['salts'])
+    write_json(out_dir / 'commitments.json', {
+        'datasetMerkleRoot': commitment['datasetMerkleRoot'],
+        'weightsHash': commitment['weightsHash'],
+    })
+    write_json(out_dir / 'merkle_proofs.json', {
+        'merklePaths': commitment['merklePaths'],
+        'isEvenFlags': commitment['isEvenFlags'],
+    })
+    if metadata is not None:
+        write_json(out_dir / 'metadata.json', metadata)
+    if paths is not None:
+        write_json(out_dir / 'paths.json', paths)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--dataset', default='dataset_encoded.csv')
+    parser.add_argument('--weights', default='weights.bin')
+    parser.add_argument('--fairness-threshold', default='fairness_threshold.json')
+    parser.add_argument('--metadata', default='model.json', help="model.json with name/description/creator")
+    parser.add_argument('--out', default=str(COMMITMENT_DIR))
+    parser.add_argument('--sdk-cache', action='store_true',
+                        help="also populate ~/.zkfair/<weightsHash>/ so `zkfair commit` reuses it")
+    parser.add_argument('--workers', type=int, default=None, help="hashing processes (default: all cores)")
+    args = parser.parse_args()
+
+    with open(args.metadata) as f:
+        metadata = cli_metadata(json.load(f))
+    # The CLI resolves every path before committing, and the salt depends on the file contents only
+    paths = {
+        'dataset': str(Path(args.dataset).resolve()),
+        'weights': str(Path(args.weights).resolve()),
+        'fairnessThreshold': str(Path(args.fairness_threshold).resolve()),
+    }
+
+    commitment = build_commitment(paths['dataset'], paths['weights'], metadata, args.workers)
+    timings = commitment['timings']
+    print(f" Rows: {commitment['rows']}")
+    print(f" Weights Hash: {commitment['weightsHash']}")
+    print(f" Dataset Merkle Root: {commitment['datasetMerkleRoot']}")
+    print(f" Time: {timings['total']:.2f}s (leaves {timings['leaves']:.2f}s, tree {timings['tree']:.2f}s, "
+          f"proofs {timings['proofs']:.2f}s)")
+
+    write_commitment(args.out, commitment)
+    print(f" Saved: {args.out}/")
+    if args.sdk_cache:
+        cache_dir = Path.home() / '.zkfair' / commitment['weightsHash'][2:]
+        write_commitment(cache_dir, commitment, metadata, paths)
+        print(f" Saved: {cache_dir}/")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,307 @@
+"""Smallest calibration subset whose fairness rates stay within a bound of the full set.
+
+Proving cost grows with the rows proven, but what an auditor checks are a few
+per-group rates. This picks a plain (unweighted, as the circuits count rows)
+subset of calibration_dataset.csv whose rates match the full set's to within
+`epsilon`:
+
+- per protected group: positive rate, TPR and FPR;
+- for the model's own predictions (logit > 0, what the training circuit
+  computes) and for the per-group thresholds of fairness_metrics.json.
+
+Rows are stratified by (group, label, raw prediction, thresholded
+prediction). Each of those rates is a ratio of stratum counts, so they are
+fully determined by how many rows each stratum contributes. For every
+candidate size k, the k rows are split over the strata by largest remainder
+(vectorized over all k at once). The rates follow from the counts with the
+circuits' `count * THRESHOLD_SCALE // total` arithmetic. The smallest k whose
+worst rate error is at most `epsilon` wins. The bound is exact for the chosen
+rows, not a probabilistic estimate.
+
+Inside a stratum the rows are taken at evenly spaced ranks of the model score
+(systematic sampling), which keeps the score distribution close, but the
+rates above are only bounded at the fixed full-set thresholds. Algorithm 1
+rerun on the subset can still pick different thresholds, so the report
+evaluates those on the full set, and with `epsilon` the coreset is doubled
+(again taking the smallest size within `epsilon` from there) until their
+full-set gap is at most the threshold tolerance plus `epsilon`. A fixed
+`rows` coreset that misses that bound is flagged in the report.
+
+Everything is one lexsort plus array arithmetic over the strata, i.e.
+O(n log n) in the calibration rows and O(n * strata) for the size scan.
+
+    uv run main.py --coreset 0.01                     # pipeline stage -> calibration_coreset.csv
+    uv run coreset.py --epsilon 0.005                 # standalone, prints the size/bound trade-off
+    uv run coreset.py --rows 500                      # fixed size: report the bound it reaches
+"""
+import argparse
+import json
+import pickle
+
+import numpy as np
+
+from thresholds import THRESHOLD_SCALE, optimize_thresholds, quantize_scores
+
+RATES = ('positiveRate', 'tpr', 'fpr')
+PREDICTIONS = ('raw', 'thresholded')
+
+
+def strata_of(groups, y, raw, thresholded) -> tuple[np.ndarray, np.ndarray]:
+    """Stratum code of every row (group index, label, both predictions) and the group values."""
+    values, g = np.unique(groups, return_inverse=True)
+    return ((g.reshape(-1) * 2 + y) * 2 + raw) * 2 + thresholded, values
+
+
+def _rates(counts, scale: int) -> np.ndarray:
+    """Scaled rates from stratum counts shaped (..., groups, label, raw, thresholded).
+
+    Returns (..., groups, 2 predictions, 3 rates); -1 where a rate is undefined.
+    """
+    out = []
+    # Summing out the other prediction leaves (..., groups, label, prediction)
+    for other in (-1, -2):
+        c = counts.sum(axis=other)
+        tn, fp, fn, tp = c[..., 0, 0], c[..., 0, 1], c[..., 1, 0], c[..., 1, 1]
+        rates = []
+        for num, den in ((fp + tp, tn + fp + fn + tp), (tp, fn + tp), (fp, tn + fp)):
+            rates.append(np.where(den > 0, num * scale // np.maximum(den, 1), -1))
+        out.append(np.stack(rates, axis=-1))
+    return np.stack(out, axis=-2)
+
+
+def allocate(sizes, ks) -> np.ndarray:
+    """Rows per stratum for every k in `ks`: largest-remainder split of k proportional to `sizes`."""
+    sizes = np.asarray(sizes, dtype=np.int64)
+    ks = np.asarray(ks, dtype=np.int64)
+    total = sizes.sum()
+    quota = ks[:, None] * sizes[None, :]
+    alloc = quota // total
+    left = ks - alloc.sum(axis=1)
+    # Integer remainders, ties broken by stratum order so the result is deterministic
+    order = np.argsort(-(quota % total), axis=1, kind='stable')
+    rank = np.empty_like(order)
+    np.put_along_axis(rank, order, np.arange(sizes.size)[None, :], axis=1)
+    return alloc + (rank < left[:, None])
+
+
+def rate_errors(sizes, alloc, n_groups: int, scale: int) -> np.ndarray:
+    """Largest absolute rate difference (scaled) for each allocation; inf if a rate becomes undefined."""
+    full = _rates(np.asarray(sizes).reshape(n_groups, 2, 2, 2), scale)
+    sub = _rates(alloc.reshape(len(alloc), n_groups, 2, 2, 2), scale)
+    defined = full >= 0
+    diff = np.where(defined, np.abs(sub - full), 0).astype(np.float64)
+    diff[(sub < 0) & defined] = np.inf
+    return diff.reshape(len(alloc), -1).max(axis=1)
+
+
+def systematic_pick(codes, scores, alloc, n_strata: int) -> np.ndarray:
+    """Row indices: `alloc[s]` rows of stratum s, at evenly spaced score ranks."""
+    order = np.lexsort((scores, codes))
+    starts = np.searchsorted(codes[order], np.arange(n_strata + 1))
+    sizes = np.diff(starts)
+    # The i-th pick of stratum s sits at rank floor((i + 0.5) * size / alloc) inside it
+    stratum = np.repeat(np.arange(n_strata), alloc)
+    i = np.arange(alloc.sum()) - np.repeat(np.cumsum(alloc) - alloc, alloc)
+    rank = ((2 * i + 1) * sizes[stratum]) // (2 * alloc[stratum])
+    return np.sort(order[starts[stratum] + rank])
+
+
+def select(scores, y, groups, thresholds_scaled: dict, epsilon: float | None = None, rows: int | None = None,
+           max_rows: int | None = None, min_rows: int = 1, scale: int = THRESHOLD_SCALE) -> dict:
+    """Choose the coreset; returns its row indices, size and the error bound reached.
+
+    Exactly one of `epsilon` (smallest subset of at least `min_rows` within
+    the bound) and `rows` (fixed size) is given. `thresholds_scaled` maps a
+    group value to its scaled threshold; groups without one use the raw
+    prediction.
+    """
+    if (epsilon is None) == (rows is None):
+        raise ValueError("give either epsilon or rows")
+    y = np.asarray(y, dtype=np.int64)
+    groups = np.asarray(groups)
+    raw = (np.asarray(scores) > 0).astype(np.int64)
+    q = quantize_scores(scores, scale)
+    thresholded = raw.copy()
+    for group, cut in thresholds_scaled.items():
+        in_group = groups == group
+        thresholded[in_group] = q[in_group] >= cut
+
+    codes, values = strata_of(groups, y, raw, thresholded)
+    n_strata = len(values) * 8
+    sizes = np.bincount(codes, minlength=n_strata)
+    n = len(y)
+
+    if rows is not None:
+        ks = np.array([min(rows, n)])
+    else:
+        ks = np.arange(min(min_rows, n), min(n, max_rows or n) + 1)
+    errors = np.empty(len(ks))
+    # Bounded memory for large calibration sets: scan the sizes in blocks
+    for a in range(0, len(ks), 65536):
+        errors[a:a + 65536] = rate_errors(sizes, allocate(sizes, ks[a:a + 65536]), len(values), scale)
+    if rows is None:
+        ok = np.flatnonzero(errors <= epsilon * scale)
+        if not len(ok):
+            raise ValueError(f"no subset of at most {ks[-1]} rows reaches epsilon={epsilon}; "
+                             f"the best is {errors.min() / scale:.4f} at {ks[errors.argmin()]} rows")
+        best = ok[0]
+    else:
+        best = 0
+    alloc = allocate(sizes, ks[best:best + 1])[0]
+    picked = systematic_pick(codes, np.asarray(scores, dtype=np.float64), alloc, n_strata)
+
+    # Recomputed from the chosen rows, as a check of the allocation arithmetic
+    sub_sizes = np.bincount(codes[picked], minlength=n_strata)
+    assert (sub_sizes == alloc).all()
+    full = _rates(sizes.reshape(len(values), 2, 2, 2), scale)
+    sub = _rates(sub_sizes.reshape(len(values), 2, 2, 2), scale)
+    return {
+        'indices': picked,
+        'rows': int(len(picked)),
+        'sourceRows': n,
+        'bound': float(errors[best] / scale),
+        'groups': [v.item() for v in values],
+        'strata': {'sizes': sizes.tolist(), 'selected': alloc.tolist()},
+        'rates': {
+            pred: {str(v.item()): {rate: {'full': _scaled(full[gi, pi, ri], scale),
+                                          'coreset': _scaled(sub[gi, pi, ri], scale)}
+                                   for ri, rate in enumerate(RATES)}
+                   for gi, v in enumerate(values)}
+            for pi, pred in enumerate(PREDICTIONS)
+        },
+        'tradeoff': _tradeoff(ks, errors, scale),
+    }
+
+
+def _scaled(value, scale):
+    return None if value < 0 else int(value) / scale
+
+
+def _tradeoff(ks, errors, scale) -> list:
+    """Smallest size reaching a few round bounds, for the report."""
+    out = []
+    for bound in (0.05, 0.02, 0.01, 0.005, 0.002, 0.001, 0.0):
+        ok = np.flatnonzero(errors <= bound * scale)
+        if len(ok):
+            out.append({'bound': bound, 'rows': int(ks[ok[0]])})
+    return out
+
+
+def threshold_check(scores, y, groups, picked, objective: str, tolerance: float, full_result,
+                    scale: int = THRESHOLD_SCALE) -> dict:
+    """Algorithm 1 on the coreset, and its thresholds evaluated on the full set."""
+    two = (groups == 0) | (groups == 1)
+    sub = np.zeros(len(y), dtype=bool)
+    sub[picked] = True
+    sub &= two
+    result = optimize_thresholds(scores[sub], y[sub], groups[sub], objective=objective, tolerance=tolerance,
+                                 scale=scale)
+    # The coreset's thresholds applied to every calibration row
+    q = quantize_scores(scores[two], scale)
+    cut = np.where(groups[two] == result.groups[0], result.thresholds_scaled[0], result.thresholds_scaled[1])
+    pred = (q >= cut).astype(np.int64)
+    from fairness import confusion_matrices, disparities, group_rates
+
+    rates = group_rates(confusion_matrices(groups[two], y[two], pred, n_groups=2))
+    gaps = disparities(rates)
+    gap_key = {'demographic_parity': 'demographic_parity', 'equal_opportunity': 'tpr_gap',
+               'equalized_odds': 'equalized_odds'}[objective]
+    return {
+        'objective': objective,
+        'fullThresholds': full_result['thresholds'],
+        'coresetThresholds': result.thresholds,
+        'coresetGap': result.gap / scale,
+        'coresetAccuracy': result.accuracy,
+        # What the coreset's thresholds would do on the whole calibration set
+        'fullSetGap': float(gaps[gap_key]),
+        'fullSetAccuracy': float((pred == y[two]).mean()),
+        'fullAccuracy': full_result['accuracy'],
+    }
+
+
+def build_coreset(model_pkl, calibration_path, fairness_metrics_path, target: str, protected: str,
+                  epsilon=None, rows=None, max_rows=None, objective='equalized_odds', tolerance=0.01,
+                  scale: int = THRESHOLD_SCALE):
+    """Select the coreset of a calibration CSV; returns (the selected rows as a DataFrame, the report)."""
+    import pandas as pd
+
+    with open(model_pkl, 'rb') as f:
+        model = pickle.load(f)
+    with open(fairness_metrics_path) as f:
+        metrics = json.load(f)
+    calibration = pd.read_csv(calibration_path)
+    X = calibration.drop(target, axis=1)
+    y = calibration[target].to_numpy(dtype=np.int64)
+    groups = X[protected].to_numpy()
+    scores = model.decision_function(X)
+
+    # Group 0 uses threshold a, group 1 threshold b (see compute_fairness_metrics)
+    thresholds = dict(zip((0, 1), metrics['thresholdsScaled']))
+    full_result = {'thresholds': [metrics['thresholdGroupA'], metrics['thresholdGroupB']],
+                   'accuracy': metrics['thresholdAccuracy']}
+    result = select(scores, y, groups, thresholds, epsilon=epsilon, rows=rows, max_rows=max_rows, scale=scale)
+    picked = result.pop('indices')
+    search = threshold_check(scores, y, groups, picked, objective, tolerance, full_result, scale)
+    bound = tolerance + (epsilon if epsilon is not None else result['bound'])
+    if epsilon is not None:
+        # The rate bound says nothing about the thresholds Algorithm 1 finds on the subset: grow the
+        # coreset until they stay within the bound on the full set too (at every row they are the full set's)
+        tradeoff = result['tradeoff']
+        largest = min(len(y), max_rows or len(y))
+        while search['fullSetGap'] > bound and result['rows'] < largest:
+            result = select(scores, y, groups, thresholds, epsilon=epsilon, max_rows=max_rows,
+                            min_rows=min(2 * result['rows'], largest), scale=scale)
+            picked = result.pop('indices')
+            search = threshold_check(scores, y, groups, picked, objective, tolerance, full_result, scale)
+        result['tradeoff'] = tradeoff
+    search['bound'] = bound
+    search['withinBound'] = search['fullSetGap'] <= bound
+    result['epsilon'] = epsilon
+    result['thresholdsScaled'] = thresholds
+    result['thresholdSearch'] = search
+    return calibration.iloc[picked], result
+
+
+def print_report(report: dict):
+    print(f"\n Coreset: {report['rows']} of {report['sourceRows']} calibration rows, "
+          f"every rate within {report['bound']:.4f} of the full set")
+    for pred, by_group in report['rates'].items():
+        for group, rates in by_group.items():
+            cells = '  '.join(f"{name}={r['coreset']}/{r['full']}" for name, r in rates.items())
+            print(f"    {pred:<12} group {group}: {cells}  (coreset/full)")
+    t = report['thresholdSearch']
+    print(f"    Thresholds from the coreset: {[round(x, 4) for x in t['coresetThresholds']]} "
+          f"(full: {[round(x, 4) for x in t['fullThresholds']]}); on the full set they give "
+          f"accuracy {t['fullSetAccuracy']:.4f} (full thresholds: {t['fullAccuracy']:.4f}), gap {t['fullSetGap']:.4f}")
+    if not t['withinBound']:
+        print(f"    WARNING: that gap exceeds tolerance + bound ({t['bound']:.4f}); "
+              f"the coreset does not preserve the threshold search")
+    print("    Rows needed per bound: " + ', '.join(f"{p['bound']}: {p['rows']}" for p in report['tradeoff']))
+
+
+def main():
+    from build import write_csv, write_json
+    from main import CORESET_CSV, CORESET_REPORT, FAIRNESS_METRICS, MODEL_PKL, load_config
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    size = parser.add_mutually_exclusive_group()
+    size.add_argument('--epsilon', type=float, help="largest allowed rate error (default 0.01)")
+    size.add_argument('--rows', type=int, help="fixed coreset size; report the bound it reaches")
+    parser.add_argument('--max-rows', type=int, default=None, help="largest size considered for --epsilon")
+    parser.add_argument('--calibration', default='calibration_dataset.csv')
+    parser.add_argument('--out', default=CORESET_CSV)
+    args = parser.parse_args()
+
+    config = load_config('.')
+    epsilon = args.epsilon if args.epsilon is not None or args.rows is not None else 0.01
+    rows, report = build_coreset(MODEL_PKL, args.calibration, FAIRNESS_METRICS, config['target']['column'],
+                                 config['protectedAttribute'], epsilon=epsilon, rows=args.rows,
+                                 max_rows=args.max_rows)
+    print_report(report)
+    write_csv(args.out, rows)
+    write_json(CORESET_REPORT, report)
+    print(f" Saved: {args.out}, {CORESET_REPORT}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,611 @@
+"""Feature drift of live queries against calibration_dataset.csv, from fixed-size sketches.
+
+The registered thresholds are only fair while live traffic looks like the
+calibration set. This module compares the two per feature and per protected
+group (A: `sensitive_attr == 0`, B: otherwise, as in the circuit and
+fairness_monitor.py). It never holds the raw rows:
+
+- numeric features go into a KLL quantile sketch. This is a stack of sorted
+  levels, where level h holds items of weight 2^h. A full level is sorted and
+  every other item moves up a level. Capacities shrink by 2/3 per level
+  below the top, so a sketch keeps under 2k items whatever the row count
+  (about 960 at k=512). Whether odd or even positions move up is decided by a
+  hash of (level, compaction number) rather than a random draw, so results
+  are reproducible. At k=512 the worst rank error over the percentiles of
+  1M rows is about 0.4%.
+- categorical features (the columns of label_encoders.json) go into count
+  tables. These have one cell per code and one for codes outside the
+  vocabulary.
+
+Both kinds merge exactly: levels are concatenated and recompacted, counts
+are added. Sketches from several server instances (one state file each)
+therefore combine with `merge`, in any order.
+
+Scores come from the sketches alone:
+- PSI over the reference deciles (numeric) or the codes (categorical), with
+  half a count added to every bin so that empty bins stay finite;
+- KS, the largest CDF gap at every point either sketch retains (numeric);
+- total variation distance (categorical).
+PSI >= 0.1 is reported as moderate and >= 0.25 as major, the usual
+conventions.
+
+`main.py` writes the reference sketches (drift_reference.json). `monitor`
+tails the server's zkfair_query_logs the way fairness_monitor.py does, one
+zkfair_batches row at a time. It scores each batch on its own and adds it
+into the cumulative live sketches kept in `--state`.
+
+    uv run drift.py reference                                # calibration_dataset.csv -> drift_reference.json
+    uv run drift.py monitor --once                           # ../../apps/server/zkfair.db, model 1
+    uv run drift.py merge a/drift_state.json b/drift_state.json --json .build/drift_merged.json
+    uv run drift.py bench --queries 1000000                  # synthetic log whose second half drifts
+"""
+import argparse
+import json
+import sqlite3
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from pathlib import Path
+
+import numpy as np
+
+from build import BUILD_DIR, write_json
+from fairness_monitor import FETCH_ROWS, SERVER_DB
+
+DRIFT_REFERENCE = 'drift_reference.json'
+STATE_FILE = BUILD_DIR / 'drift_state.json'
+GROUPS = ('A', 'B')
+DEFAULT_K = 512
+PSI_MODERATE, PSI_MAJOR = 0.1, 0.25
+PSI_BINS = 10
+# Batch scores kept in the state; older ones only live on in the cumulative sketches
+RECENT_BATCHES = 100
+
+
+def _coin(level: int, count: int) -> int:
+    """A fair, reproducible bit per (level, compaction): the low bit of splitmix64."""
+    z = ((level << 32 | count) + 0x9E3779B97F4A7C15) & 0xFFFFFFFFFFFFFFFF
+    z = (z ^ z >> 30) * 0xBF58476D1CE4E5B9 & 0xFFFFFFFFFFFFFFFF
+    z = (z ^ z >> 27) * 0x94D049BB133111EB & 0xFFFFFFFFFFFFFFFF
+    return (z ^ z >> 31) & 1
+
+
+class QuantileSketch:
+    """Mergeable KLL sketch of a numeric stream; under 2k items of memory."""
+
+    kind = 'numeric'
+
+    def __init__(self, k: int = DEFAULT_K):
+        self.k = k
+        self.n = 0
+        self.levels = [np.empty(0)]
+        self.compactions = [0]
+        # Sorted items and cumulative weights, until the next update or merge
+        self._sorted = None
+
+    def _capacity(self, h: int) -> int:
+        return max(2, int(np.ceil(self.k * (2 / 3) ** (len(self.levels) - 1 - h))))
+
+    def _compress(self):
+        h = 0
+        while h < len(self.levels):
+            level = self.levels[h]
+            if len(level) > self._capacity(h):
+                if h + 1 == len(self.levels):
+                    self.levels.append(np.empty(0))
+                    self.compactions.append(0)
+                items = np.sort(level)
+                odd = len(items) % 2
+                offset = _coin(h, self.compactions[h])
+                self.compactions[h] += 1
+                self.levels[h + 1] = np.concatenate([self.levels[h + 1], items[odd + offset::2]])
+                self.levels[h] = items[:odd]
+            h += 1
+
+    def update(self, values):
+        values = np.asarray(values, dtype=np.float64).ravel()
+        if not len(values):
+            return
+        self.n += len(values)
+        self.levels[0] = np.concatenate([self.levels[0], values])
+        self._compress()
+        self._sorted = None
+
+    def merge(self, other: 'QuantileSketch'):
+        while len(self.levels) < len(other.levels):
+            self.levels.append(np.empty(0))
+            self.compactions.append(0)
+        for h, level in enumerate(other.levels):
+            self.levels[h] = np.concatenate([self.levels[h], level])
+            self.compactions[h] += other.compactions[h]
+        self.n += other.n
+        self._compress()
+        self._sorted = None
+
+    def sorted(self) -> tuple[np.ndarray, np.ndarray]:
+        """Retained items, sorted, and the fraction of the weight at or below each."""
+        if self._sorted is None:
+            items = np.concatenate(self.levels)
+            weights = np.repeat(2.0 ** np.arange(len(self.levels)), [len(level) for level in self.levels])
+            order = np.argsort(items, kind='stable')
+            cumulative = np.cumsum(weights[order])
+            self._sorted = items[order], cumulative / cumulative[-1] if len(items) else cumulative
+        return self._sorted
+
+    def cdf(self, x) -> np.ndarray:
+        """Estimated P(value <= x), for each x."""
+        items, cumulative = self.sorted()
+        return np.concatenate([[0.0], cumulative])[np.searchsorted(items, x, side='right')]
+
+    def quantiles(self, q) -> np.ndarray:
+        items, cumulative = self.sorted()
+        return items[np.minimum(np.searchsorted(cumulative, q, side='left'), len(items) - 1)]
+
+    @property
+    def retained(self) -> int:
+        return sum(len(level) for level in self.levels)
+
+    def to_dict(self) -> dict:
+        return {'kind': self.kind, 'k': self.k, 'n': self.n, 'compactions': self.compactions,
+                'levels': [level.tolist() for level in self.levels]}
+
+    @classmethod
+    def from_dict(cls, d: dict) -> 'QuantileSketch':
+        sketch = cls(d['k'])
+        sketch.n = d['n']
+        sketch.compactions = list(d['compactions'])
+        sketch.levels = [np.asarray(level, dtype=np.float64) for level in d['levels']]
+        return sketch
+
+
+class CountTable:
+    """Counts of an encoded categorical; the last cell counts codes outside the vocabulary."""
+
+    kind = 'categorical'
+
+    def __init__(self, size: int):
+        self.counts = np.zeros(size + 1, dtype=np.int64)
+
+    @property
+    def n(self) -> int:
+        return int(self.counts.sum())
+
+    def update(self, values):
+        codes = np.asarray(values, dtype=np.float64).ravel()
+        size = len(self.counts) - 1
+        valid = (codes >= 0) & (codes < size) & (codes == np.round(codes))
+        codes = np.where(valid, codes, size).astype(np.int64)
+        self.counts += np.bincount(codes, minlength=size + 1)
+
+    def merge(self, other: 'CountTable'):
+        self.counts += other.counts
+
+    def proportions(self) -> np.ndarray:
+        return self.counts / max(self.n, 1)
+
+    @property
+    def retained(self) -> int:
+        return len(self.counts)
+
+    def to_dict(self) -> dict:
+        return {'kind': self.kind, 'counts': self.counts.tolist()}
+
+    @classmethod
+    def from_dict(cls, d: dict) -> 'CountTable':
+        table = cls(len(d['counts']) - 1)
+        table.counts = np.asarray(d['counts'], dtype=np.int64)
+        return table
+
+
+def _sketch_from_dict(d: dict):
+    return (QuantileSketch if d['kind'] == 'numeric' else CountTable).from_dict(d)
+
+
+@dataclass
+class FeatureSketches:
+    """One sketch per (group, feature), all updated from the same rows."""
+    features: list[str]
+    vocab_sizes: dict[str, int]
+    k: int = DEFAULT_K
+    groups: dict = field(default_factory=dict)
+    _combined: dict = field(default_factory=dict, init=False, repr=False)
+
+    def __post_init__(self):
+        for g in GROUPS:
+            self.groups.setdefault(g, {name: self._new(name) for name in self.features})
+
+    def _new(self, name):
+        return CountTable(self.vocab_sizes[name]) if name in self.vocab_sizes else QuantileSketch(self.k)
+
+    def update(self, X: np.ndarray, sensitive: np.ndarray):
+        """Add rows of the encoded feature matrix `X`, split by the sensitive attribute."""
+        self._combined.clear()
+        X = np.asarray(X, dtype=np.float64)
+        group_b = np.asarray(sensitive) != 0
+        for g, mask in zip(GROUPS, (~group_b, group_b)):
+            if mask.any():
+                rows = X[mask]
+                for j, name in enumerate(self.features):
+                    self.groups[g][name].update(rows[:, j])
+
+    def merge(self, other: 'FeatureSketches'):
+        if other.features != self.features or other.k != self.k:
+            raise ValueError(f"sketches differ: {self.features} (k={self.k}) vs {other.features} (k={other.k})")
+        self._combined.clear()
+        for g in GROUPS:
+            for name in self.features:
+                self.groups[g][name].merge(other.groups[g][name])
+
+    def combined(self, name):
+        """Both groups' sketches of `name` merged (a copy, kept until the next update or merge)."""
+        if name not in self._combined:
+            sketch = _sketch_from_dict(self.groups['A'][name].to_dict())
+            sketch.merge(self.groups['B'][name])
+            self._combined[name] = sketch
+        return self._combined[name]
+
+    def rows(self) -> dict:
+        first = self.features[0]
+        return {g: self.groups[g][first].n for g in GROUPS}
+
+    @property
+    def retained(self) -> int:
+        return sum(s.retained for g in GROUPS for s in self.groups[g].values())
+
+    def to_dict(self) -> dict:
+        return {'features': self.features, 'vocabSizes': self.vocab_sizes, 'k': self.k,
+                'groups': {g: {name: s.to_dict() for name, s in self.groups[g].items()} for g in GROUPS}}
+
+    @classmethod
+    def from_dict(cls, d: dict) -> 'FeatureSketches':
+        return cls(d['features'], d['vocabSizes'], d['k'],
+                   {g: {name: _sketch_from_dict(s) for name, s in d['groups'][g].items()} for g in GROUPS})
+
+
+def psi(expected: np.ndarray, actual: np.ndarray) -> float:
+    """PSI between two count vectors, each smoothed by half a count per bin (so empty bins stay finite)."""
+    p = np.asarray(expected, dtype=np.float64) + 0.5
+    q = np.asarray(actual, dtype=np.float64) + 0.5
+    p, q = p / p.sum(), q / q.sum()
+    return float(np.sum((q - p) * np.log(q / p)))
+
+
+def noise_psi(bins: int, n_reference: int, n_live: int) -> float:
+    """PSI that sampling alone exceeds 0.1% of the time: n_eff * PSI is about chi-square with bins - 1 df.
+
+    0.1% rather than 1% because a batch is scored on every feature at once.
+    """
+    df = max(bins - 1, 1)
+    # Wilson-Hilferty approximation of the chi-square 0.999 quantile (z = 3.090)
+    chi2 = df * (1 - 2 / (9 * df) + 3.090 * np.sqrt(2 / (9 * df))) ** 3
+    return float(chi2 * (n_reference + n_live) / (n_reference * n_live))
+
+
+def compare(reference, live) -> dict:
+    """Drift of one live sketch against its reference sketch."""
+    if isinstance(reference, CountTable):
+        p, q = reference.proportions(), live.proportions()
+        bins = int(((p > 0) | (q > 0)).sum())
+        return {'psi': psi(reference.counts, live.counts), 'noisePsi': noise_psi(bins, reference.n, live.n),
+                'tvd': float(np.abs(p - q).sum() / 2), 'unseen': float(q[-1])}
+    edges = np.unique(reference.quantiles(np.arange(1, PSI_BINS) / PSI_BINS))
+    counts = lambda s: s.n * np.diff(np.concatenate([[0.0], s.cdf(edges), [1.0]]))  # noqa: E731
+    points = np.concatenate([reference.sorted()[0], live.sorted()[0]])
+    return {'psi': psi(counts(reference), counts(live)), 'noisePsi': noise_psi(len(edges) + 1, reference.n, live.n),
+            'ks': float(np.abs(reference.cdf(points) - live.cdf(points)).max())}
+
+
+def severity(score: dict) -> str:
+    """PSI band, or 'none' while the PSI is within what sampling noise alone produces."""
+    if score['psi'] <= score['noisePsi']:
+        return 'none'
+    return 'major' if score['psi'] >= PSI_MAJOR else 'moderate' if score['psi'] >= PSI_MODERATE else 'none'
+
+
+def drift_report(reference: FeatureSketches, live: FeatureSketches, min_rows: int = 1) -> dict:
+    """Per feature and group ('A', 'B', 'all') scores; groups with fewer than `min_rows` live rows are skipped."""
+    ref_rows, live_rows = reference.rows(), live.rows()
+    features, alerts = {}, []
+    for name in reference.features:
+        scores = {}
+        for g in GROUPS:
+            if live_rows[g] >= min_rows and ref_rows[g]:
+                scores[g] = compare(reference.groups[g][name], live.groups[g][name])
+        if sum(live_rows.values()) >= min_rows:
+            scores['all'] = compare(reference.combined(name), live.combined(name))
+        kind = 'categorical' if name in reference.vocab_sizes else 'numeric'
+        features[name] = {'kind': kind, 'groups': scores}
+        for g, s in scores.items():
+            if severity(s) != 'none':
+                alerts.append({'feature': name, 'group': g, 'psi': s['psi'], 'severity': severity(s)})
+    ref_share = ref_rows['B'] / max(sum(ref_rows.values()), 1)
+    live_share = live_rows['B'] / max(sum(live_rows.values()), 1)
+    return {
+        'rows': live_rows,
+        'referenceRows': ref_rows,
+        # A change in the group mix moves every rate the thresholds were fitted on
+        'groupMix': {'referenceShareB': ref_share, 'liveShareB': live_share,
+                     'psi': psi([ref_rows['A'], ref_rows['B']], [live_rows['A'], live_rows['B']])},
+        'maxPsi': max((s['psi'] for f in features.values() for s in f['groups'].values()), default=0.0),
+        'alerts': sorted(alerts, key=lambda a: -a['psi']),
+        'features': features,
+    }
+
+
+def build_reference(data_path, encoders_path, target: str, protected_attribute: str,
+                    k: int = DEFAULT_K) -> FeatureSketches:
+    import pandas as pd
+
+    df = pd.read_csv(data_path)
+    with open(encoders_path) as f:
+        encoders = json.load(f)
+    features = [c for c in df.columns if c != target]
+    sketches = FeatureSketches(features, {name: len(encoders[name]) for name in features if name in encoders}, k)
+    sketches.update(df[features].to_numpy(dtype=np.float64), df[protected_attribute].to_numpy())
+    return sketches
+
+
+def save_sketches(path, sketches: FeatureSketches, **extra) -> bool:
+    return write_json(path, {**extra, **sketches.to_dict()})
+
+
+def load_sketches(path) -> FeatureSketches:
+    with open(path) as f:
+        return FeatureSketches.from_dict(json.load(f))
+
+
+@dataclass
+class DriftState:
+    live: FeatureSketches
+    model_id: int = 1
+    last_batch_rowid: int = 0
+    queries: int = 0
+    # (batch id, rows, maxPsi, alerts) of the latest batches
+    recent: deque = field(default_factory=lambda: deque(maxlen=RECENT_BATCHES))
+
+
+class DriftMonitor:
+    def __init__(self, db_path, reference: FeatureSketches, model_id: int = 1, min_rows: int = 30,
+                 state: DriftState | None = None, on_alert=print):
+        self.db_path = db_path
+        self.reference = reference
+        self.min_rows = min_rows
+        self.state = state or DriftState(FeatureSketches(reference.features, reference.vocab_sizes, reference.k),
+                                         model_id)
+        self.on_alert = on_alert
+        self._connection = None
+
+    @property
+    def connection(self) -> sqlite3.Connection:
+        if self._connection is None:
+            self._connection = sqlite3.connect(f'file:{self.db_path}?mode=ro', uri=True)
+        return self._connection
+
+    def poll(self) -> int:
+        """Score and absorb the batches written since the last poll; returns the number of new queries."""
+        from replay_verify import decode_features
+
+        st = self.state
+        batches = self.connection.execute(
+            'SELECT rowid, id, start_seq, end_seq FROM zkfair_batches WHERE rowid > ? ORDER BY rowid',
+            (st.last_batch_rowid,)).fetchall()
+        read = 0
+        width = len(self.reference.features)
+        for rowid, batch_id, start_seq, end_seq in batches:
+            batch = FeatureSketches(self.reference.features, self.reference.vocab_sizes, self.reference.k)
+            seq = start_seq - 1
+            while True:
+                rows = self.connection.execute(
+                    'SELECT seq, features, sensitive_attr FROM zkfair_query_logs '
+                    'WHERE seq > ? AND seq <= ? AND model_id = ? ORDER BY seq LIMIT ?',
+                    (seq, end_seq, st.model_id, FETCH_ROWS)).fetchall()
+                if rows:
+                    batch.update(decode_features([r[1] for r in rows], width)[:, :width],
+                                 np.array([r[2] for r in rows]))
+                    seq = rows[-1][0]
+                    read += len(rows)
+                if len(rows) < FETCH_ROWS:
+                    break
+            if sum(batch.rows().values()):
+                report = drift_report(self.reference, batch, self.min_rows)
+                st.recent.append((batch_id, sum(report['rows'].values()), report['maxPsi'], report['alerts']))
+                major = [a for a in report['alerts'] if a['severity'] == 'major']
+                if major:
+                    self.on_alert(f" DRIFT batch {batch_id}: " + ', '.join(
+                        f"{a['feature']} ({a['group']}) PSI {a['psi']:.2f}" for a in major[:5]))
+                st.live.merge(batch)
+            st.last_batch_rowid = rowid
+        st.queries += read
+        return read
+
+    def status(self) -> dict:
+        st = self.state
+        return {
+            'modelId': st.model_id,
+            'lastBatchRowid': st.last_batch_rowid,
+            'queries': st.queries,
+            'sketchItems': st.live.retained,
+            'recentBatches': [{'id': b, 'rows': n, 'maxPsi': m, 'alerts': len(a)} for b, n, m, a in st.recent],
+            'cumulative': drift_report(self.reference, st.live, self.min_rows),
+        }
+
+    def close(self):
+        if self._connection is not None:
+            self._connection.close()
+            self._connection = None
+
+
+def save_state(path, state: DriftState):
+    save_sketches(path, state.live, modelId=state.model_id, lastBatchRowid=state.last_batch_rowid,
+                  queries=state.queries, recent=[list(r) for r in state.recent])
+
+
+def load_state(path) -> DriftState | None:
+    if not Path(path).is_file():
+        return None
+    with open(path) as f:
+        d = json.load(f)
+    # Merged states (`merge --out`) have no position or recent batches, but merge again
+    return DriftState(FeatureSketches.from_dict(d), d['modelId'], d.get('lastBatchRowid', 0), d['queries'],
+                      deque((tuple(r) for r in d.get('recent', [])), maxlen=RECENT_BATCHES))
+
+
+def print_report(report: dict, limit: int = 10):
+    rows = report['rows']
+    mix = report['groupMix']
+    print(f" {rows['A']:,} + {rows['B']:,} live rows (A + B); group B share {mix['liveShareB']:.3f} "
+          f"vs {mix['referenceShareB']:.3f} in the reference")
+    print(f" {'feature':<18}{'kind':<13}{'PSI all':>9}{'PSI A':>8}{'PSI B':>8}{'KS/TVD all':>12}")
+    ordered = sorted(report['features'].items(), key=lambda kv: -kv[1]['groups'].get('all', {}).get('psi', 0))
+    for name, f in ordered[:limit]:
+        g = f['groups']
+        cell = lambda key: f"{g[key]['psi']:.3f}" if key in g else '-'  # noqa: E731
+        distance = g.get('all', {}).get('ks', g.get('all', {}).get('tvd'))
+        print(f" {name:<18}{f['kind']:<13}{cell('all'):>9}{cell('A'):>8}{cell('B'):>8}"
+              f"{'-' if distance is None else f'{distance:.3f}':>12}")
+    for a in report['alerts'][:limit]:
+        print(f"    {a['severity']}: {a['feature']} (group {a['group']}) PSI {a['psi']:.3f}")
+
+
+def make_drifting_log(path, data_path, target: str, protected_attribute: str, queries: int,
+                      batch_size: int = 100, shift_feature: str = 'age', shift: int = 8, seed: int = 0):
+    """fairness_monitor's synthetic log with calibration rows as features; the second half's group B is shifted."""
+    import pandas as pd
+
+    from fairness_monitor import make_synthetic_log
+
+    make_synthetic_log(path, queries, batch_size, seed)
+    df = pd.read_csv(data_path)
+    features = [c for c in df.columns if c != target]
+    rng = np.random.default_rng(seed)
+    X = df[features].to_numpy()[rng.integers(0, len(df), queries)]
+    sensitive = X[:, features.index(protected_attribute)].astype(int)
+    drifted = (np.arange(queries) >= queries // 2) & (sensitive != 0)
+    X[drifted, features.index(shift_feature)] += shift
+    con = sqlite3.connect(path)
+    con.executemany('UPDATE zkfair_query_logs SET features = ?, sensitive_attr = ? WHERE seq = ?',
+                    ((json.dumps(row.tolist()), int(s), i + 1) for i, (row, s) in enumerate(zip(X, sensitive))))
+    con.commit()
+    con.close()
+
+
+def bench(reference: FeatureSketches, data_path, target: str, protected_attribute: str, queries: int,
+          batch_size: int = 100) -> dict:
+    import tempfile
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / 'zkfair.db'
+        make_drifting_log(path, data_path, target, protected_attribute, queries, batch_size)
+        alerts = []
+        monitor = DriftMonitor(path, reference, on_alert=alerts.append)
+        start = time.perf_counter()
+        monitor.poll()
+        seconds = time.perf_counter() - start
+        status = monitor.status()
+        monitor.close()
+    # Synthetic batch ids are '<startSeq>-<endSeq>'; the drift starts at the middle query
+    starts = [int(line.split()[2].split('-')[0]) for line in alerts]
+    return {'queries': queries, 'seconds': seconds, 'queriesPerSec': queries / seconds,
+            'sketchItems': status['sketchItems'], 'referenceItems': reference.retained,
+            'batches': -(-queries // batch_size),
+            'alertsBeforeDrift': sum(start <= queries // 2 for start in starts),
+            'alertsAfterDrift': sum(start > queries // 2 for start in starts),
+            'firstAlert': alerts[0].strip() if alerts else None,
+            'cumulative': status['cumulative']}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--config', default='pipeline.json', help="for the target and protected attribute")
+    parser.add_argument('--reference', default=DRIFT_REFERENCE)
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    ref = sub.add_parser('reference', help="sketch the calibration set")
+    ref.add_argument('--data', default='calibration_dataset.csv')
+    ref.add_argument('--encoders', default='label_encoders.json')
+    ref.add_argument('-k', type=int, default=DEFAULT_K, help="quantile sketch size (k=512: ~0.4%% rank error)")
+
+    mon = sub.add_parser('monitor', help="score the server's query log batch by batch")
+    mon.add_argument('--db', default=SERVER_DB, help="the provider server's SQLite database")
+    mon.add_argument('--model-id', type=int, default=1)
+    mon.add_argument('--min-rows', type=int, default=30, help="live rows a group needs before it is scored")
+    mon.add_argument('--interval', type=float, default=5.0, help="seconds between polls")
+    mon.add_argument('--state', default=STATE_FILE, help="where the live sketches are kept ('' to not)")
+    mon.add_argument('--once', action='store_true', help="catch up once, print the drift and exit")
+    mon.add_argument('--json', help="write the status to this file after every poll")
+
+    mrg = sub.add_parser('merge', help="combine the live sketches of several monitor states")
+    mrg.add_argument('states', nargs='+')
+    mrg.add_argument('--out', help="write the merged state here")
+    mrg.add_argument('--json', help="write the drift report here")
+
+    bch = sub.add_parser('bench', help="time the monitor on a synthetic log whose second half drifts")
+    bch.add_argument('--queries', type=int, default=200_000)
+    bch.add_argument('--data', default='calibration_dataset.csv')
+    args = parser.parse_args()
+
+    with open(args.config) as f:
+        config = json.load(f)
+    target, protected = config['target']['column'], config['protectedAttribute']
+
+    if args.command == 'reference':
+        sketches = build_reference(args.data, args.encoders, target, protected, args.k)
+        save_sketches(args.reference, sketches, source=args.data)
+        print(f" Saved: {args.reference} ({sketches.retained:,} sketch items for {sum(sketches.rows().values()):,} "
+              f"rows)")
+        return
+
+    reference = load_sketches(args.reference)
+    if args.command == 'bench':
+        result = bench(reference, args.data, target, protected, args.queries)
+        print(f" {result['queries']:,} queries in {result['seconds']:.2f}s ({result['queriesPerSec']:,.0f} queries/s), "
+              f"{result['sketchItems']:,} live sketch items ({result['referenceItems']:,} in the reference)")
+        half = result['batches'] // 2
+        print(f" batches alerted: {result['alertsBeforeDrift']:,} of the first {half:,} (no drift), "
+              f"{result['alertsAfterDrift']:,} of the last {result['batches'] - half:,} (group B age + 8)")
+        print(f" first alert: {result['firstAlert']}")
+        print_report(result['cumulative'], limit=5)
+        return
+
+    if args.command == 'merge':
+        states = [load_state(path) for path in args.states]
+        merged = states[0]
+        for other in states[1:]:
+            merged.live.merge(other.live)
+            merged.queries += other.queries
+        report = drift_report(reference, merged.live)
+        print_report(report)
+        if args.out:
+            # Positions are per database, so the merged state cannot resume a monitor
+            save_sketches(args.out, merged.live, modelId=merged.model_id, queries=merged.queries,
+                          sources=args.states)
+        if args.json:
+            write_json(args.json, report)
+        return
+
+    state = load_state(args.state) if args.state else None
+    if state is not None and state.model_id != args.model_id:
+        raise SystemExit(f"{args.state} holds model {state.model_id}, not {args.model_id}")
+    monitor = DriftMonitor(args.db, reference, args.model_id, args.min_rows, state)
+    print(f" Monitoring model {args.model_id} in {args.db} from batch rowid {monitor.state.last_batch_rowid}")
+    try:
+        while True:
+            read = monitor.poll()
+            if args.state and (read or args.once):
+                save_state(args.state, monitor.state)
+            if args.json:
+                write_json(args.json, monitor.status())
+            if args.once:
+                print_report(monitor.status()['cumulative'])
+                break
+            time.sleep(args.interval)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        if args.state:
+            save_state(args.state, monitor.state)
+        monitor.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,165 @@
+"""Streaming, bounded-memory dataset encoder.
+
+Encoding is done in two passes over the raw CSV so peak memory is set by the
+chunk size rather than the file size:
+
+1. `build_vocabulary` collects the distinct values of every categorical column
+   (or the vocabulary is loaded, frozen, from an existing label_encoders.json).
+2. `encode_csv` maps each chunk through that vocabulary and appends the integer
+   rows to the encoded CSV.
+
+Codes are assigned exactly like sklearn's LabelEncoder (sorted string classes),
+so the output is byte-identical to the in-memory `fit_transform` path.
+"""
+import json
+import os
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from build import replace_if_changed
+from profiling import phase
+
+UNSEEN_POLICIES = ('error', 'drop', 'other')
+
+
+class UnseenCategoryError(ValueError):
+    pass
+
+
+def _read_chunks(path, categorical_cols, target, chunk_size, sep=',', quotechar='"'):
+    # Categorical and target columns are always read as strings so the dtype
+    # pandas infers for one chunk can never change the codes of another
+    dtype = {col: str for col in [*categorical_cols, target]}
+    if chunk_size is None:
+        with phase('load_csv') as p:
+            df = pd.read_csv(path, sep=sep, quotechar=quotechar, dtype=dtype)
+            p.rows = len(df)
+        yield df
+        return
+    with pd.read_csv(path, sep=sep, quotechar=quotechar, dtype=dtype, chunksize=chunk_size) as reader:
+        while True:
+            # Parsing happens on next(), so that is what the load_csv phase measures
+            with phase('load_csv') as p:
+                chunk = next(reader, None)
+                p.rows = None if chunk is None else len(chunk)
+            if chunk is None:
+                return
+            yield chunk
+
+
+def build_vocabulary(path, categorical_cols, target, chunk_size=100_000, **csv_kwargs):
+    """First pass: collect the sorted classes of every categorical column."""
+    uniques = None
+    for chunk in _read_chunks(path, categorical_cols, target, chunk_size, **csv_kwargs):
+        if uniques is None:
+            uniques = {col: set() for col in categorical_cols if col in chunk.columns}
+        with phase('vocabulary', rows=len(chunk)):
+            for col, values in uniques.items():
+                values.update(chunk[col].astype(str).unique())
+    if uniques is None:
+        raise ValueError(f"{path} contains no rows")
+    # LabelEncoder assigns codes in sorted class order
+    return {col: {cls: idx for idx, cls in enumerate(sorted(values))} for col, values in uniques.items()}
+
+
+def load_vocabulary(path):
+    """Load a frozen vocabulary from a label_encoders.json file."""
+    with open(path) as f:
+        vocab = json.load(f)
+    return {col: {str(cls): int(idx) for cls, idx in mapping.items()} for col, mapping in vocab.items()}
+
+
+def binary_target(values, rule):
+    """0/1 labels from the raw (string) target column.
+
+    `rule` is a class label (`'>50K'`), or a dict: `{'equals': '1'}` marks rows
+    equal to that label, `{'atLeast': 10}` rows whose numeric value is >= 10.
+    """
+    if not isinstance(rule, dict):
+        rule = {'equals': rule}
+    if 'equals' in rule:
+        return (values == str(rule['equals'])).astype(int)
+    if 'atLeast' in rule:
+        return (pd.to_numeric(values) >= rule['atLeast']).astype(int)
+    raise ValueError(f"target rule needs 'equals' or 'atLeast', got {rule!r}")
+
+
+def _encode_chunk(chunk, vocab, categories, target, positive_label, on_unseen, stats, fixed_point):
+    keep = None
+    for col, mapping in vocab.items():
+        # -1 for categories missing from the vocabulary
+        codes = categories[col].get_indexer(chunk[col].astype(str)).astype(np.int64)
+        unseen = codes < 0
+        n_unseen = int(unseen.sum())
+        if n_unseen:
+            stats['unseen'][col] = stats['unseen'].get(col, 0) + n_unseen
+            if on_unseen == 'error':
+                example = chunk[col].astype(str).to_numpy()[unseen][0]
+                raise UnseenCategoryError(f"Column '{col}' has category {example!r} not present in the vocabulary")
+            if on_unseen == 'other':
+                # Reserved code one past the last known class
+                codes[unseen] = len(mapping)
+            else:
+                keep = ~unseen if keep is None else keep & ~unseen
+        chunk[col] = codes
+
+    for col, scale in fixed_point.items():
+        # Non-integer features become integers at a fixed decimal scale (field elements)
+        chunk[col] = np.rint(chunk[col].astype(np.float64) * scale)
+    chunk[target] = binary_target(chunk[target], positive_label)
+    # Move the label to the end, matching X.drop(target) + X[target] = y
+    chunk = chunk[[c for c in chunk.columns if c != target] + [target]]
+    if keep is not None:
+        stats['dropped'] += int((~keep).sum())
+        chunk = chunk[keep]
+    return chunk.astype(np.int64)
+
+
+def encode_csv(src, dst, vocab, target, positive_label, chunk_size=100_000,
+               on_unseen='error', small_path=None, small_rows=10, fixed_point=None, **csv_kwargs):
+    """Second pass: write the integer-encoded rows of `src` to `dst` chunk by chunk.
+
+    `positive_label` is the target rule of `binary_target`.
+    `on_unseen` decides what happens to categories missing from `vocab`:
+    'error' aborts, 'drop' skips the row, 'other' encodes them as len(classes).
+    `fixed_point` maps numeric columns to a scale (e.g. {'oldpeak': 10}) applied
+    before rounding to integers.
+    `dst` (and `small_path`) are only replaced if their contents changed.
+    Returns row/unseen statistics.
+    """
+    if on_unseen not in UNSEEN_POLICIES:
+        raise ValueError(f"on_unseen must be one of {UNSEEN_POLICIES}, got {on_unseen!r}")
+
+    categories = {col: pd.Index(sorted(mapping, key=mapping.get)) for col, mapping in vocab.items()}
+    stats = {'rows': 0, 'written': 0, 'dropped': 0, 'unseen': {}}
+    small = []
+
+    dst = Path(dst)
+    tmp = dst.with_name(dst.name + '.tmp')
+    try:
+        with open(tmp, 'w', newline='') as out:
+            for i, chunk in enumerate(_read_chunks(src, list(vocab), target, chunk_size, **csv_kwargs)):
+                stats['rows'] += len(chunk)
+                with phase('encode', rows=len(chunk)):
+                    encoded = _encode_chunk(chunk, vocab, categories, target, positive_label, on_unseen, stats,
+                                            fixed_point or {})
+                with phase('write', rows=len(encoded)):
+                    encoded.to_csv(out, index=False, header=(i == 0))
+                stats['written'] += len(encoded)
+                # Always keep the first chunk, so the small CSV gets the header even if no rows are kept
+                if small_path and (not small or sum(len(s) for s in small) < small_rows):
+                    small.append(encoded.head(small_rows))
+    except BaseException:
+        if tmp.exists():
+            os.remove(tmp)
+        raise
+    replace_if_changed(tmp, dst)
+
+    if small_path:
+        small_df = pd.concat(small).head(small_rows)
+        small_tmp = Path(str(small_path) + '.tmp')
+        small_df.to_csv(small_tmp, index=False)
+        replace_if_changed(small_tmp, small_path)
+    return stats
@@ -0,0 +1,196 @@
+"""Vectorized group fairness metrics.
+
+Every group definition (one protected attribute, or an intersection such as
+sex x race) is reduced to a single integer code per row. The confusion matrix
+of every group then comes from one `bincount` over the combined key
+group * 4 + label * 2 + prediction. The cost is one pass per definition,
+however many groups or rates are reported.
+
+All rate and disparity functions work on confusion arrays of shape
+(..., groups, 2, 2). Bootstrap replicates are just a leading batch axis, and
+they are drawn directly as multinomial cell counts. That is equivalent to
+resampling rows with replacement, but it does not depend on the row count.
+"""
+import warnings
+
+import numpy as np
+
+# Columns whose non-negative integer values stay below this are encoded with
+# bincount instead of np.unique, avoiding a sort over every row
+_DENSE_LIMIT = 1 << 20
+
+
+def _encode_column(values):
+    """Dense codes 0..k-1 for a column, plus the k distinct values in code order."""
+    values = np.asarray(values)
+    if values.dtype.kind in 'iub' and len(values):
+        lo, hi = int(values.min()), int(values.max())
+        if lo >= 0 and hi < _DENSE_LIMIT:
+            present = np.flatnonzero(np.bincount(values.astype(np.int64), minlength=hi + 1))
+            lookup = np.zeros(hi + 1, dtype=np.int64)
+            lookup[present] = np.arange(len(present))
+            return lookup[values], present
+    uniques, codes = np.unique(values, return_inverse=True)
+    return codes.reshape(-1).astype(np.int64), uniques
+
+
+def group_codes(columns: dict, cache: dict | None = None):
+    """Integer group id per row for the intersection of `columns`.
+
+    `columns` maps attribute name -> values. Returns (codes, labels), where
+    labels[g] is the tuple of attribute values of group g. Only combinations
+    that occur get a code. Pass the same `cache` dict across definitions to
+    encode each attribute once.
+    """
+    cache = {} if cache is None else cache
+    key = None
+    radices, uniques = [], []
+    for name, values in columns.items():
+        if name not in cache:
+            cache[name] = _encode_column(values)
+        codes, values_ = cache[name]
+        key = codes if key is None else key * len(values_) + codes
+        radices.append(len(values_))
+        uniques.append(values_)
+
+    # Mixed-radix key -> dense ids over the combinations that actually occur
+    present = np.flatnonzero(np.bincount(key, minlength=int(np.prod(radices))))
+    if len(present) < np.prod(radices):
+        lookup = np.zeros(int(np.prod(radices)), dtype=np.int64)
+        lookup[present] = np.arange(len(present))
+        key = lookup[key]
+    labels = [tuple(u[i].item() for u, i in zip(uniques, idx))
+              for idx in zip(*np.unravel_index(present, radices))]
+    return key, labels
+
+
+def confusion_matrices(groups, y_true, y_pred, n_groups: int) -> np.ndarray:
+    """(n_groups, 2, 2) counts indexed [group, label, prediction], in one bincount."""
+    y_true = np.asarray(y_true, dtype=np.int64)
+    y_pred = np.asarray(y_pred, dtype=np.int64)
+    if y_true.max(initial=0) > 1 or y_pred.max(initial=0) > 1 or y_true.min(initial=0) < 0 or y_pred.min(initial=0) < 0:
+        raise ValueError("Labels and predictions must be binary (0/1)")
+    key = (np.asarray(groups, dtype=np.int64) * 2 + y_true) * 2 + y_pred
+    return np.bincount(key, minlength=n_groups * 4).reshape(n_groups, 2, 2)
+
+
+def _ratio(num, den):
+    num = np.asarray(num, dtype=np.float64)
+    den = np.asarray(den, dtype=np.float64)
+    return np.divide(num, den, out=np.full(np.broadcast(num, den).shape, np.nan), where=den > 0)
+
+
+def group_rates(confusion) -> dict:
+    """Per-group rates for confusion arrays of shape (..., groups, 2, 2); NaN where undefined."""
+    tn, fp = confusion[..., 0, 0], confusion[..., 0, 1]
+    fn, tp = confusion[..., 1, 0], confusion[..., 1, 1]
+    count = tn + fp + fn + tp
+    return {
+        'count': count,
+        'positive_rate': _ratio(fp + tp, count),
+        'base_rate': _ratio(fn + tp, count),
+        'tpr': _ratio(tp, fn + tp),
+        'fpr': _ratio(fp, tn + fp),
+        'accuracy': _ratio(tn + tp, count),
+    }
+
+
+def _spread(rate):
+    # Largest minus smallest rate across groups, skipping undefined ones
+    return np.fmax.reduce(rate, axis=-1) - np.fmin.reduce(rate, axis=-1)
+
+
+def disparities(rates: dict) -> dict:
+    """Between-group gaps (max - min over groups) for the output of `group_rates`."""
+    tpr_gap = _spread(rates['tpr'])
+    fpr_gap = _spread(rates['fpr'])
+    return {
+        'demographic_parity': _spread(rates['positive_rate']),
+        'tpr_gap': tpr_gap,
+        'fpr_gap': fpr_gap,
+        'equalized_odds': np.fmax(tpr_gap, fpr_gap),
+    }
+
+
+def bootstrap_intervals(confusion, n_boot: int = 1000, confidence: float = 0.95,
+                        seed: int = 0, batch: int = 10_000) -> dict:
+    """Percentile bootstrap intervals for every rate and disparity.
+
+    Replicates are drawn `batch` at a time as a (batch, groups, 2, 2) matrix
+    of multinomial cell counts. Returns {name: (low, high)} arrays.
+    """
+    cells = confusion.reshape(-1).astype(np.float64)
+    n = int(cells.sum())
+    rng = np.random.default_rng(seed)
+    samples = {}
+    for start in range(0, n_boot, batch):
+        size = min(batch, n_boot - start)
+        draws = rng.multinomial(n, cells / n, size=size).reshape(size, *confusion.shape)
+        rates = group_rates(draws)
+        stats = {**{k: v for k, v in rates.items() if k != 'count'}, **disparities(rates)}
+        for name, values in stats.items():
+            samples.setdefault(name, []).append(values)
+
+    tail = (1 - confidence) / 2
+    intervals = {}
+    for name, chunks in samples.items():
+        values = np.concatenate(chunks)
+        with warnings.catch_warnings():
+            # A rate is undefined in replicates where its group (or its positives)
+            # was not drawn; those are skipped, and all-NaN columns stay NaN
+            warnings.simplefilter('ignore', RuntimeWarning)
+            low, high = np.nanquantile(values, [tail, 1 - tail], axis=0)
+        intervals[name] = (low, high)
+    return intervals
+
+
+def _json_float(x):
+    x = float(x)
+    return None if np.isnan(x) else x
+
+
+_RATE_KEYS = {'positive_rate': 'positiveRate', 'base_rate': 'baseRate', 'tpr': 'tpr',
+              'fpr': 'fpr', 'accuracy': 'accuracy'}
+_DISPARITY_KEYS = {'demographic_parity': 'demographicParity', 'equalized_odds': 'equalizedOdds',
+                   'tpr_gap': 'tprGap', 'fpr_gap': 'fprGap'}
+
+
+def evaluate(data, y_true, y_pred, attributes: list[str], cache: dict | None = None,
+             n_boot: int = 0, confidence: float = 0.95, seed: int = 0) -> dict:
+    """Fairness report for one group definition (a single attribute or an intersection).
+
+    `data` is anything indexable by column name (DataFrame, dict of arrays).
+    Rates that are undefined for a group (e.g. TPR with no positive labels)
+    are reported as null and ignored by the gaps.
+    """
+    groups, labels = group_codes({name: np.asarray(data[name]) for name in attributes}, cache)
+    confusion = confusion_matrices(groups, y_true, y_pred, len(labels))
+    rates = group_rates(confusion)
+    gaps = disparities(rates)
+    intervals = bootstrap_intervals(confusion, n_boot, confidence, seed) if n_boot else None
+
+    report = {'attributes': list(attributes)}
+    for name, key in _DISPARITY_KEYS.items():
+        report[key] = _json_float(gaps[name])
+    if intervals:
+        report['confidence'] = confidence
+        report['intervals'] = {key: [_json_float(intervals[name][0]), _json_float(intervals[name][1])]
+                               for name, key in _DISPARITY_KEYS.items()}
+
+    report['groups'] = []
+    for g, values in enumerate(labels):
+        entry = {'values': dict(zip(attributes, values)), 'count': int(rates['count'][g])}
+        for name, key in _RATE_KEYS.items():
+            entry[key] = _json_float(rates[name][g])
+        if intervals:
+            entry['intervals'] = {key: [_json_float(intervals[name][0][g]), _json_float(intervals[name][1][g])]
+                                  for name, key in _RATE_KEYS.items()}
+        report['groups'].append(entry)
+    return report
+
+
+def evaluate_all(data, y_true, y_pred, definitions: list[list[str]], **kwargs) -> dict:
+    """`evaluate` for many group definitions, keyed by 'a+b' names; attributes are encoded once."""
+    cache = {}
+    return {'+'.join(attrs): evaluate(data, y_true, y_pred, attrs, cache=cache, **kwargs)
+            for attrs in definitions}
@@ -0,0 +1,415 @@
+"""Incremental demographic parity monitor over the provider's query log.
+
+An unfair batch usually shows up only when an auditor challenges it and
+`fairness_audit` rejects the sample, which costs the provider's stake. This
+monitor tails the server's SQLite database (apps/server/zkfair.db) instead:
+
+- new zkfair_query_logs rows of `--model-id` are read by `seq` (the table's
+  rowid, so each poll is a range scan over the new rows only). New
+  zkfair_batches rows are read by rowid too. History is never read again,
+  and `--state` persists the position and counts across restarts. Only the
+  latest RECENT_BATCHES closed batches are kept (plus those not yet
+  committed); older ones live on in the batch and breach counts.
+- every query updates four running counts (group A/B totals and positives,
+  with group A being `sensitive_attr == 0` as in the circuit, and a query
+  positive when circuit_emulator.served_label, the SDK's `prediction >= 0.5`,
+  says so). The open batch
+  keeps its records in a queue until a batch row closes the range
+  `startSeq..endSeq`. Those records are then moved into the batch's counts,
+  so each record costs O(1).
+- rates and the disparity use the circuit's integers: `positive * 10000 / total`
+  against `ceil(targetDisparity * 100) * 100`, with targetDisparity taken
+  from fairness_threshold.json.
+
+The open batch's current gap is its projected gap at commit. The monitor
+warns once both groups have `--min-group` queries and the gap exceeds the
+threshold. The reported standard error shows how settled the estimate is.
+A closed batch over the threshold is reported as a breach. Queries that
+batches skipped (below startSeq but never batched) are counted, since they
+point to a non-inclusion batch.
+
+    uv run fairness_monitor.py                               # follow ../../apps/server/zkfair.db
+    uv run fairness_monitor.py --once --json status.json     # catch up, print the status and exit
+    uv run fairness_monitor.py --bench 1000000               # throughput on a synthetic log
+"""
+import argparse
+import json
+import math
+import sqlite3
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from pathlib import Path
+
+from build import BUILD_DIR, write_json
+from circuit_emulator import served_label
+
+SERVER_DB = Path(__file__).resolve().parents[2] / 'apps' / 'server' / 'zkfair.db'
+STATE_FILE = BUILD_DIR / 'fairness_monitor_state.json'
+THRESHOLD_SCALE = 10000
+# Rows fetched per query; bounds memory while catching up on a long log
+FETCH_ROWS = 50_000
+# Closed batches kept in the state; older ones only live on in the counts
+RECENT_BATCHES = 100
+
+
+@dataclass
+class GroupCounts:
+    a_total: int = 0
+    a_positive: int = 0
+    b_total: int = 0
+    b_positive: int = 0
+
+    def add(self, group_b: bool, positive: bool):
+        if group_b:
+            self.b_total += 1
+            self.b_positive += positive
+        else:
+            self.a_total += 1
+            self.a_positive += positive
+
+    def remove(self, group_b: bool, positive: bool):
+        if group_b:
+            self.b_total -= 1
+            self.b_positive -= positive
+        else:
+            self.a_total -= 1
+            self.a_positive -= positive
+
+    @property
+    def total(self) -> int:
+        return self.a_total + self.b_total
+
+    def disparity_scaled(self) -> int | None:
+        """|rate_a - rate_b| in circuit units, None while a group is empty (the audit then skips the check)."""
+        if not self.a_total or not self.b_total:
+            return None
+        return abs(self.a_positive * THRESHOLD_SCALE // self.a_total
+                   - self.b_positive * THRESHOLD_SCALE // self.b_total)
+
+    def standard_error(self) -> float | None:
+        if not self.a_total or not self.b_total:
+            return None
+        pa, pb = self.a_positive / self.a_total, self.b_positive / self.b_total
+        return math.sqrt(pa * (1 - pa) / self.a_total + pb * (1 - pb) / self.b_total)
+
+    def to_dict(self) -> dict:
+        return {'aTotal': self.a_total, 'aPositive': self.a_positive, 'bTotal': self.b_total,
+                'bPositive': self.b_positive}
+
+    @classmethod
+    def from_dict(cls, d: dict) -> 'GroupCounts':
+        return cls(d['aTotal'], d['aPositive'], d['bTotal'], d['bPositive'])
+
+
+@dataclass
+class BatchStatus:
+    id: str
+    start_seq: int
+    end_seq: int
+    counts: GroupCounts
+    committed: bool
+    disparity_scaled: int | None
+    breach: bool
+
+    def to_dict(self) -> dict:
+        return {'id': self.id, 'startSeq': self.start_seq, 'endSeq': self.end_seq, 'counts': self.counts.to_dict(),
+                'committed': self.committed, 'disparityScaled': self.disparity_scaled, 'breach': self.breach}
+
+    @classmethod
+    def from_dict(cls, d: dict) -> 'BatchStatus':
+        return cls(d['id'], d['startSeq'], d['endSeq'], GroupCounts.from_dict(d['counts']), d['committed'],
+                   d['disparityScaled'], d['breach'])
+
+
+@dataclass
+class MonitorState:
+    model_id: int = 1
+    last_seq: int = 0
+    last_batch_rowid: int = 0
+    open_counts: GroupCounts = field(default_factory=GroupCounts)
+    # (seq, group_b, positive) of the queries read but not yet in a batch
+    open_records: deque = field(default_factory=deque)
+    # The latest closed batches
+    recent: deque = field(default_factory=lambda: deque(maxlen=RECENT_BATCHES))
+    # Batch rows seen before all their queries were read (the log writes queries first, but polls can interleave)
+    waiting_batches: list = field(default_factory=list)
+    # Closed batches by id whose committedAt hasn't been seen yet
+    uncommitted: dict = field(default_factory=dict)
+    batches: int = 0
+    breaches: int = 0
+    skipped: int = 0
+    queries: int = 0
+
+
+class FairnessMonitor:
+    def __init__(self, db_path, target_disparity: float, model_id: int = 1, min_group: int = 30,
+                 state: MonitorState | None = None, on_warning=print):
+        self.db_path = db_path
+        # Same epsilon as the SDK passes to fairness_audit
+        self.threshold_scaled = math.ceil(target_disparity * 100) * 100
+        self.min_group = min_group
+        self.state = state or MonitorState(model_id)
+        self.on_warning = on_warning
+        self._warned_open = False
+        self._connection = None
+
+    @property
+    def connection(self) -> sqlite3.Connection:
+        if self._connection is None:
+            self._connection = sqlite3.connect(f'file:{self.db_path}?mode=ro', uri=True)
+        return self._connection
+
+    def poll(self) -> int:
+        """Read the queries and batches written since the last poll; returns the number of new queries."""
+        read = self._read_queries()
+        self._read_batches()
+        self._close_batches()
+        self._check_open()
+        return read
+
+    def _read_queries(self) -> int:
+        st = self.state
+        counts, records = st.open_counts, st.open_records
+        # Other models' queries share the seq range: the position moves past them too, so batches ending on
+        # one of them still close
+        high, = self.connection.execute('SELECT MAX(seq) FROM zkfair_query_logs').fetchone()
+        if high is None or high <= st.last_seq:
+            return 0
+        seq = st.last_seq
+        read = 0
+        while True:
+            rows = self.connection.execute(
+                'SELECT seq, sensitive_attr, prediction FROM zkfair_query_logs '
+                'WHERE seq > ? AND seq <= ? AND model_id = ? ORDER BY seq LIMIT ?',
+                (seq, high, st.model_id, FETCH_ROWS)).fetchall()
+            for seq, sensitive, prediction in rows:
+                group_b = sensitive != 0
+                positive = bool(served_label(prediction))
+                counts.add(group_b, positive)
+                records.append((seq, group_b, positive))
+            read += len(rows)
+            if len(rows) < FETCH_ROWS:
+                break
+        st.last_seq = high
+        st.queries += read
+        return read
+
+    def _read_batches(self):
+        st = self.state
+        rows = self.connection.execute(
+            'SELECT rowid, id, start_seq, end_seq, committed_at FROM zkfair_batches WHERE rowid > ? ORDER BY rowid',
+            (st.last_batch_rowid,)).fetchall()
+        for rowid, batch_id, start_seq, end_seq, committed_at in rows:
+            st.waiting_batches.append((batch_id, start_seq, end_seq, committed_at is not None))
+            st.last_batch_rowid = rowid
+
+        # committedAt is set after the insert; only the few batches not yet committed are looked up again
+        pending = list(st.uncommitted)
+        for i in range(0, len(pending), 500):
+            chunk = pending[i:i + 500]
+            for batch_id, in self.connection.execute(
+                    'SELECT id FROM zkfair_batches WHERE committed_at IS NOT NULL '
+                    f"AND id IN ({','.join('?' * len(chunk))})", chunk):
+                st.uncommitted.pop(batch_id).committed = True
+
+    def _close_batches(self):
+        st = self.state
+        st.waiting_batches.sort(key=lambda b: b[2])
+        while st.waiting_batches and st.waiting_batches[0][2] <= st.last_seq:
+            batch_id, start_seq, end_seq, committed = st.waiting_batches.pop(0)
+            counts = GroupCounts()
+            records = st.open_records
+            while records and records[0][0] <= end_seq:
+                seq, group_b, positive = records.popleft()
+                st.open_counts.remove(group_b, positive)
+                if seq < start_seq:
+                    st.skipped += 1
+                else:
+                    counts.add(group_b, positive)
+            disparity = counts.disparity_scaled()
+            status = BatchStatus(batch_id, start_seq, end_seq, counts, committed, disparity,
+                                 disparity is not None and disparity > self.threshold_scaled)
+            st.recent.append(status)
+            st.batches += 1
+            st.breaches += status.breach
+            if not committed:
+                st.uncommitted[batch_id] = status
+            self._warned_open = False
+            if status.breach:
+                self.on_warning(f" BREACH batch {batch_id}: disparity {disparity} > {self.threshold_scaled} "
+                                f"(of {THRESHOLD_SCALE}), {_describe(counts)}")
+
+    def _check_open(self):
+        counts = self.state.open_counts
+        disparity = counts.disparity_scaled()
+        if (disparity is None or min(counts.a_total, counts.b_total) < self.min_group
+                or disparity <= self.threshold_scaled):
+            self._warned_open = False
+            return
+        if not self._warned_open:
+            se = counts.standard_error() * THRESHOLD_SCALE
+            self.on_warning(f" WARNING open batch: projected disparity {disparity} (+/- {se:.0f}) > "
+                            f"{self.threshold_scaled} (of {THRESHOLD_SCALE}), {_describe(counts)}")
+            self._warned_open = True
+
+    def status(self) -> dict:
+        st = self.state
+        counts = st.open_counts
+        return {
+            'modelId': st.model_id,
+            'lastSeq': st.last_seq,
+            'queries': st.queries,
+            'thresholdScaled': self.threshold_scaled,
+            'openBatch': {**counts.to_dict(), 'disparityScaled': counts.disparity_scaled(),
+                          'standardError': counts.standard_error()},
+            'batches': st.batches,
+            'breaches': st.breaches,
+            'recentBreaches': [b.id for b in st.recent if b.breach],
+            'skippedQueries': st.skipped,
+        }
+
+    def close(self):
+        if self._connection is not None:
+            self._connection.close()
+            self._connection = None
+
+
+def _describe(counts: GroupCounts) -> str:
+    return (f"group A {counts.a_positive}/{counts.a_total} positive, "
+            f"group B {counts.b_positive}/{counts.b_total} positive")
+
+
+def save_state(path, state: MonitorState):
+    write_json(path, {
+        'modelId': state.model_id,
+        'lastSeq': state.last_seq,
+        'lastBatchRowid': state.last_batch_rowid,
+        'openRecords': [[seq, int(b), int(p)] for seq, b, p in state.open_records],
+        'waitingBatches': [list(b) for b in state.waiting_batches],
+        'recent': [b.to_dict() for b in state.recent],
+        'uncommitted': [b.to_dict() for b in state.uncommitted.values()],
+        'batches': state.batches,
+        'breaches': state.breaches,
+        'skipped': state.skipped,
+        'queries': state.queries,
+    })
+
+
+def load_state(path) -> MonitorState | None:
+    if not Path(path).is_file():
+        return None
+    with open(path) as f:
+        d = json.load(f)
+    state = MonitorState(model_id=d['modelId'], last_seq=d['lastSeq'], last_batch_rowid=d['lastBatchRowid'],
+                         batches=d['batches'], breaches=d['breaches'], skipped=d['skipped'], queries=d['queries'])
+    for seq, group_b, positive in d['openRecords']:
+        state.open_records.append((seq, bool(group_b), bool(positive)))
+        state.open_counts.add(bool(group_b), bool(positive))
+    state.waiting_batches = [tuple(b) for b in d['waitingBatches']]
+    state.recent.extend(BatchStatus.from_dict(b) for b in d['recent'])
+    # A recent batch still waiting for its commit is the same object in both
+    recent = {b.id: b for b in state.recent}
+    state.uncommitted = {b['id']: recent.get(b['id']) or BatchStatus.from_dict(b) for b in d['uncommitted']}
+    return state
+
+
+def make_synthetic_log(path, queries: int, batch_size: int = 100, seed: int = 0):
+    """A zkfair.db with the server's query log and batch columns; group B is favoured so batches drift unfair."""
+    import numpy as np
+
+    rng = np.random.default_rng(seed)
+    Path(path).unlink(missing_ok=True)
+    con = sqlite3.connect(path)
+    con.executescript('''
+        CREATE TABLE zkfair_batches (id TEXT PRIMARY KEY, start_seq INTEGER NOT NULL, end_seq INTEGER NOT NULL,
+            merkle_root TEXT NOT NULL, record_count INTEGER NOT NULL, tx_hash TEXT, created_at INTEGER NOT NULL,
+            committed_at INTEGER);
+        CREATE TABLE zkfair_query_logs (seq INTEGER PRIMARY KEY AUTOINCREMENT, model_id INTEGER NOT NULL,
+            features TEXT NOT NULL, sensitive_attr INTEGER NOT NULL, prediction REAL NOT NULL,
+            timestamp INTEGER NOT NULL, created_at INTEGER NOT NULL DEFAULT (unixepoch() * 1000),
+            batch_id TEXT REFERENCES zkfair_batches(id));
+    ''')
+    groups = (rng.random(queries) < 0.67).astype(int)
+    positive = (rng.random(queries) < np.where(groups == 1, 0.30, 0.12)).astype(float)
+    now = int(time.time() * 1000)
+    con.executemany(
+        'INSERT INTO zkfair_query_logs (seq, model_id, features, sensitive_attr, prediction, timestamp, batch_id) '
+        'VALUES (?, 1, \'[]\', ?, ?, ?, ?)',
+        ((i + 1, int(g), float(p), now, f'{i // batch_size * batch_size + 1}-{min(queries, (i // batch_size + 1) * batch_size)}')
+         for i, (g, p) in enumerate(zip(groups, positive))))
+    con.executemany(
+        'INSERT INTO zkfair_batches VALUES (?, ?, ?, \'0x0\', ?, \'0x0\', ?, ?)',
+        ((f'{start}-{min(queries, start + batch_size - 1)}', start, min(queries, start + batch_size - 1),
+          min(batch_size, queries - start + 1), now, now) for start in range(1, queries + 1, batch_size)))
+    con.commit()
+    con.close()
+
+
+def bench(queries: int, target_disparity: float, batch_size: int = 100) -> dict:
+    import tempfile
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / 'zkfair.db'
+        make_synthetic_log(path, queries, batch_size)
+        warnings = []
+        monitor = FairnessMonitor(path, target_disparity, on_warning=warnings.append)
+        start = time.perf_counter()
+        monitor.poll()
+        seconds = time.perf_counter() - start
+        status = monitor.status()
+        monitor.close()
+    return {'queries': queries, 'seconds': seconds, 'queriesPerSec': queries / seconds,
+            'batches': status['batches'], 'breaches': status['breaches'], 'warnings': len(warnings)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--db', default=SERVER_DB, help="the provider server's SQLite database")
+    parser.add_argument('--fairness-threshold', default='fairness_threshold.json')
+    parser.add_argument('--model-id', type=int, default=1, help="the server's id of the model to monitor")
+    parser.add_argument('--min-group', type=int, default=30,
+                        help="queries both groups need before the open batch's gap is projected")
+    parser.add_argument('--interval', type=float, default=1.0, help="seconds between polls")
+    parser.add_argument('--state', default=STATE_FILE, help="where the position and counts are kept ('' to not)")
+    parser.add_argument('--once', action='store_true', help="catch up once, print the status and exit")
+    parser.add_argument('--json', help="write the status to this file after every poll")
+    parser.add_argument('--bench', type=int, metavar='QUERIES', help="time the monitor on a synthetic log")
+    args = parser.parse_args()
+
+    with open(args.fairness_threshold) as f:
+        target = json.load(f)['targetDisparity']
+
+    if args.bench:
+        result = bench(args.bench, target)
+        print(f" {result['queries']:,} queries, {result['batches']:,} batches in {result['seconds']:.2f}s "
+              f"({result['queriesPerSec']:,.0f} queries/s), {result['breaches']:,} breaching batches")
+        return
+
+    state = load_state(args.state) if args.state else None
+    if state is not None and state.model_id != args.model_id:
+        raise SystemExit(f"{args.state} holds model {state.model_id}, not {args.model_id}")
+    monitor = FairnessMonitor(args.db, target, args.model_id, args.min_group, state)
+    print(f" Monitoring model {args.model_id} in {args.db} from seq {monitor.state.last_seq} "
+          f"(targetDisparity {target}, threshold {monitor.threshold_scaled} of {THRESHOLD_SCALE})")
+    try:
+        while True:
+            read = monitor.poll()
+            if args.state and (read or args.once):
+                save_state(args.state, monitor.state)
+            if args.json:
+                write_json(args.json, monitor.status())
+            if args.once:
+                print(json.dumps(monitor.status(), indent=2))
+                break
+            time.sleep(args.interval)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        if args.state:
+            save_state(args.state, monitor.state)
+        monitor.close()
+
+
+if __name__ == '__main__':
+    main()
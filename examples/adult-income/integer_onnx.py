@@ -0,0 +1,321 @@
+"""Integer-only ONNX graph of the circuits' `predict_logistic_regression`.
+
+model.onnx is the float32 sklearn model. The circuits instead compute, over
+the BN254 field:
+
+    logit = w[0] + sum_i w[i + 1] * x[i]    (mod p),  predicted = (logit as i64) > 0
+
+with `weightsToFields` weights (x 1e6, negatives stored as 2^253 - 1 - |w|).
+`export_integer_onnx` writes a graph that returns exactly that `logit as i64`
+and label for every row, using only int64 MatMul/Mul/Add/Div. There are no
+float ops and no big integers, so the predictions the server serves from it
+are the ones an audit proves.
+
+Write s[j] for the signed scaled weights, and K for the sum of the inputs
+(the constant 1 of the bias included) under negative weights. The field sum is
+then V = S + (2^253 - 1) * K, with S = sum_j s[j] * x[j]. Its low 64 bits
+after reduction mod p are
+
+    low64(V mod p) = S - K - q * (p mod 2^64)    (wrapping int64 arithmetic)
+
+because 2^253 - 1 is -1 mod 2^64 and q = floor(V / p). For K >= 1, q is
+floor(K * c), with c = (2^253 - 1) / p: S / p is too small to move it.
+The graph evaluates floor(K * c) exactly from a 93-bit fixed-point c, split
+into three 31-bit limbs. Exactness needs no K * c within 2^-62 of an integer,
+and by the continued fraction of c, the closest any K < 2^31 gets is about
+2^-32. `check_exactness` proves this at export time. Rows whose K reaches
+2^31 fall outside the graph's domain. `verify_integer_onnx` counts them, and
+the encoded datasets stay far below it.
+
+    uv run integer_onnx.py                              # weights.bin -> model_int.onnx, verified on dataset_encoded.csv
+    uv run integer_onnx.py --benchmark --batch-sizes 1 64 1024 8192
+"""
+import argparse
+import json
+import math
+import os
+import resource
+import time
+from fractions import Fraction
+from pathlib import Path
+
+import numpy as np
+
+from commitment import WEIGHT_FIELD_MAX, weights_to_fields
+from poseidon import FIELD_MODULUS
+
+INTEGER_ONNX = 'model_int.onnx'
+# int64 weights and K stay exact below this; see the module docstring
+K_LIMIT = 1 << 31
+_LIMB_BITS = 31
+_C_BITS = 3 * _LIMB_BITS
+_LOW_64 = (1 << 64) - 1
+
+
+def _signed(value: int) -> int:
+    # Two's complement int64 of the low 64 bits
+    value &= _LOW_64
+    return value - (1 << 64) if value >> 63 else value
+
+
+def signed_weights(weights) -> list[int]:
+    """weightsToFields fields as signed integers: s such that field = s mod (2^253 - 1)."""
+    return [f - WEIGHT_FIELD_MAX if f > WEIGHT_FIELD_MAX // 2 else f for f in weights_to_fields(weights)]
+
+
+def check_exactness(k_limit: int = K_LIMIT) -> float:
+    """Closest distance of K * c to an integer over 1 <= K < k_limit, checked against the fixed-point error.
+
+    By the best approximation property of continued fractions, the minimum
+    is reached at the largest convergent denominator below `k_limit`.
+    """
+    c = Fraction(WEIGHT_FIELD_MAX, FIELD_MODULUS)
+    x, (h0, h1), (q0, q1) = c, (0, 1), (1, 0)
+    closest = None
+    while True:
+        a = x.numerator // x.denominator
+        h0, h1 = h1, a * h1 + h0
+        q0, q1 = q1, a * q1 + q0
+        if q1 >= k_limit:
+            break
+        closest = q1
+        if x == a:
+            break
+        x = 1 / (x - a)
+    frac = (closest * c) % 1
+    distance = min(frac, 1 - frac)
+    # floor(K * C / 2^93) undershoots K * c by less than K / 2^93, and S / p is below 2^-180
+    if distance <= Fraction(k_limit, 1 << _C_BITS):
+        raise ArithmeticError(f"{_C_BITS}-bit fixed point is not exact for K < {k_limit}")
+    return float(distance)
+
+
+def build_graph(weights, num_features: int, input_type: str = 'float32', opset: int = 15):
+    """ONNX model: `input_type` features [N, num_features] -> label (int64 [N]) and logit (`logit as i64`, int64 [N])."""
+    from onnx import TensorProto, helper, numpy_helper
+
+    s = signed_weights(weights)
+    if len(s) != num_features + 1:
+        raise ValueError(f"{len(s)} weights for {num_features} features; expected one bias and one per feature")
+    if max(abs(v) for v in s) >= 1 << 62:
+        raise ValueError("scaled weights do not fit in int64")
+    negative = [int(v < 0) for v in s]
+
+    c_fixed = (WEIGHT_FIELD_MAX << _C_BITS) // FIELD_MODULUS
+    limbs = [(c_fixed >> (_LIMB_BITS * i)) & ((1 << _LIMB_BITS) - 1) for i in range(3)]
+
+    def const(name, value):
+        return numpy_helper.from_array(np.asarray(value, dtype=np.int64), name)
+
+    initializers = [
+        # Column 0: scaled feature weights, column 1: 1 where the weight is negative
+        const('weights', np.array([s[1:], negative[1:]], dtype=np.int64).T),
+        const('bias', [s[0], negative[0]]),
+        const('col_s', [0]), const('col_k', [1]), const('axis_1', [1]),
+        const('c0', limbs[0]), const('c1', limbs[1]), const('c2', limbs[2]),
+        const('limb', 1 << _LIMB_BITS),
+        const('p_low', _signed(FIELD_MODULUS)),
+        const('zero', 0),
+    ]
+    nodes = []
+    if input_type == 'float32':
+        # The server sends the encoded integers as float32; round like check_audit
+        nodes += [helper.make_node('Round', ['float_input'], ['rounded']),
+                  helper.make_node('Cast', ['rounded'], ['x'], to=TensorProto.INT64)]
+        input_name, elem_type = 'float_input', TensorProto.FLOAT
+    elif input_type == 'int64':
+        nodes.append(helper.make_node('Identity', ['int_input'], ['x']))
+        input_name, elem_type = 'int_input', TensorProto.INT64
+    else:
+        raise ValueError(f"input_type must be 'float32' or 'int64', got {input_type!r}")
+
+    nodes += [
+        helper.make_node('MatMul', ['x', 'weights'], ['xw']),
+        helper.make_node('Add', ['xw', 'bias'], ['sk']),
+        helper.make_node('Gather', ['sk', 'col_s'], ['s2d'], axis=1),
+        helper.make_node('Gather', ['sk', 'col_k'], ['k2d'], axis=1),
+        helper.make_node('Squeeze', ['s2d', 'axis_1'], ['S']),
+        helper.make_node('Squeeze', ['k2d', 'axis_1'], ['K']),
+        # q = floor(K * C / 2^93) over 31-bit limbs of C; every partial stays below 2^63
+        helper.make_node('Mul', ['K', 'c0'], ['t0']),
+        helper.make_node('Div', ['t0', 'limb'], ['carry0']),
+        helper.make_node('Mul', ['K', 'c1'], ['k_c1']),
+        helper.make_node('Add', ['k_c1', 'carry0'], ['t1']),
+        helper.make_node('Div', ['t1', 'limb'], ['carry1']),
+        helper.make_node('Mul', ['K', 'c2'], ['k_c2']),
+        helper.make_node('Add', ['k_c2', 'carry1'], ['t2']),
+        helper.make_node('Div', ['t2', 'limb'], ['q']),
+        # logit = S - K - q * (p mod 2^64), wrapping
+        helper.make_node('Mul', ['q', 'p_low'], ['qp']),
+        helper.make_node('Sub', ['S', 'K'], ['s_minus_k']),
+        helper.make_node('Sub', ['s_minus_k', 'qp'], ['logit']),
+        helper.make_node('Greater', ['logit', 'zero'], ['positive']),
+        helper.make_node('Cast', ['positive'], ['label'], to=TensorProto.INT64),
+    ]
+    graph = helper.make_graph(
+        nodes, 'circuit_logistic_regression',
+        [helper.make_tensor_value_info(input_name, elem_type, [None, num_features])],
+        [helper.make_tensor_value_info('label', TensorProto.INT64, [None]),
+         helper.make_tensor_value_info('logit', TensorProto.INT64, [None])],
+        initializers,
+    )
+    # IR 8 like skl2onnx's model.onnx, so the server's onnxruntime-node loads both
+    model = helper.make_model(graph, opset_imports=[helper.make_opsetid('', opset)], ir_version=8,
+                              producer_name='zkfair-integer-onnx')
+    model.doc_string = ("Fixed-point logistic regression, bit-exact with zk-circuits/common "
+                        f"predict_logistic_regression for K < 2^31 (K = sum of inputs under negative weights)")
+    return model
+
+
+def field_logits(weights, features) -> np.ndarray:
+    """Reference `logit as i64` straight from the circuit's definition, in Python big integers."""
+    fields = weights_to_fields(weights)
+    x = np.asarray(features, dtype=np.int64).astype(object)
+    total = fields[0] + x @ np.array(fields[1:], dtype=object)
+    return np.array([_signed(v % FIELD_MODULUS) for v in total], dtype=np.int64)
+
+
+def domain_k(weights, features) -> np.ndarray:
+    negative = np.array([v < 0 for v in signed_weights(weights)])
+    x = np.asarray(features, dtype=np.int64)
+    return int(negative[0]) + x[:, negative[1:]].sum(axis=1)
+
+
+def export_integer_onnx(weights_path='weights.bin', out=INTEGER_ONNX, num_features=None, input_type='float32'):
+    from onnx import checker
+
+    from build import write_bytes
+
+    weights = np.fromfile(weights_path, dtype='<f4')
+    num_features = num_features or len(weights) - 1
+    check_exactness()
+    model = build_graph(weights, num_features, input_type)
+    checker.check_model(model)
+    write_bytes(out, model.SerializeToString())
+    return model
+
+
+def _session(path, graph_optimization='all', intra_op_threads=0):
+    from onnx_check import make_session
+
+    return make_session(path, intra_op_threads=intra_op_threads, graph_optimization=graph_optimization)
+
+
+def verify_integer_onnx(path, weights, features, batch_size=8192, max_reported=20) -> dict:
+    """Compare the graph's logits with `field_logits` on every row (features must be non-negative integers)."""
+    features = np.asarray(features, dtype=np.int64)
+    if (features < 0).any():
+        raise ValueError("features must be non-negative integers (field elements)")
+    session = _session(path)
+    inp = session.get_inputs()[0]
+    dtype = np.float32 if inp.type == 'tensor(float)' else np.int64
+
+    expected = field_logits(weights, features)
+    k = domain_k(weights, features)
+    got = np.concatenate([session.run(['logit'], {inp.name: features[i:i + batch_size].astype(dtype)})[0]
+                          for i in range(0, len(features), batch_size)])
+    differs = np.flatnonzero(got != expected)
+    return {
+        'rows': int(len(features)),
+        'logitMismatches': int(len(differs)),
+        'labelMismatches': int(((got > 0) != (expected > 0)).sum()),
+        'mismatchedRows': differs[:max_reported].tolist(),
+        'outOfDomainRows': int((k >= K_LIMIT).sum()),
+        'maxK': int(k.max(initial=0)),
+        'float32Exact': bool((features < (1 << 24)).all()),
+    }
+
+
+def _run_benchmark(path, X, batch_sizes, min_seconds, intra_op_threads) -> dict:
+    """One model's throughput and memory, measured in a fresh process (see `benchmark`)."""
+    from onnx_check import benchmark
+
+    rss_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    start = time.perf_counter()
+    session = _session(path, intra_op_threads=intra_op_threads)
+    load_ms = (time.perf_counter() - start) * 1000
+    rss_loaded = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    throughput = benchmark(session, X, batch_sizes, min_seconds)
+    rss_after = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in KiB on Linux
+    return {
+        'model': str(path),
+        'fileBytes': os.path.getsize(path),
+        'loadMs': load_ms,
+        'sessionPeakRssKiB': rss_loaded - rss_before,
+        'runPeakRssKiB': rss_after - rss_before,
+        'throughput': throughput,
+    }
+
+
+def benchmark_models(paths, X, batch_sizes, min_seconds=0.5, intra_op_threads=0) -> list[dict]:
+    """Benchmark each model in its own process, so peak RSS isn't shared between them."""
+    from concurrent.futures import ProcessPoolExecutor
+
+    results = []
+    for path in paths:
+        with ProcessPoolExecutor(max_workers=1) as pool:
+            results.append(pool.submit(_run_benchmark, path, X, batch_sizes, min_seconds, intra_op_threads).result())
+    return results
+
+
+def print_verification(report):
+    status = "OK" if report['logitMismatches'] == 0 else "MISMATCH"
+    print(f"    Circuit equivalence: {status} ({report['logitMismatches']} of {report['rows']} logits differ, "
+          f"max K {report['maxK']:,} < 2^31)")
+    if report['mismatchedRows']:
+        print(f"      first rows: {report['mismatchedRows']}")
+    if report['outOfDomainRows']:
+        print(f"      {report['outOfDomainRows']} rows have K >= 2^31, outside the graph's exact domain")
+    if not report['float32Exact']:
+        print("      some features exceed 2^24 and are not exact through the float32 input")
+
+
+def print_benchmark(results):
+    batch_sizes = [r['batchSize'] for r in results[0]['throughput']]
+    print(f"\n {'model':<20}{'bytes':>9}{'load ms':>9}{'RSS KiB':>9}"
+          + ''.join(f"{f'rows/s @{b}':>16}" for b in batch_sizes))
+    for r in results:
+        print(f" {Path(r['model']).name:<20}{r['fileBytes']:>9,}{r['loadMs']:>9.1f}{r['runPeakRssKiB']:>9,}"
+              + ''.join(f"{t['rowsPerSec']:>16,.0f}" for t in r['throughput']))
+
+
+def main():
+    import pandas as pd
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--weights', default='weights.bin')
+    parser.add_argument('--out', default=INTEGER_ONNX)
+    parser.add_argument('--input-type', choices=['float32', 'int64'], default='float32',
+                        help="float32 'float_input' like model.onnx (default) or int64 'int_input'")
+    parser.add_argument('--data', default='dataset_encoded.csv', help="encoded rows to verify and benchmark on")
+    parser.add_argument('--benchmark', action='store_true', help="compare throughput and memory with --float-model")
+    parser.add_argument('--float-model', default='model.onnx')
+    parser.add_argument('--batch-sizes', type=int, nargs='+', default=[1, 64, 1024, 8192])
+    parser.add_argument('--min-seconds', type=float, default=0.5, help="time spent per batch size")
+    parser.add_argument('--intra-op-threads', type=int, default=0)
+    parser.add_argument('--json', help="write the verification (and benchmark) report to this file")
+    args = parser.parse_args()
+
+    weights = np.fromfile(args.weights, dtype='<f4')
+    # The label is the last column of every encoded CSV
+    features = pd.read_csv(args.data).iloc[:, :-1].to_numpy(dtype=np.int64)
+    distance = check_exactness()
+    export_integer_onnx(args.weights, args.out, features.shape[1], args.input_type)
+    print(f" Saved: {args.out} (closest K * c to an integer for K < 2^31: 2^{math.log2(distance):.1f})")
+
+    report = {'verification': verify_integer_onnx(args.out, weights, features)}
+    print_verification(report['verification'])
+    if args.benchmark:
+        report['benchmark'] = benchmark_models([args.float_model, args.out], features, args.batch_sizes,
+                                               args.min_seconds, args.intra_op_threads)
+        print_benchmark(report['benchmark'])
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(report, f, indent=2)
+    if report['verification']['logitMismatches']:
+        raise SystemExit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,235 +1,795 @@
+"""Builds a model's artifacts from its pipeline.json.
+
+Every example (adult-income, heart-disease, student-performance) is built by
+this one pipeline; the per-model differences (dataset, target rule, protected
+attribute, categorical columns, fixed-point/standard scaling, fairness policy
+and metadata) live in `pipeline.json` next to the dataset. Stage outputs are
+written relative to that directory.
+
+    uv run main.py                              # this directory
+    uv run main.py --model ../heart-disease     # another example
+    uv run build_models.py                      # every example, in parallel
+"""
+import argparse
 import json
-
-import numpy as np
-import onnxruntime as ort
-import pandas as pd
-from skl2onnx import to_onnx
-from skl2onnx.common.data_types import FloatTensorType
-from sklearn.linear_model import LogisticRegression
-from sklearn.metrics import roc_curve
-from sklearn.model_selection import train_test_split
-from sklearn.preprocessing import LabelEncoder
-
-# Load data with quotechar to handle quotes properly
-data = pd.read_csv("./dataset.csv", sep=',', quotechar='"')
-
-print("Columns:", data.columns.tolist())
-
-# Encode categorical variables
-categorical_cols = ['workclass', 'education', 'marital.status', 'occupation',
-                    'relationship', 'race', 'sex', 'native.country']
-
-X = data.drop('income', axis=1)
-y = (data['income'] == '>50K').astype(int)
-
-label_encoders = {}
-for col in categorical_cols:
-    if col in X.columns:
-        le = LabelEncoder()
-        X[col] = le.fit_transform(X[col].astype(str))
-        # Save encoder mapping for reproducibility
-        label_encoders[col] = {str(cls): int(idx) for idx, cls in enumerate(le.classes_)}
-
-# Save the encoder mappings for SDK/circuit use
-with open('label_encoders.json', 'w') as f:
-    json.dump(label_encoders, f, indent=2)
-
-# Add income label (0 or 1) to complete dataset
-X['income'] = y
-
-# Ensure all columns are integers (Adult Income dataset has no decimals)
-# Categorical columns are already encoded as integers, numeric columns are also integers in this dataset
-for col in X.columns:
-	X[col] = X[col].astype(int)
-
-# Save the fully encoded dataset (all features as integers, ready for hashing)
-X.to_csv('dataset_encoded.csv', index=False)
-print("Saved: dataset_encoded.csv (all features as integers)\n")
-
-# Create a small subset for testing (10 rows)
-X_small = X.head(10)
-X_small.to_csv('dataset_encoded_small.csv', index=False)
-print("Saved: dataset_encoded_small.csv (10 rows for circuit testing)\n")
-
-# Train/test split (using already-encoded X)
-X_train, X_test, y_train, y_test = train_test_split(X.drop('income', axis=1), X['income'], test_size=0.3, random_state=42)
-X_test = pd.DataFrame(X_test, columns=X.drop('income', axis=1).columns)
-y_test = pd.Series(y_test)
-
-# Train model
-model = LogisticRegression(max_iter=2000, random_state=42)
-model.fit(X_train, y_train)
-
-# Save weights (for ZK proof generation)
-weights = np.concatenate([model.coef_.flatten(), model.intercept_]).astype(np.float32)
-weights.tofile('weights.bin')
-
-# Export model to ONNX format
-n_features = X_train.shape[1]
-initial_type = [('float_input', FloatTensorType([None, n_features]))]
-
-onx = to_onnx(
-    model,
-    initial_types=initial_type,
-    target_opset=15,
-    options={'zipmap': False},
-)
-
-with open('model.onnx', 'wb') as f:
-    f.write(onx.SerializeToString())
-
-# Test the ONNX model
-sess = ort.InferenceSession('model.onnx')
-input_name = sess.get_inputs()[0].name
-output_name = sess.get_outputs()[0].name
-print(f"ONNX input name: {input_name}, output name: {output_name}")
-
-# Verify ONNX model produces same results
-test_sample = X_test.iloc[0:1].values.astype(np.float32)
-onnx_pred = sess.run([output_name], {input_name: test_sample})[0]
-sklearn_pred = model.predict(test_sample)
-print(f"ONNX prediction: {onnx_pred[0]}, Sklearn prediction: {sklearn_pred[0]}")
-
-print("\n Computing fairness metrics and post-processing thresholds...\n")
-
-# Get predictions and continuous scores
-y_pred = model.predict(X_test)
-scores = model.decision_function(X_test)
-
-# Separate by protected attribute (sex)
-protected_attr = X_test['sex'].to_numpy()
-group_0_mask = protected_attr == 0
-group_1_mask = protected_attr == 1
-
-# Demographic parity
-group_0_pos_rate = y_pred[group_0_mask].mean()
-group_1_pos_rate = y_pred[group_1_mask].mean()
-demographic_parity = abs(group_0_pos_rate - group_1_pos_rate)
-
-# TPR and FPR for equalized odds
-y_test_arr = y_test.to_numpy()
-group_0_tpr = y_pred[group_0_mask & (y_test_arr == 1)].sum() / max((y_test_arr[group_0_mask] == 1).sum(), 1)
-group_1_tpr = y_pred[group_1_mask & (y_test_arr == 1)].sum() / max((y_test_arr[group_1_mask] == 1).sum(), 1)
-group_0_fpr = y_pred[group_0_mask & (y_test_arr == 0)].sum() / max((y_test_arr[group_0_mask] == 0).sum(), 1)
-group_1_fpr = y_pred[group_1_mask & (y_test_arr == 0)].sum() / max((y_test_arr[group_1_mask] == 0).sum(), 1)
-
-equalized_odds = max(abs(group_0_tpr - group_1_tpr), abs(group_0_fpr - group_1_fpr))
-target_disparity = max(0.05, demographic_parity * 0.8)
-
-# ===== Algorithm 1: Fairness-Aware Post-Processing =====
-# Compute per-group thresholds (t_a, t_b) that achieve demographic parity
-
-print(" Computing per-group thresholds (Algorithm 1)...")
-
-# Separate scores and labels by group
-group_0_scores = scores[group_0_mask]
-group_0_labels = y_test_arr[group_0_mask]
-group_1_scores = scores[group_1_mask]
-group_1_labels = y_test_arr[group_1_mask]
-
-# Compute ROC curves per subpopulation (Algorithm 1, step 1)
-fpr_0, tpr_0, thresholds_0 = roc_curve(group_0_labels, group_0_scores)
-fpr_1, tpr_1, thresholds_1 = roc_curve(group_1_labels, group_1_scores)
-
-# Find ROC intersection point (Algorithm 1, step 2)
-# Simplified: Find operating point where TPRs are closest
-from scipy.interpolate import interp1d
-
-# Interpolate ROC curves
-common_fpr = np.linspace(0, 1, 500)
-tpr_0_interp = interp1d(fpr_0, tpr_0, bounds_error=False, fill_value=(0, 1))
-tpr_1_interp = interp1d(fpr_1, tpr_1, bounds_error=False, fill_value=(0, 1))
-
-# Find FPR where TPRs are most similar (approximating ROC intersection)
-tpr_diff = np.abs(tpr_0_interp(common_fpr) - tpr_1_interp(common_fpr))
-best_idx = np.argmin(tpr_diff)
-target_fpr = common_fpr[best_idx]
-
-# Get thresholds corresponding to this operating point (Algorithm 1, step 3)
-threshold_group_a = float(np.interp(target_fpr, fpr_0, thresholds_0))
-threshold_group_b = float(np.interp(target_fpr, fpr_1, thresholds_1))
-
-print(f"    Group 0 (a) threshold: {threshold_group_a:.4f}")
-print(f"    Group 1 (b) threshold: {threshold_group_b:.4f}")
-
-# Find the index of the protected attribute (sex) in the feature array
-# This is needed for the ZK circuit to identify which feature is the sensitive attribute
-features_list = X.drop('income', axis=1).columns.tolist()
-protected_attribute_name = "sex"
-protected_attribute_index = features_list.index(protected_attribute_name)
-print(f"    Protected attribute '{protected_attribute_name}' is at column index: {protected_attribute_index}")
-
-# Convert thresholds to fixed-point integers for ZK circuit (scale by 10000 for 4 decimal places)
-# Use absolute values since Field is unsigned in Noir
+import os
+from pathlib import Path
+
+from build import BUILD_DIR, Pipeline, Stage, write_bytes, write_csv, write_json
+from profiling import phase
+
+# Heavy imports (pandas, sklearn, skl2onnx, onnxruntime) live inside the stages so
+# that a rerun where nothing, or only the metadata, changed finishes in milliseconds.
+
+MODEL_PKL = str(BUILD_DIR / 'model.pkl')
+TRAIN_METRICS = str(BUILD_DIR / 'train_metrics.json')
+FAIRNESS_METRICS = str(BUILD_DIR / 'fairness_metrics.json')
+FAIRNESS_REPORT = str(BUILD_DIR / 'fairness_report.json')
+ONNX_REPORT = str(BUILD_DIR / 'onnx_report.json')
+CIRCUIT_CHECK = str(BUILD_DIR / 'circuit_check.json')
+WEIGHTS_HASH = str(BUILD_DIR / 'weights_hash.json')
+INTEGER_ONNX_REPORT = str(BUILD_DIR / 'integer_onnx_report.json')
+CORESET_CSV = 'calibration_coreset.csv'
+CORESET_REPORT = str(BUILD_DIR / 'coreset.json')
+COMMITMENT_FILES = [str(BUILD_DIR / 'commitment' / name)
+                    for name in ('master_salt.txt', 'salts.json', 'commitments.json', 'merkle_proofs.json')]
+
+MODEL_DIR = Path(__file__).resolve().parent
+CONFIG_FILE = 'pipeline.json'
+# Fixed-point scale of thresholds and rates in the circuits
 THRESHOLD_SCALE = 10000
-threshold_group_a_scaled = int(round(abs(threshold_group_a) * THRESHOLD_SCALE))
-threshold_group_b_scaled = int(round(abs(threshold_group_b) * THRESHOLD_SCALE))
-print(f"    Scaled thresholds (SCALE={THRESHOLD_SCALE}, absolute values): group_a={threshold_group_a_scaled}, group_b={threshold_group_b_scaled}")
-
-# Save fairness config with per-group thresholds (as scaled positive integers)
-fairness_config = {
-    "metric": "demographic_parity",
-    "targetDisparity": round(float(target_disparity), 4),
-    "protectedAttribute": "sex",
-    "protectedAttributeIndex": protected_attribute_index,
-
-    # Per-group thresholds from Algorithm 1 (scaled to positive integers for ZK circuit)
-    "thresholds": {
-        "group_a": threshold_group_a_scaled,
-        "group_b": threshold_group_b_scaled
-    },
-
-    "calculatedMetrics": {
-        "demographicParity": round(float(demographic_parity), 4),
-        "equalizedOdds": round(float(equalized_odds), 4),
-        "group0PositiveRate": round(float(group_0_pos_rate), 4),
-        "group1PositiveRate": round(float(group_1_pos_rate), 4),
-        "group0TPR": round(float(group_0_tpr), 4),
-        "group1TPR": round(float(group_1_tpr), 4)
+# pipeline.json "model": C, class_weight ("balanced" or null) and solver of the
+# LogisticRegression, and encoded features it may not use (their weights are 0)
+DEFAULT_MODEL = {'C': 1.0, 'classWeight': None, 'solver': 'lbfgs', 'dropFeatures': []}
+# fairness_metrics.json keys of the metrics a fairness policy can target
+METRIC_KEYS = {'demographic_parity': 'demographicParity', 'equalized_odds': 'equalizedOdds'}
+
+
+def load_config(model_dir) -> dict:
+    """pipeline.json of a model directory, with defaults filled in."""
+    with open(Path(model_dir) / CONFIG_FILE) as f:
+        config = json.load(f)
+    config.setdefault('dataset', 'dataset.csv')
+    config.setdefault('categorical', [])
+    config.setdefault('fixedPoint', {})
+    config.setdefault('standardize', False)
+    config.setdefault('groupDefinitions', [[config['protectedAttribute']]])
+    # LogisticRegression settings; sweep.py searches over them
+    config['model'] = {**DEFAULT_MODEL, **config.get('model', {})}
+    config.setdefault('fairness', {})
+    config['fairness'] = {'metric': 'demographic_parity', 'minTargetDisparity': 0.05,
+                          'targetDisparityFactor': 0.8, **config['fairness']}
+    if config['fairness']['metric'] not in METRIC_KEYS:
+        raise ValueError(f"fairness.metric must be one of {list(METRIC_KEYS)}, got {config['fairness']['metric']!r}")
+    return config
+
+
+def encode_dataset(params):
+    from encoding import build_vocabulary, encode_csv, load_vocabulary
+
+    target = params['target']
+    chunk_size = params['chunk_size']
+
+    if params['frozen_vocab']:
+        # Reuse the committed category -> code mapping instead of refitting it
+        label_encoders = load_vocabulary('label_encoders.json')
+    else:
+        label_encoders = build_vocabulary(params['dataset'], params['categorical_cols'], target, chunk_size)
+        # Save the encoder mappings for SDK/circuit use
+        write_json('label_encoders.json', label_encoders)
+
+    # Save the fully encoded dataset (all features as integers, ready for hashing)
+    # plus a small subset for circuit testing
+    stats = encode_csv(
+        params['dataset'], 'dataset_encoded.csv', label_encoders, target, params['positive_label'],
+        chunk_size=chunk_size, on_unseen=params['on_unseen'],
+        small_path='dataset_encoded_small.csv', small_rows=params['small_rows'],
+        fixed_point=params['fixed_point'],
+    )
+    print(f"Saved: dataset_encoded.csv ({stats['written']} rows, all features as integers)")
+    print(f"Saved: dataset_encoded_small.csv ({params['small_rows']} rows for circuit testing)")
+    if stats['unseen']:
+        print(f"    Unseen categories ({params['on_unseen']}): {stats['unseen']}, dropped rows: {stats['dropped']}")
+    print()
+
+
+def fit_model(X_train, y_train, model_config, max_iter, random_state, standardize, warm=None):
+    """Fit the pipeline's logistic regression; returns (model, estimator).
+
+    `model` takes all columns of `X_train` as raw integer features, as
+    weights.bin and model.onnx do: a standardisation is folded into its
+    coefficients and dropped features get weight 0. `estimator` is the fit
+    itself; passing it back as `warm` (with another C) warm-starts the next fit.
+    """
+    import copy
+
+    import numpy as np
+    import pandas as pd
+    from sklearn.linear_model import LogisticRegression
+
+    drop = model_config['dropFeatures']
+    X_fit = X_train.drop(columns=drop) if drop else X_train
+    if warm is not None:
+        estimator = warm.set_params(C=model_config['C'], warm_start=True)
+    else:
+        estimator = LogisticRegression(C=model_config['C'], class_weight=model_config['classWeight'],
+                                       solver=model_config['solver'], max_iter=max_iter,
+                                       random_state=random_state)
+    if standardize:
+        from sklearn.preprocessing import StandardScaler
+
+        # Fit on standardized features, then fold the scaler into the coefficients:
+        # w.(x - mean)/std + b == (w/std).x + (b - w.mean/std). The stored model,
+        # weights.bin and model.onnx all take the raw integer features.
+        scaler = StandardScaler().fit(X_fit)
+        estimator.fit(pd.DataFrame(scaler.transform(X_fit), columns=X_fit.columns), y_train)
+        model = copy.deepcopy(estimator)
+        coef = estimator.coef_ / scaler.scale_
+        model.intercept_ = estimator.intercept_ - coef @ scaler.mean_
+        model.coef_ = coef
+    else:
+        estimator.fit(X_fit, y_train)
+        model = copy.deepcopy(estimator) if warm is not None or drop else estimator
+    model.set_params(warm_start=False)
+    if drop:
+        keep = np.isin(X_train.columns, X_fit.columns)
+        coef = np.zeros((1, X_train.shape[1]))
+        coef[:, keep] = model.coef_
+        model.coef_ = coef
+        model.n_features_in_ = X_train.shape[1]
+        model.feature_names_in_ = np.asarray(X_train.columns, dtype=object)
+    return model, estimator
+
+
+def train_model(params):
+    import pickle
+
+    import numpy as np
+    import pandas as pd
+    from sklearn.model_selection import train_test_split
+
+    target = params['target']
+    with phase('load_csv') as p:
+        X = pd.read_csv('dataset_encoded.csv')
+        p.rows = len(X)
+
+    # Train/test split (using already-encoded X)
+    with phase('split', rows=len(X)):
+        X_train, X_test, y_train, y_test = train_test_split(
+            X.drop(target, axis=1), X[target],
+            test_size=params['test_size'], random_state=params['random_state'],
+        )
+
+    # Train model
+    with phase('fit', rows=len(X_train)):
+        model, _ = fit_model(X_train, y_train, params['model'], params['max_iter'], params['random_state'],
+                             params['standardize'])
+
+    # Save weights (for ZK proof generation)
+    weights = np.concatenate([model.coef_.flatten(), model.intercept_]).astype(np.float32)
+    write_bytes('weights.bin', weights.tobytes())
+
+    # Keep the fitted estimator for the export and fairness stages
+    write_bytes(MODEL_PKL, pickle.dumps(model))
+
+    # Save test dataset as calibration dataset (already encoded, all numeric)
+    X_test_with_income = X_test.copy()
+    X_test_with_income[target] = y_test
+    write_csv('calibration_dataset.csv', X_test_with_income)
+
+    write_json(TRAIN_METRICS, {
+        "testAccuracy": float(model.score(X_test, y_test)),
+        "numFeatures": int(X_train.shape[1]),
+    })
+
+
+def export_onnx(params):
+    import pickle
+
+    import onnxruntime as ort
+    from skl2onnx import to_onnx
+    from skl2onnx.common.data_types import FloatTensorType
+
+    with open(MODEL_PKL, 'rb') as f:
+        model = pickle.load(f)
+
+    # Export model to ONNX format
+    n_features = model.coef_.shape[1]
+    initial_type = [('float_input', FloatTensorType([None, n_features]))]
+
+    with phase('export'):
+        onx = to_onnx(
+            model,
+            initial_types=initial_type,
+            target_opset=params['target_opset'],
+            options={'zipmap': False},
+        )
+    write_bytes('model.onnx', onx.SerializeToString())
+
+    # Full-dataset equivalence is checked by the verify_onnx stage
+    with phase('check'):
+        sess = ort.InferenceSession('model.onnx')
+    print(f"ONNX input name: {sess.get_inputs()[0].name}, output name: {sess.get_outputs()[0].name}")
+
+
+def verify_onnx(params):
+    import pickle
+
+    import pandas as pd
+
+    import onnx_check
+
+    with open(MODEL_PKL, 'rb') as f:
+        model = pickle.load(f)
+    with phase('load_csv') as p:
+        X = pd.read_csv(params['data']).drop(params['target'], axis=1).to_numpy()
+        p.rows = len(X)
+
+    print(f"\n Verifying model.onnx against sklearn on {len(X)} rows ({params['data']})...")
+    with phase('check', rows=len(X)):
+        # Equivalence only: timings would make the report nondeterministic (benchmark with onnx_check.py)
+        report = onnx_check.run('model.onnx', model, X,
+                                intra_op_threads=params['intra_op_threads'],
+                                inter_op_threads=params['inter_op_threads'],
+                                graph_optimization=params['graph_optimization'])
+    onnx_check.print_report(report)
+    write_json(ONNX_REPORT, report)
+    if report['equivalence']['mismatches']:
+        raise RuntimeError(f"model.onnx disagrees with sklearn on {report['equivalence']['mismatches']} rows; "
+                           f"see {ONNX_REPORT}")
+
+
+def export_ort_model(params):
+    import pandas as pd
+
+    import ort_export
+
+    with phase('export'):
+        metadata = ort_export.export_ort('model.onnx', params['level'], params['force'])
+    print(f"\n Saved: {ort_export.ORT_MODEL} ({metadata['ortBytes']:,} bytes, {params['level']} optimization, "
+          f"onnxruntime {metadata['onnxruntimeVersion']})")
+    with phase('load_csv') as p:
+        X = pd.read_csv(params['data']).drop(params['target'], axis=1).to_numpy()
+        p.rows = len(X)
+    with phase('check', rows=len(X)):
+        report = ort_export.verify_ort('model.onnx', X)
+    print(f"    {report['labelMismatches']} of {report['rows']} labels differ from model.onnx, "
+          f"max probability difference {report['maxProbabilityDiff']:.2e}")
+    if report['labelMismatches'] or report['sourceSha256Embedded'] != metadata['sourceSha256']:
+        raise RuntimeError(f"{ort_export.ORT_MODEL} does not reproduce model.onnx on {params['data']}")
+
+
+def export_integer_onnx(params):
+    import numpy as np
+    import pandas as pd
+
+    import integer_onnx
+
+    with phase('load_csv') as p:
+        features = pd.read_csv(params['data']).drop(params['target'], axis=1).to_numpy(dtype=np.int64)
+        p.rows = len(features)
+    with phase('export'):
+        integer_onnx.export_integer_onnx('weights.bin', integer_onnx.INTEGER_ONNX, features.shape[1],
+                                         params['input_type'])
+    weights = np.fromfile('weights.bin', dtype='<f4')
+    print(f"\n Verifying {integer_onnx.INTEGER_ONNX} against the circuit's fixed-point logits "
+          f"on {len(features)} rows ({params['data']})...")
+    with phase('check', rows=len(features)):
+        report = integer_onnx.verify_integer_onnx(integer_onnx.INTEGER_ONNX, weights, features)
+    integer_onnx.print_verification(report)
+    write_json(INTEGER_ONNX_REPORT, report)
+    if report['logitMismatches'] or report['outOfDomainRows']:
+        raise RuntimeError(f"{integer_onnx.INTEGER_ONNX} is not bit-exact with the circuit on {params['data']}; "
+                           f"see {INTEGER_ONNX_REPORT}")
+
+
+def compute_fairness_metrics(params):
+    import pickle
+
+    import numpy as np
+    import pandas as pd
+
+    print("\n Computing fairness metrics and post-processing thresholds...\n")
+
+    with open(MODEL_PKL, 'rb') as f:
+        model = pickle.load(f)
+
+    with phase('load_csv') as p:
+        calibration = pd.read_csv('calibration_dataset.csv')
+        p.rows = len(calibration)
+    X_test = calibration.drop(params['target'], axis=1)
+    y_test_arr = calibration[params['target']].to_numpy()
+
+    # Get predictions and continuous scores
+    with phase('predict', rows=len(X_test)):
+        y_pred = model.predict(X_test)
+        scores = model.decision_function(X_test)
+
+    # Per-group confusion matrices in a single pass (fairness.py)
+    from fairness import confusion_matrices, disparities, group_rates
+
+    protected_attr = X_test[params['protected_attribute']].to_numpy()
+    group_0_mask = protected_attr == 0
+    group_1_mask = protected_attr == 1
+
+    with phase('metrics', rows=len(X_test)):
+        rates = group_rates(confusion_matrices(protected_attr, y_test_arr, y_pred, n_groups=2))
+    gaps = disparities(rates)
+    group_0_pos_rate, group_1_pos_rate = rates['positive_rate']
+    group_0_tpr, group_1_tpr = rates['tpr']
+    demographic_parity = gaps['demographic_parity']
+    equalized_odds = gaps['equalized_odds']
+
+    # ===== Algorithm 1: Fairness-Aware Post-Processing =====
+    # Exact per-group thresholds (t_a, t_b): most accurate pair whose fairness gap,
+    # computed with the circuit's THRESHOLD_SCALE arithmetic, is within tolerance
+    from thresholds import optimize_thresholds
+
+    print(f" Computing per-group thresholds (Algorithm 1, {params['threshold_objective']})...")
+    two_groups = group_0_mask | group_1_mask
+    with phase('threshold_search', rows=int(two_groups.sum())):
+        result = optimize_thresholds(scores[two_groups], y_test_arr[two_groups], protected_attr[two_groups],
+                                     objective=params['threshold_objective'],
+                                     tolerance=params['threshold_tolerance'],
+                                     scale=params['threshold_scale'])
+    threshold_group_a, threshold_group_b = result.thresholds
+    print(f"    Post-processed gap: {result.gap / params['threshold_scale']:.4f}, accuracy: {result.accuracy:.4f}")
+
+    print(f"    Group 0 (a) threshold: {threshold_group_a:.4f}")
+    print(f"    Group 1 (b) threshold: {threshold_group_b:.4f}")
+
+    # Find the index of the protected attribute in the feature array
+    # This is needed for the ZK circuit to identify which feature is the sensitive attribute
+    features_list = X_test.columns.tolist()
+    protected_attribute_index = features_list.index(params['protected_attribute'])
+    print(f"    Protected attribute '{params['protected_attribute']}' is at column index: {protected_attribute_index}")
+
+    # Raw (unscaled) results; the fairness_config stage turns these into the circuit config
+    write_json(FAIRNESS_METRICS, {
+        "protectedAttribute": params['protected_attribute'],
+        "protectedAttributeIndex": protected_attribute_index,
+        "thresholdGroupA": threshold_group_a,
+        "thresholdGroupB": threshold_group_b,
+        # Exactly what the optimizer evaluated, at threshold_scale; fairness_config stores these
+        "thresholdsScaled": result.thresholds_scaled,
+        "thresholdObjective": result.objective,
+        "thresholdGap": result.gap / params['threshold_scale'],
+        "thresholdAccuracy": result.accuracy,
+        "demographicParity": float(demographic_parity),
+        "equalizedOdds": float(equalized_odds),
+        "group0PositiveRate": float(group_0_pos_rate),
+        "group1PositiveRate": float(group_1_pos_rate),
+        "group0TPR": float(group_0_tpr),
+        "group1TPR": float(group_1_tpr),
+    })
+
+
+def write_fairness_report(params):
+    import pickle
+
+    import pandas as pd
+
+    from fairness import evaluate_all
+
+    with open(MODEL_PKL, 'rb') as f:
+        model = pickle.load(f)
+    with phase('load_csv') as p:
+        calibration = pd.read_csv('calibration_dataset.csv')
+        p.rows = len(calibration)
+    X_test = calibration.drop(params['target'], axis=1)
+    with phase('predict', rows=len(X_test)):
+        y_pred = model.predict(X_test)
+
+    with phase('bootstrap', rows=len(X_test)):
+        report = evaluate_all(X_test, calibration[params['target']].to_numpy(), y_pred, params['group_definitions'],
+                              n_boot=params['n_bootstrap'], confidence=params['confidence'], seed=params['seed'])
+    write_json(FAIRNESS_REPORT, report)
+
+    print(f"\n Fairness report ({params['n_bootstrap']} bootstrap resamples, {params['confidence']:.0%} CI):")
+    for name, r in report.items():
+        low, high = r['intervals']['demographicParity'] if 'intervals' in r else (None, None)
+        ci = f" [{low:.4f}, {high:.4f}]" if low is not None else ""
+        print(f"    {name:<12} groups={len(r['groups']):<3} DP={r['demographicParity']:.4f}{ci}  "
+              f"EO={r['equalizedOdds']:.4f}")
+
+
+def write_fairness_config(params):
+    with open(FAIRNESS_METRICS) as f:
+        metrics = json.load(f)
+
+    target_disparity = max(params['min_target_disparity'],
+                           metrics[METRIC_KEYS[params['metric']]] * params['target_disparity_factor'])
+
+    # Fixed-point thresholds for the ZK circuit, exactly as the optimizer chose them (scaled by 10000).
+    # They stay signed here; the SDK and shards.py wrap negatives into fields like the weights
+    threshold_scale = params['threshold_scale']
+    threshold_group_a_scaled, threshold_group_b_scaled = metrics['thresholdsScaled']
+    print(f"    Scaled thresholds (SCALE={threshold_scale}): group_a={threshold_group_a_scaled}, "
+          f"group_b={threshold_group_b_scaled}")
+
+    # Save fairness config with per-group thresholds (as signed scaled integers)
+    fairness_config = {
+        "metric": params['metric'],
+        "targetDisparity": round(float(target_disparity), 4),
+        "protectedAttribute": metrics['protectedAttribute'],
+        "protectedAttributeIndex": metrics['protectedAttributeIndex'],
+
+        # Per-group thresholds from Algorithm 1 (signed integers at threshold_scale for the ZK circuit)
+        "thresholds": {
+            "group_a": threshold_group_a_scaled,
+            "group_b": threshold_group_b_scaled
+        },
+
+        "calculatedMetrics": {
+            "demographicParity": round(metrics['demographicParity'], 4),
+            "equalizedOdds": round(metrics['equalizedOdds'], 4),
+            "group0PositiveRate": round(metrics['group0PositiveRate'], 4),
+            "group1PositiveRate": round(metrics['group1PositiveRate'], 4),
+            "group0TPR": round(metrics['group0TPR'], 4),
+            "group1TPR": round(metrics['group1TPR'], 4)
+        }
     }
-}
-
-with open('fairness_threshold.json', 'w') as f:
-    json.dump(fairness_config, f, indent=2)
-
-# Save model metadata
-model_metadata = {
-    "name": "Adult Income Prediction Model",
-    "description": "Logistic regression model predicting income >50K from census data",
-    "creator": "ZKFair Team",
-    "inferenceUrl": "https://zkfair-provider.fly.dev"
-}
-
-with open('model.json', 'w') as f:
-    json.dump(model_metadata, f, indent=2)
-
-# Save test dataset as calibration dataset (already encoded, all numeric)
-X_test_with_income = X_test.copy()
-X_test_with_income['income'] = y_test
-X_test_with_income.to_csv('calibration_dataset.csv', index=False)
-
-# Print results
-print("\n Generated files:")
-print("   - weights.bin (model parameters)")
-print("   - model.onnx (ONNX format)")
-print("   - dataset_encoded.csv (all features numeric, for ZK commitment)")
-print("   - dataset_encoded_small.csv (10 rows for circuit testing)")
-print("   - label_encoders.json (categorical mappings for reproducibility)")
-print("   - fairness_threshold.json (with per-group thresholds)")
-print("   - model.json (metadata)")
-print("   - calibration_dataset.csv (D_val for OATH, all numeric)\n")
-
-print(" Model Performance:")
-print(f"   Test accuracy: {model.score(X_test, y_test):.4f}")
-print(f"   Number of features: {n_features}\n")
-
-print("  Fairness Metrics:")
-print(f"   Demographic Parity: {demographic_parity:.4f}")
-print(f"   Equalized Odds: {equalized_odds:.4f}")
-print(f"   Group 0 positive rate: {group_0_pos_rate:.4f}")
-print(f"   Group 1 positive rate: {group_1_pos_rate:.4f}\n")
-
-print(" Post-Processing Thresholds (for ZK commitment):")
-print(f"   Group A threshold (t_a): {threshold_group_a:.4f}")
-print(f"   Group B threshold (t_b): {threshold_group_b:.4f}")
-print(f"   Protected attribute index: {protected_attribute_index}")
+    write_json('fairness_threshold.json', fairness_config)
+
+
+def check_circuits(params):
+    import numpy as np
+
+    from circuit_emulator import NUM_FEATURES, check_training, print_check
+
+    # Emulate the training circuit on the rows `zkfair commit --dir` commits
+    weights = np.fromfile('weights.bin', dtype='<f4')
+    with phase('load_csv') as p:
+        # A few integer rows; not worth importing pandas for, since this stage reruns on every threshold change
+        rows = np.loadtxt(params['dataset'], dtype=np.int64, delimiter=',', skiprows=1, ndmin=2)
+        p.rows = len(rows)
+    with open('fairness_threshold.json') as f:
+        config = json.load(f)
+
+    print(f"\n Emulating the training circuit on {params['dataset']}...")
+    if rows.shape[1] - 1 != NUM_FEATURES:
+        result = {'circuit': 'training', 'rows': len(rows), 'fitsCircuit': False, 'disparityScaled': None,
+                  'floatDisagreements': 0, 'passes': False,
+                  'failures': [f"model has {rows.shape[1] - 1} features, the circuit takes {NUM_FEATURES}"]}
+    else:
+        with phase('emulate', rows=len(rows)):
+            result = check_training(weights, rows, config['protectedAttributeIndex'], config['targetDisparity'])
+    print_check(result)
+    write_json(CIRCUIT_CHECK, result)
+    if not result['passes'] and params['enforce']:
+        raise RuntimeError(f"The training circuit would reject {params['dataset']}: {'; '.join(result['failures'])}")
+
+
+def select_coreset(params):
+    import coreset
+
+    with phase('select') as p:
+        rows, report = coreset.build_coreset(MODEL_PKL, 'calibration_dataset.csv', FAIRNESS_METRICS,
+                                             params['target'], params['protected_attribute'],
+                                             epsilon=params['epsilon'], objective=params['threshold_objective'],
+                                             tolerance=params['threshold_tolerance'],
+                                             scale=params['threshold_scale'])
+        p.rows = report['sourceRows']
+    coreset.print_report(report)
+    write_csv(CORESET_CSV, rows)
+    write_json(CORESET_REPORT, report)
+
+
+def write_drift_reference(params):
+    import drift
+
+    with phase('sketch') as p:
+        sketches = drift.build_reference('calibration_dataset.csv', 'label_encoders.json', params['target'],
+                                         params['protected_attribute'], params['k'])
+        p.rows = sum(sketches.rows().values())
+    drift.save_sketches(drift.DRIFT_REFERENCE, sketches, source='calibration_dataset.csv')
+    print(f"\n Saved: {drift.DRIFT_REFERENCE} ({sketches.retained:,} sketch items, {len(sketches.vocab_sizes)} "
+          f"categorical and {len(sketches.features) - len(sketches.vocab_sizes)} numeric features per group)")
+
+
+def hash_weights(params):
+    from commitment import weights_hash
+
+    # Its own stage so that the Poseidon hash (and its parameter derivation) only
+    # reruns when weights.bin changes, not on every bundle rebuild
+    try:
+        with phase('hash'):
+            write_json(WEIGHTS_HASH, {'weightsHash': weights_hash('weights.bin')})
+    except ValueError as e:
+        # More weights than the SDK's Poseidon takes: the model cannot be committed
+        write_json(WEIGHTS_HASH, {'weightsHash': None, 'error': str(e)})
+
+
+def write_bundle(params):
+    from bundle import BUNDLE_PATH, write_bundle
+    from commitment import WEIGHT_SCALE
+
+    with open(WEIGHTS_HASH) as f:
+        w_hash = json.load(f)['weightsHash']
+    # Reads both CSVs into int32 columns, unless the bundle already holds them and
+    # only its fairness section is rewritten; the final file replace is counted as `write`
+    with phase('pack') as p:
+        header = write_bundle(BUNDLE_PATH, 'weights.bin', 'dataset_encoded.csv', 'fairness_threshold.json',
+                              'label_encoders.json', 'calibration_dataset.csv',
+                              extra={'weightsHash': w_hash, 'weightScale': WEIGHT_SCALE,
+                                     'thresholdScale': params['threshold_scale'],
+                                     'fixedPoint': params['fixed_point']})
+        p.rows = sum(s['rows'] for s in header['sections'].values() if 'rows' in s)
+    rows = {name: s['rows'] for name, s in header['sections'].items() if 'rows' in s}
+    print(f"Saved: {BUNDLE_PATH} (weights + int32 columns, rows: {rows})")
+
+
+def write_model_metadata(params):
+    # Save model metadata
+    write_json('model.json', params['metadata'])
+
+
+def commit_dataset(params):
+    from commitment import COMMITMENT_DIR, build_commitment, cli_metadata, write_commitment
+
+    # Same commitment as `zkfair commit`, for commitment.py/shards.py and the SDK cache
+    with open('model.json') as f:
+        metadata = cli_metadata(json.load(f))
+    with phase('hash') as p:
+        commitment = build_commitment('dataset_encoded.csv', 'weights.bin', metadata, params['workers'])
+        p.rows = commitment['rows']
+    write_commitment(COMMITMENT_DIR, commitment)
+    print(f" Dataset Merkle Root: {commitment['datasetMerkleRoot']} ({commitment['rows']} rows, "
+          f"{commitment['timings']['total']:.2f}s)")
+
+
+def build_pipeline(config, chunk_size=100_000, frozen_vocab=False, on_unseen='error', circuit_gate='warn',
+                   commit=False, commit_workers=None, integer_onnx=False, coreset=None, profiler=None, force=False):
+    target = config['target']['column']
+    encoded_outputs = ['dataset_encoded.csv', 'dataset_encoded_small.csv']
+    stages = [
+        Stage(
+            'encode', encode_dataset,
+            # A frozen vocabulary is read from label_encoders.json instead of written to it
+            inputs=[config['dataset'], 'label_encoders.json'] if frozen_vocab else [config['dataset']],
+            outputs=encoded_outputs if frozen_vocab else ['label_encoders.json', *encoded_outputs],
+            params={'dataset': config['dataset'], 'categorical_cols': config['categorical'], 'target': target,
+                    'positive_label': {k: v for k, v in config['target'].items() if k != 'column'},
+                    'fixed_point': config['fixedPoint'], 'small_rows': 10, 'chunk_size': chunk_size,
+                    'frozen_vocab': frozen_vocab, 'on_unseen': on_unseen},
+        ),
+        Stage(
+            'train', train_model,
+            inputs=['dataset_encoded.csv'],
+            outputs=['weights.bin', MODEL_PKL, TRAIN_METRICS, 'calibration_dataset.csv'],
+            params={'target': target, 'test_size': 0.3, 'random_state': 42, 'max_iter': 2000,
+                    'standardize': config['standardize'], 'model': config['model']},
+            deps=[fit_model],
+        ),
+        Stage(
+            'export_onnx', export_onnx,
+            inputs=[MODEL_PKL],
+            outputs=['model.onnx'],
+            params={'target_opset': 15},
+        ),
+        Stage(
+            'verify_onnx', verify_onnx,
+            inputs=['model.onnx', MODEL_PKL, 'calibration_dataset.csv'],
+            outputs=[ONNX_REPORT],
+            # Threads 0 = onnxruntime default, like the provider server's InferenceSession.create
+            params={'target': target, 'data': 'calibration_dataset.csv',
+                    'intra_op_threads': 0, 'inter_op_threads': 0, 'graph_optimization': 'all'},
+        ),
+        Stage(
+            'export_ort', export_ort_model,
+            inputs=['model.onnx', 'calibration_dataset.csv'],
+            outputs=['model.ort', 'model.ort.json'],
+            # 'extended', not 'all': layout transforms would tie model.ort to this machine's CPU
+            params={'target': target, 'data': 'calibration_dataset.csv', 'level': 'extended'},
+            # --force must rebuild model.ort too, not just rerun the stage and keep the matching file
+            options={'force': force},
+        ),
+        Stage(
+            'fairness_metrics', compute_fairness_metrics,
+            inputs=[MODEL_PKL, 'calibration_dataset.csv'],
+            outputs=[FAIRNESS_METRICS],
+            params={'target': target, 'protected_attribute': config['protectedAttribute'],
+                    'threshold_objective': 'equalized_odds', 'threshold_tolerance': 0.01,
+                    'threshold_scale': THRESHOLD_SCALE},
+        ),
+        Stage(
+            'fairness_report', write_fairness_report,
+            inputs=[MODEL_PKL, 'calibration_dataset.csv'],
+            outputs=[FAIRNESS_REPORT],
+            params={'target': target, 'group_definitions': config['groupDefinitions'],
+                    'n_bootstrap': 1000, 'confidence': 0.95, 'seed': 42},
+        ),
+        Stage(
+            'fairness_config', write_fairness_config,
+            inputs=[FAIRNESS_METRICS],
+            outputs=['fairness_threshold.json'],
+            params={'metric': config['fairness']['metric'],
+                    'min_target_disparity': config['fairness']['minTargetDisparity'],
+                    'target_disparity_factor': config['fairness']['targetDisparityFactor'],
+                    'threshold_scale': THRESHOLD_SCALE},
+        ),
+        Stage(
+            'drift_reference', write_drift_reference,
+            inputs=['calibration_dataset.csv', 'label_encoders.json'],
+            outputs=['drift_reference.json'],
+            params={'target': target, 'protected_attribute': config['protectedAttribute'], 'k': 512},
+        ),
+        Stage(
+            'weights_hash', hash_weights,
+            inputs=['weights.bin'],
+            outputs=[WEIGHTS_HASH],
+        ),
+        Stage(
+            'bundle', write_bundle,
+            inputs=['weights.bin', WEIGHTS_HASH, 'dataset_encoded.csv', 'calibration_dataset.csv',
+                    'fairness_threshold.json', 'label_encoders.json'],
+            outputs=['model.zkfb'],
+            params={'threshold_scale': THRESHOLD_SCALE, 'fixed_point': config['fixedPoint']},
+        ),
+        Stage(
+            'circuit_gate', check_circuits,
+            inputs=['weights.bin', 'dataset_encoded_small.csv', 'fairness_threshold.json'],
+            outputs=[CIRCUIT_CHECK],
+            params={'dataset': 'dataset_encoded_small.csv', 'enforce': circuit_gate == 'enforce'},
+        ),
+        Stage(
+            'metadata', write_model_metadata,
+            outputs=['model.json'],
+            params={'metadata': config['metadata']},
+        ),
+    ]
+    if integer_onnx:
+        stages.append(Stage(
+            'export_integer_onnx', export_integer_onnx,
+            inputs=['weights.bin', 'dataset_encoded.csv'],
+            outputs=['model_int.onnx', INTEGER_ONNX_REPORT],
+            params={'target': target, 'data': 'dataset_encoded.csv', 'input_type': 'float32'},
+        ))
+    if coreset is not None:
+        stages.append(Stage(
+            'coreset', select_coreset,
+            inputs=[MODEL_PKL, 'calibration_dataset.csv', FAIRNESS_METRICS],
+            outputs=[CORESET_CSV, CORESET_REPORT],
+            params={'target': target, 'protected_attribute': config['protectedAttribute'], 'epsilon': coreset,
+                    'threshold_objective': 'equalized_odds', 'threshold_tolerance': 0.01,
+                    'threshold_scale': THRESHOLD_SCALE},
+        ))
+    if commit:
+        stages.append(Stage(
+            'commitment', commit_dataset,
+            inputs=['dataset_encoded.csv', 'weights.bin', 'model.json'],
+            outputs=COMMITMENT_FILES,
+            options={'workers': commit_workers},
+        ))
+    return Pipeline(stages, profiler=profiler)
+
+
+def print_summary():
+    with open(TRAIN_METRICS) as f:
+        train_metrics = json.load(f)
+    with open(FAIRNESS_METRICS) as f:
+        metrics = json.load(f)
+
+    # Print results
+    print("\n Generated files:")
+    print("   - weights.bin (model parameters)")
+    print("   - model.onnx (ONNX format)")
+    print("   - model.ort (model.onnx pre-optimized in ORT format for fast server startup, hashed in model.ort.json)")
+    print("   - dataset_encoded.csv (all features numeric, for ZK commitment)")
+    print("   - dataset_encoded_small.csv (10 rows for circuit testing)")
+    print("   - label_encoders.json (categorical mappings for reproducibility)")
+    print("   - fairness_threshold.json (with per-group thresholds)")
+    print("   - model.json (metadata)")
+    print("   - calibration_dataset.csv (D_val for OATH, all numeric)")
+    print("   - drift_reference.json (per-group feature sketches of the calibration set, for drift.py)")
+    print("   - model.zkfb (weights, both datasets as int32 columns and the config, memory-mappable)\n")
+
+    print(" Model Performance:")
+    print(f"   Test accuracy: {train_metrics['testAccuracy']:.4f}")
+    print(f"   Number of features: {train_metrics['numFeatures']}\n")
+
+    print("  Fairness Metrics:")
+    print(f"   Demographic Parity: {metrics['demographicParity']:.4f}")
+    print(f"   Equalized Odds: {metrics['equalizedOdds']:.4f}")
+    print(f"   Group 0 positive rate: {metrics['group0PositiveRate']:.4f}")
+    print(f"   Group 1 positive rate: {metrics['group1PositiveRate']:.4f}\n")
+
+    print(" Post-Processing Thresholds (for ZK commitment):")
+    print(f"   Group A threshold (t_a): {metrics['thresholdGroupA']:.4f}")
+    print(f"   Group B threshold (t_b): {metrics['thresholdGroupB']:.4f}")
+    print(f"   Protected attribute index: {metrics['protectedAttributeIndex']}")
+
+
+def build_model(model_dir=MODEL_DIR, force=False, dry_run=False, summary=True, profile=None, profile_dump=None,
+                **options) -> dict:
+    """Run the pipeline of one model directory; returns the stages built and their timings.
+
+    `options` are the keyword arguments of `build_pipeline`. The working
+    directory is switched to `model_dir` while the stages run. With `profile`
+    (a path relative to `model_dir`) the cost of every built stage is written
+    there, see profiling.py.
+    """
+    from profiling import Profiler, print_profile
+
+    model_dir = Path(model_dir).resolve()
+    config = load_config(model_dir)
+    profiler = Profiler(profile_dump) if profile and not dry_run else None
+    previous = os.getcwd()
+    os.chdir(model_dir)
+    try:
+        pipeline = build_pipeline(config, profiler=profiler, force=force, **options)
+        pipeline.run(force=force, dry_run=dry_run)
+        if summary and not dry_run:
+            print_summary()
+        if profiler:
+            report = profiler.to_dict(model=model_dir.name, gitCommit=_git_commit(),
+                                      force=force, options=options)
+            write_json(profile, report)
+            print_profile(report)
+            print(f"\n Saved: {profile}")
+    finally:
+        os.chdir(previous)
+    return {'model': model_dir.name, 'stages': pipeline.timings}
+
+
+def _git_commit() -> str | None:
+    import subprocess
+
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--model', default=str(MODEL_DIR), help="model directory holding pipeline.json")
+    parser.add_argument('--force', action='store_true', help="rebuild every stage even if its inputs are unchanged")
+    parser.add_argument('--dry-run', action='store_true', help="only report which stages are stale")
+    parser.add_argument('--chunk-size', type=int, default=100_000,
+                        help="rows per chunk when encoding dataset.csv (0 loads the whole file)")
+    parser.add_argument('--frozen-vocab', action='store_true',
+                        help="encode with the existing label_encoders.json instead of refitting it")
+    parser.add_argument('--on-unseen', choices=['error', 'drop', 'other'], default='error',
+                        help="categories missing from a frozen vocabulary: abort, drop the row, "
+                             "or map to a reserved code (len(classes))")
+    parser.add_argument('--circuit-gate', choices=['warn', 'enforce'], default='warn',
+                        help="when the emulated training circuit would fail on dataset_encoded_small.csv: "
+                             "report it, or stop the build")
+    parser.add_argument('--commit', action='store_true',
+                        help="also build the dataset commitment into .build/commitment/ (see commitment.py)")
+    parser.add_argument('--commit-workers', type=int, default=None, help="hashing processes (default: all cores)")
+    parser.add_argument('--integer-onnx', action='store_true',
+                        help="also export model_int.onnx, the circuit's integer arithmetic (see integer_onnx.py)")
+    parser.add_argument('--coreset', type=float, default=None, metavar='EPSILON',
+                        help=f"also select the smallest calibration subset whose per-group rates stay within "
+                             f"EPSILON of the full set into {CORESET_CSV} (see coreset.py)")
+    parser.add_argument('--profile', nargs='?', const=str(BUILD_DIR / 'profile.json'), default=None,
+                        help="write wall/CPU time, peak RSS and rows of every built stage and its phases "
+                             "(default .build/profile.json; combine with --force for a full profile)")
+    parser.add_argument('--profile-dump', choices=['cprofile', 'tracemalloc'], default=None,
+                        help="also dump a cProfile or tracemalloc report per stage into .build/profile/ "
+                             "(implies --profile)")
+    args = parser.parse_args()
+
+    build_model(
+        args.model,
+        force=args.force,
+        dry_run=args.dry_run,
+        chunk_size=args.chunk_size or None,
+        frozen_vocab=args.frozen_vocab,
+        on_unseen=args.on_unseen,
+        circuit_gate=args.circuit_gate,
+        commit=args.commit,
+        commit_workers=args.commit_workers,
+        integer_onnx=args.integer_onnx,
+        coreset=args.coreset,
+        # A dump is only taken by the profiler, so --profile-dump turns it on
+        profile=args.profile or (args.profile_dump and str(BUILD_DIR / 'profile.json')),
+        profile_dump=args.profile_dump,
+    )
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,200 @@
+"""Full-dataset ONNX equivalence and throughput checks.
+
+`check_equivalence` streams every row of a dataset through an onnxruntime
+session in batches and compares the labels with sklearn. It also records the
+largest probability difference. `benchmark` measures rows/sec and the
+p50/p99 latency of a single `session.run` for several batch sizes. Thread
+counts and the graph optimization level are configurable, so the numbers can
+be tuned to match the provider server, which loads the same model.onnx
+through `loadAllModels`.
+
+    uv run onnx_check.py --batch-sizes 1 64 1024 --intra-op-threads 1 --graph-optimization extended
+"""
+import argparse
+import json
+import time
+
+import numpy as np
+
+GRAPH_OPTIMIZATION_LEVELS = ('disable', 'basic', 'extended', 'all')
+
+
+def make_session(path, intra_op_threads=0, inter_op_threads=0, graph_optimization='all'):
+    """InferenceSession with explicit threading and optimization settings (0 = onnxruntime default)."""
+    import onnxruntime as ort
+
+    levels = {
+        'disable': ort.GraphOptimizationLevel.ORT_DISABLE_ALL,
+        'basic': ort.GraphOptimizationLevel.ORT_ENABLE_BASIC,
+        'extended': ort.GraphOptimizationLevel.ORT_ENABLE_EXTENDED,
+        'all': ort.GraphOptimizationLevel.ORT_ENABLE_ALL,
+    }
+    if graph_optimization not in levels:
+        raise ValueError(f"graph_optimization must be one of {GRAPH_OPTIMIZATION_LEVELS}, got {graph_optimization!r}")
+    options = ort.SessionOptions()
+    options.intra_op_num_threads = intra_op_threads
+    options.inter_op_num_threads = inter_op_threads
+    options.graph_optimization_level = levels[graph_optimization]
+    return ort.InferenceSession(str(path), sess_options=options, providers=['CPUExecutionProvider'])
+
+
+def _outputs(session):
+    # skl2onnx classifiers (zipmap disabled) emit [label, probabilities]
+    names = [o.name for o in session.get_outputs()]
+    return session.get_inputs()[0].name, names
+
+
+def iter_batches(X, batch_size):
+    for start in range(0, len(X), batch_size):
+        yield start, X[start:start + batch_size]
+
+
+def check_equivalence(session, model, X, batch_size=1024, max_reported=20) -> dict:
+    """Compare ONNX and sklearn predictions on every row of X.
+
+    The rows are cast to float32 first, which is what the provider server sends.
+    Returns mismatch counts, the first `max_reported` mismatching rows, and the
+    largest absolute probability difference.
+    """
+    X = np.ascontiguousarray(X, dtype=np.float32)
+    input_name, output_names = _outputs(session)
+    X_sk = X
+    if hasattr(model, 'feature_names_in_'):
+        import pandas as pd
+
+        # Same float32 values, labelled like the training frame
+        X_sk = pd.DataFrame(X, columns=model.feature_names_in_)
+    sk_labels = np.asarray(model.predict(X_sk))
+    sk_proba = model.predict_proba(X_sk) if hasattr(model, 'predict_proba') else None
+
+    mismatched, onnx_labels = [], []
+    max_proba_diff = 0.0
+    for start, batch in iter_batches(X, batch_size):
+        outputs = session.run(output_names, {input_name: batch})
+        labels = np.asarray(outputs[0]).reshape(-1)
+        stop = start + len(batch)
+        differs = np.flatnonzero(labels != sk_labels[start:stop])
+        mismatched.append(start + differs)
+        onnx_labels.append(labels[differs])
+        if sk_proba is not None and len(outputs) > 1:
+            diff = np.abs(np.asarray(outputs[1], dtype=np.float64) - sk_proba[start:stop])
+            max_proba_diff = max(max_proba_diff, float(diff.max(initial=0.0)))
+
+    mismatched = np.concatenate(mismatched)
+    onnx_labels = np.concatenate(onnx_labels)
+    return {
+        'rows': len(X),
+        'mismatches': int(len(mismatched)),
+        'mismatchedRows': [{'row': int(i), 'onnx': label.item(), 'sklearn': sk_labels[i].item()}
+                           for i, label in zip(mismatched[:max_reported], onnx_labels[:max_reported])],
+        'maxProbabilityDiff': max_proba_diff,
+    }
+
+
+def benchmark(session, X, batch_sizes, min_seconds=0.5, warmup=3) -> list[dict]:
+    """Rows/sec and per-batch latency percentiles for each batch size.
+
+    Each batch size is run over consecutive slices of X, cycling back to the
+    start, until at least `min_seconds` have been spent on it.
+    """
+    # float32 unless the graph takes integers (integer_onnx.py's int64 input)
+    dtype = np.int64 if session.get_inputs()[0].type == 'tensor(int64)' else np.float32
+    X = np.ascontiguousarray(X, dtype=dtype)
+    input_name, output_names = _outputs(session)
+    results = []
+    for batch_size in batch_sizes:
+        batches = [b for _, b in iter_batches(X, batch_size) if len(b) == batch_size] or [X[:batch_size]]
+        for batch in batches[:warmup]:
+            session.run(output_names, {input_name: batch})
+
+        latencies = []
+        rows = 0
+        spent = 0.0
+        i = 0
+        while spent < min_seconds or len(latencies) < 10:
+            batch = batches[i % len(batches)]
+            start = time.perf_counter()
+            session.run(output_names, {input_name: batch})
+            elapsed = time.perf_counter() - start
+            latencies.append(elapsed)
+            rows += len(batch)
+            spent += elapsed
+            i += 1
+
+        ms = np.array(latencies) * 1000
+        results.append({
+            'batchSize': int(len(batches[0])),
+            'batches': len(latencies),
+            'rowsPerSec': rows / spent,
+            'p50Ms': float(np.percentile(ms, 50)),
+            'p99Ms': float(np.percentile(ms, 99)),
+        })
+    return results
+
+
+def print_report(report):
+    eq = report['equivalence']
+    status = "OK" if eq['mismatches'] == 0 else "MISMATCH"
+    print(f"    Equivalence: {status} ({eq['mismatches']} of {eq['rows']} rows differ, "
+          f"max |p_onnx - p_sklearn| = {eq['maxProbabilityDiff']:.2e})")
+    for m in eq['mismatchedRows']:
+        print(f"      row {m['row']}: onnx={m['onnx']} sklearn={m['sklearn']}")
+    if 'throughput' not in report:
+        return
+    s = report['session']
+    print(f"    Throughput (intra={s['intraOpThreads']}, inter={s['interOpThreads']}, opt={s['graphOptimization']}):")
+    print(f"      {'batch':>7}{'rows/sec':>14}{'p50 ms':>10}{'p99 ms':>10}")
+    for r in report['throughput']:
+        print(f"      {r['batchSize']:>7}{r['rowsPerSec']:>14,.0f}{r['p50Ms']:>10.3f}{r['p99Ms']:>10.3f}")
+
+
+def run(model_path, model, X, batch_sizes=None, equivalence_batch_size=1024, intra_op_threads=0,
+        inter_op_threads=0, graph_optimization='all', min_seconds=0.5) -> dict:
+    """Equivalence on every row of X, plus the throughput benchmark if `batch_sizes` are given."""
+    session = make_session(model_path, intra_op_threads, inter_op_threads, graph_optimization)
+    report = {
+        'session': {'intraOpThreads': intra_op_threads, 'interOpThreads': inter_op_threads,
+                    'graphOptimization': graph_optimization},
+        'equivalence': check_equivalence(session, model, X, equivalence_batch_size),
+    }
+    if batch_sizes:
+        report['throughput'] = benchmark(session, X, batch_sizes, min_seconds)
+    return report
+
+
+def main():
+    import pickle
+
+    import pandas as pd
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--model', default='model.onnx')
+    parser.add_argument('--sklearn-model', default='.build/model.pkl')
+    parser.add_argument('--data', default='calibration_dataset.csv')
+    parser.add_argument('--target', default='income')
+    parser.add_argument('--batch-sizes', type=int, nargs='+', default=[1, 64, 1024, 8192])
+    parser.add_argument('--intra-op-threads', type=int, default=0)
+    parser.add_argument('--inter-op-threads', type=int, default=0)
+    parser.add_argument('--graph-optimization', choices=GRAPH_OPTIMIZATION_LEVELS, default='all')
+    parser.add_argument('--min-seconds', type=float, default=0.5, help="time spent per batch size")
+    parser.add_argument('--json', help="write the report to this file")
+    args = parser.parse_args()
+
+    with open(args.sklearn_model, 'rb') as f:
+        model = pickle.load(f)
+    data = pd.read_csv(args.data)
+    X = data.drop(columns=[args.target], errors='ignore').to_numpy()
+
+    report = run(args.model, model, X, args.batch_sizes, intra_op_threads=args.intra_op_threads,
+                 inter_op_threads=args.inter_op_threads, graph_optimization=args.graph_optimization,
+                 min_seconds=args.min_seconds)
+    print_report(report)
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(report, f, indent=2)
+    if report['equivalence']['mismatches']:
+        raise SystemExit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,281 @@
+"""Offline-optimized ORT-format copy of model.onnx, for fast provider startup.
+
+`ort.InferenceSession.create` on model.onnx runs graph optimization on every
+cold start of the provider server, for every model in registry.json. This
+runs it once at build time and saves the result in onnxruntime's ORT format
+(model.ort), which a session loads with optimization disabled.
+
+model.ort.json ties the two together. It records:
+- the SHA-256 of the model.onnx it was made from (also embedded in model.ort
+  as the `zkfair.sourceSha256` metadata property);
+- the SHA-256 of model.ort itself;
+- the optimization level and the onnxruntime version that wrote it.
+
+apps/server/lib/models.ts loads model.ort only when both hashes match. The
+default level is 'extended'. 'all' adds layout transformations that are
+specific to the CPU it ran on, so the result may not be portable to the
+deployment machine.
+
+The startup benchmark measures what a cold provider pays per registered
+model, for the plain and optimized variants: reading the file, creating the
+session, the first inference and a warm one. Each trial is a fresh Python
+process that loads every model in registry.json, like `loadAllModels`.
+onnxruntime-node shares the same native runtime, so the comparison carries
+over.
+
+    uv run ort_export.py                                                     # model.onnx -> model.ort (+ .json)
+    uv run ort_export.py --benchmark --registry ../../apps/server/registry.json --trials 20
+"""
+import argparse
+import hashlib
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+from build import BUILD_DIR, hash_file, write_bytes, write_json
+from profiling import phase
+
+ORT_MODEL = 'model.ort'
+ORT_METADATA = ORT_MODEL + '.json'
+SOURCE_HASH_KEY = 'zkfair.sourceSha256'
+OPTIMIZATION_LEVELS = ('basic', 'extended', 'all')
+BENCH_REPORT = BUILD_DIR / 'bench' / 'startup.json'
+
+
+def ort_path_of(onnx_path) -> Path:
+    return Path(onnx_path).with_suffix('.ort')
+
+
+def metadata_path_of(onnx_path) -> Path:
+    return Path(str(ort_path_of(onnx_path)) + '.json')
+
+
+def _level(name):
+    import onnxruntime as ort
+
+    return {'disable': ort.GraphOptimizationLevel.ORT_DISABLE_ALL,
+            'basic': ort.GraphOptimizationLevel.ORT_ENABLE_BASIC,
+            'extended': ort.GraphOptimizationLevel.ORT_ENABLE_EXTENDED,
+            'all': ort.GraphOptimizationLevel.ORT_ENABLE_ALL}[name]
+
+
+def _reusable(onnx_path: Path, source_hash: str, level: str, version: str) -> dict | None:
+    """The existing model.ort.json if model.ort still matches it and would be rebuilt the same way."""
+    out, sidecar = ort_path_of(onnx_path), metadata_path_of(onnx_path)
+    if not (out.is_file() and sidecar.is_file()):
+        return None
+    with open(sidecar) as f:
+        previous = json.load(f)
+    wanted = {'sourceSha256': source_hash, 'optimizationLevel': level, 'onnxruntimeVersion': version}
+    if any(previous.get(k) != v for k, v in wanted.items()) or hash_file(out) != previous.get('ortSha256'):
+        return None
+    if 'optimizeMs' in previous:
+        # Written by an older export that timed itself into the sidecar; rewrite it without
+        return None
+    return previous
+
+
+def export_ort(onnx_path='model.onnx', level: str = 'extended', force: bool = False) -> dict:
+    """Write <model>.ort and <model>.ort.json next to `onnx_path`; returns the metadata.
+
+    Unless `force`, a model.ort that still matches model.onnx and its sidecar is kept as is.
+    """
+    import onnx
+    import onnxruntime as ort
+
+    if level not in OPTIMIZATION_LEVELS:
+        raise ValueError(f"level must be one of {OPTIMIZATION_LEVELS}, got {level!r}")
+    onnx_path = Path(onnx_path)
+    out = ort_path_of(onnx_path)
+    source_hash = hash_file(onnx_path)
+    # The ORT writer is not byte-deterministic, so an unchanged model.ort is kept rather than rewritten
+    previous = None if force else _reusable(onnx_path, source_hash, level, ort.__version__)
+    if previous is not None:
+        return previous
+
+    model = onnx.load(onnx_path)
+    props = {p.key: p for p in model.metadata_props}
+    if SOURCE_HASH_KEY in props:
+        props[SOURCE_HASH_KEY].value = source_hash
+    else:
+        model.metadata_props.add(key=SOURCE_HASH_KEY, value=source_hash)
+
+    tmp = out.with_name(out.name + '.tmp')
+    options = ort.SessionOptions()
+    options.graph_optimization_level = _level(level)
+    options.optimized_model_filepath = str(tmp)
+    options.add_session_config_entry('session.save_model_format', 'ORT')
+    # Timed by the profiler only: model.ort.json must not change between identical builds
+    with phase('optimize'):
+        ort.InferenceSession(model.SerializeToString(), options, providers=['CPUExecutionProvider'])
+    data = tmp.read_bytes()
+    os.remove(tmp)
+    write_bytes(out, data)
+
+    metadata = {
+        'format': 'ort',
+        'source': onnx_path.name,
+        'sourceSha256': source_hash,
+        'ortSha256': hashlib.sha256(data).hexdigest(),
+        'optimizationLevel': level,
+        # Optimization already ran; load with it disabled
+        'loadOptimizationLevel': 'disabled',
+        'onnxruntimeVersion': ort.__version__,
+        'sourceNodes': len(model.graph.node),
+        'sourceBytes': onnx_path.stat().st_size,
+        'ortBytes': len(data),
+    }
+    write_json(metadata_path_of(onnx_path), metadata)
+    return metadata
+
+
+def verify_ort(onnx_path, X) -> dict:
+    """Labels and probabilities of model.ort against model.onnx on `X`."""
+    import onnxruntime as ort
+
+    onnx_path = Path(onnx_path)
+    plain = ort.InferenceSession(str(onnx_path), providers=['CPUExecutionProvider'])
+    options = ort.SessionOptions()
+    options.graph_optimization_level = _level('disable')
+    optimized = ort.InferenceSession(str(ort_path_of(onnx_path)), options, providers=['CPUExecutionProvider'])
+    name = plain.get_inputs()[0].name
+    X = np.asarray(X, dtype=np.float32)
+    (labels_a, probs_a), (labels_b, probs_b) = plain.run(None, {name: X}), optimized.run(None, {name: X})
+    return {
+        'rows': len(X),
+        'labelMismatches': int((labels_a != labels_b).sum()),
+        'maxProbabilityDiff': float(np.abs(probs_a - probs_b).max()) if len(X) else 0.0,
+        'sourceSha256Embedded': optimized.get_modelmeta().custom_metadata_map.get(SOURCE_HASH_KEY),
+    }
+
+
+def load_registry(path) -> list[dict]:
+    """registry.json models with their model.onnx resolved against the registry's directory."""
+    path = Path(path)
+    with open(path) as f:
+        registry = json.load(f)
+    return [{**m, 'onnx': str((path.parent / m['path']).resolve())} for m in registry['models']]
+
+
+def _trial(spec: dict) -> dict:
+    """One cold start in this (fresh) process: every model of `spec`, in order."""
+    start = time.perf_counter()
+    import onnxruntime as ort
+    import_ms = (time.perf_counter() - start) * 1e3
+
+    results = []
+    for model in spec['models']:
+        t0 = time.perf_counter()
+        with open(model['path'], 'rb') as f:
+            data = f.read()
+        t1 = time.perf_counter()
+        options = ort.SessionOptions()
+        options.graph_optimization_level = _level(model['level'])
+        session = ort.InferenceSession(data, options, providers=['CPUExecutionProvider'])
+        t2 = time.perf_counter()
+        x = np.zeros((1, session.get_inputs()[0].shape[1]), dtype=np.float32)
+        name = session.get_inputs()[0].name
+        session.run(None, {name: x})
+        t3 = time.perf_counter()
+        session.run(None, {name: x})
+        t4 = time.perf_counter()
+        results.append({'readMs': (t1 - t0) * 1e3, 'createMs': (t2 - t1) * 1e3,
+                        'firstInferenceMs': (t3 - t2) * 1e3, 'warmInferenceMs': (t4 - t3) * 1e3})
+    return {'importMs': import_ms, 'models': results}
+
+
+def benchmark_startup(models: list[dict], trials: int = 10) -> dict:
+    """Median cold-start costs per model and variant over `trials` fresh processes per variant."""
+    variants = {
+        # Like models.ts today: the .onnx bytes with onnxruntime's default (all) optimization
+        'onnx': [{'path': m['onnx'], 'level': 'all'} for m in models],
+        'ort': [{'path': str(ort_path_of(m['onnx'])), 'level': 'disable'} for m in models],
+    }
+    missing = [m['name'] for m in models if not ort_path_of(m['onnx']).is_file()]
+    if missing:
+        raise FileNotFoundError(f"no model.ort for {', '.join(missing)}; run main.py (or ort_export.py) there first")
+
+    runs = {name: [] for name in variants}
+    for _ in range(trials):
+        # Interleaved, so drift in machine load hits both variants alike
+        for name, spec in variants.items():
+            out = subprocess.run([sys.executable, __file__, '--trial', json.dumps({'models': spec})],
+                                 capture_output=True, text=True, check=True, cwd=Path(__file__).parent)
+            runs[name].append(json.loads(out.stdout))
+
+    report = {'trials': trials, 'variants': {}}
+    for name, samples in runs.items():
+        per_model = []
+        for i, m in enumerate(models):
+            stats = {key: statistics.median(s['models'][i][key] for s in samples)
+                     for key in ('readMs', 'createMs', 'firstInferenceMs', 'warmInferenceMs')}
+            stats['readyMs'] = stats['readMs'] + stats['createMs'] + stats['firstInferenceMs']
+            per_model.append({'id': m['id'], 'name': m['name'], 'path': variants[name][i]['path'],
+                              'bytes': os.path.getsize(variants[name][i]['path']), **stats})
+        report['variants'][name] = {
+            'importMs': statistics.median(s['importMs'] for s in samples),
+            'bootMs': statistics.median(sum(r['readMs'] + r['createMs'] + r['firstInferenceMs'] for r in s['models'])
+                                        for s in samples),
+            'models': per_model,
+        }
+    return report
+
+
+def print_benchmark(report: dict):
+    print(f"\n Cold start, median of {report['trials']} fresh processes per variant:")
+    print(f" {'model':<22}{'variant':<9}{'bytes':>8}{'read ms':>9}{'create ms':>11}{'first ms':>10}{'warm ms':>9}"
+          f"{'ready ms':>10}")
+    names = list(report['variants'])
+    for i, m in enumerate(report['variants'][names[0]]['models']):
+        for name in names:
+            r = report['variants'][name]['models'][i]
+            print(f" {m['name']:<22}{name:<9}{r['bytes']:>8,}{r['readMs']:>9.3f}{r['createMs']:>11.3f}"
+                  f"{r['firstInferenceMs']:>10.3f}{r['warmInferenceMs']:>9.3f}{r['readyMs']:>10.3f}")
+    for name in names:
+        v = report['variants'][name]
+        print(f"    {name}: all models ready in {v['bootMs']:.2f} ms (+ {v['importMs']:.0f} ms onnxruntime import)")
+
+
+def main():
+    import pandas as pd
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--model', default='model.onnx')
+    parser.add_argument('--level', choices=OPTIMIZATION_LEVELS, default='extended',
+                        help="graph optimization applied offline")
+    parser.add_argument('--data', default='calibration_dataset.csv', help="encoded rows to verify model.ort on")
+    parser.add_argument('--force', action='store_true', help="re-export even if model.ort is up to date")
+    parser.add_argument('--benchmark', action='store_true', help="only run the startup benchmark")
+    parser.add_argument('--registry', default='../../apps/server/registry.json')
+    parser.add_argument('--trials', type=int, default=10)
+    parser.add_argument('--json', default=str(BENCH_REPORT), help="benchmark report (default: %(default)s)")
+    parser.add_argument('--trial', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.trial:
+        print(json.dumps(_trial(json.loads(args.trial))))
+        return
+    if args.benchmark:
+        report = benchmark_startup(load_registry(args.registry), args.trials)
+        print_benchmark(report)
+        write_json(args.json, report)
+        print(f" Saved: {args.json}")
+        return
+
+    metadata = export_ort(args.model, args.level, args.force)
+    print(f" Saved: {ort_path_of(args.model)} ({metadata['ortBytes']:,} bytes, {metadata['optimizationLevel']}) "
+          f"and {metadata_path_of(args.model)}")
+    X = pd.read_csv(args.data).iloc[:, :-1].to_numpy()
+    report = verify_ort(args.model, X)
+    print(f"    {report['labelMismatches']} of {report['rows']} labels differ from {args.model}, "
+          f"max probability difference {report['maxProbabilityDiff']:.2e}")
+
+
+if __name__ == '__main__':
+    main()
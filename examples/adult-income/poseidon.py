@@ -0,0 +1,229 @@
+"""Batched Poseidon over BN254, compatible with circomlib / poseidon-lite / Noir.
+
+Parameters follow the reference instance used by circomlib (x^5 S-box, 8 full
+rounds, per-width partial rounds) with round constants and the Cauchy MDS
+matrix drawn from the Grain LFSR exactly like the reference
+`generate_parameters_grain.sage` script. The hash matches
+`poseidon::bn254::hash_N` in the circuits and `poseidonN` in the TS SDK.
+
+`hash_many` evaluates the permutation for a whole batch of inputs at once:
+the state is a (t, batch) object array, so every round is a handful of numpy
+calls over Python ints instead of per-element interpreter work. Partial rounds
+use the usual sparse-matrix factorisation of the MDS layer (2t - 1 instead of
+t^2 multiplications), which is what keeps the 16-input leaf hash tractable.
+"""
+from dataclasses import dataclass
+
+import numpy as np
+
+FIELD_MODULUS = 21888242871839275222246405745257275088548364400416034343698204186575808495617
+
+N_ROUNDS_F = 8
+# Partial rounds for t = 2..17 (1..16 inputs), as in circomlib's poseidon.circom
+N_ROUNDS_P = [56, 57, 56, 60, 60, 63, 64, 63, 60, 66, 60, 65, 70, 60, 64, 68]
+
+_PRIME_BITS = 254
+
+
+_MASK_80 = (1 << 80) - 1
+# Self-shrinking lookup for 6 raw bits (3 pairs): (kept bits, number kept)
+_SHRINK = []
+for _raw in range(64):
+    _value, _count = 0, 0
+    for _shift in (4, 2, 0):
+        if (_raw >> (_shift + 1)) & 1:
+            _value = (_value << 1) | ((_raw >> _shift) & 1)
+            _count += 1
+    _SHRINK.append((_value, _count))
+
+
+class _GrainLFSR:
+    """Grain LFSR in self-shrinking mode, as specified for Poseidon parameter generation."""
+
+    def __init__(self, t: int, n_rounds_p: int):
+        # field = 1 (prime field), sbox = 0 (x^alpha), then n, t, R_F, R_P, and 30 ones
+        init = f'01{0:04b}{_PRIME_BITS:012b}{t:012b}{N_ROUNDS_F:010b}{n_rounds_p:010b}' + '1' * 30
+        self.state = int(init, 2)  # b0 is the most significant of the 80 bits
+        self.pending = 0
+        self.pending_bits = 0
+        for _ in range(160):
+            self._raw_bits(1)
+
+    def _raw_bits(self, n: int) -> int:
+        # b_{i+80} = b_{i+62} ^ b_{i+51} ^ b_{i+38} ^ b_{i+23} ^ b_{i+13} ^ b_i; the smallest
+        # lag is 18, so up to 18 new bits can be produced from the current state at once
+        s = self.state
+        new = ((s >> (18 - n)) ^ (s >> (29 - n)) ^ (s >> (42 - n)) ^ (s >> (57 - n))
+               ^ (s >> (67 - n)) ^ (s >> (80 - n))) & ((1 << n) - 1)
+        self.state = ((s << n) | new) & _MASK_80
+        return new
+
+    def random_bits(self, n: int) -> int:
+        # Bits are drawn in pairs and the second kept only if the first is 1
+        while self.pending_bits < n:
+            raw = self._raw_bits(18)
+            for shift in (12, 6, 0):
+                value, count = _SHRINK[(raw >> shift) & 63]
+                self.pending = (self.pending << count) | value
+                self.pending_bits += count
+        extra = self.pending_bits - n
+        out = self.pending >> extra
+        self.pending &= (1 << extra) - 1
+        self.pending_bits = extra
+        return out
+
+
+def _grain_constants(t: int) -> tuple[list[int], list[list[int]]]:
+    """Round constants and MDS matrix for width `t` from the Grain LFSR."""
+    n_rounds_p = N_ROUNDS_P[t - 2]
+    grain = _GrainLFSR(t, n_rounds_p)
+
+    constants = []
+    while len(constants) < t * (N_ROUNDS_F + n_rounds_p):
+        value = grain.random_bits(_PRIME_BITS)
+        if value < FIELD_MODULUS:
+            constants.append(value)
+
+    xs = [grain.random_bits(_PRIME_BITS) % FIELD_MODULUS for _ in range(2 * t)]
+    mds = [[pow(xs[i] + xs[t + j], -1, FIELD_MODULUS) for j in range(t)] for i in range(t)]
+    return constants, mds
+
+
+def _mat_inv(a: list[list[int]]) -> list[list[int]]:
+    n = len(a)
+    p = FIELD_MODULUS
+    rows = [row[:] + [int(i == j) for j in range(n)] for i, row in enumerate(a)]
+    for col in range(n):
+        pivot = next(r for r in range(col, n) if rows[r][col] % p)
+        rows[col], rows[pivot] = rows[pivot], rows[col]
+        inv = pow(rows[col][col], -1, p)
+        rows[col] = [x * inv % p for x in rows[col]]
+        for r in range(n):
+            if r != col and rows[r][col]:
+                f = rows[r][col]
+                rows[r] = [(x - f * y) % p for x, y in zip(rows[r], rows[col])]
+    return [row[n:] for row in rows]
+
+
+def _mat_mul(a: list[list[int]], b: list[list[int]]) -> list[list[int]]:
+    return [[sum(a[i][k] * b[k][j] for k in range(len(b))) % FIELD_MODULUS for j in range(len(b[0]))]
+            for i in range(len(a))]
+
+
+def _mat_vec(a: list[list[int]], v: list[int]) -> list[int]:
+    return [sum(x * y for x, y in zip(row, v)) % FIELD_MODULUS for row in a]
+
+
+@dataclass(frozen=True)
+class PoseidonParams:
+    t: int
+    n_rounds_p: int
+    full_constants: list[list[int]]  # per full round, length t
+    partial_constants: list[int]  # per partial round, added to state[0] only
+    mds: list[list[int]]
+    pre_sparse: list[list[int]]  # replaces the MDS of the last first-half full round
+    sparse: list[tuple[int, list[int], list[int]]]  # (m00, row0[1:], col0[1:]) per partial round
+
+
+_PARAMS: dict[int, PoseidonParams] = {}
+
+
+def install_params(*prms: PoseidonParams):
+    """Seed the parameter cache, e.g. in pool workers, to skip the Grain derivation."""
+    for prm in prms:
+        _PARAMS[prm.t] = prm
+
+
+def params(t: int) -> PoseidonParams:
+    """Derive (and cache) the optimised parameters for state width `t` = inputs + 1."""
+    if t not in _PARAMS:
+        _PARAMS[t] = _derive_params(t)
+    return _PARAMS[t]
+
+
+def _derive_params(t: int) -> PoseidonParams:
+    if not 2 <= t <= len(N_ROUNDS_P) + 1:
+        raise ValueError(f"Poseidon supports 1-{len(N_ROUNDS_P)} inputs, got {t - 1}")
+    constants, mds = _grain_constants(t)
+    n_rounds_p = N_ROUNDS_P[t - 2]
+    half = N_ROUNDS_F // 2
+    rounds = [constants[r * t:(r + 1) * t] for r in range(N_ROUNDS_F + n_rounds_p)]
+
+    # Partial rounds only feed state[0] through the S-box, so constants on the
+    # other lanes can be pushed through the (linear) MDS layer and folded into
+    # the next full round, leaving one scalar constant per partial round.
+    offset = [0] * t
+    partial_constants = []
+    for r in range(half, half + n_rounds_p):
+        folded = [(a + b) % FIELD_MODULUS for a, b in zip(offset, rounds[r])]
+        partial_constants.append(folded[0])
+        offset = _mat_vec(mds, [0, *folded[1:]])
+    full_constants = rounds[:half] + rounds[half + n_rounds_p:]
+    full_constants[half] = [(a + b) % FIELD_MODULUS for a, b in zip(offset, full_constants[half])]
+
+    # Factor each partial round's matrix M = S * diag(1, M_hat) with S sparse.
+    # diag(1, M_hat) commutes with the partial S-box, so it moves into the
+    # previous round's matrix; the product accumulated at the front replaces
+    # the MDS of the last first-half full round.
+    current = mds
+    sparse = [None] * n_rounds_p
+    for r in range(n_rounds_p - 1, -1, -1):
+        m_hat = [row[1:] for row in current[1:]]
+        m_hat_inv = _mat_inv(m_hat)
+        row0 = [sum(current[0][1 + i] * m_hat_inv[i][j] for i in range(t - 1)) % FIELD_MODULUS
+                for j in range(t - 1)]
+        sparse[r] = (current[0][0], row0, [row[0] for row in current[1:]])
+        diag = [[1] + [0] * (t - 1)] + [[0, *row] for row in m_hat]
+        current = _mat_mul(diag, mds)
+
+    return PoseidonParams(t, n_rounds_p, full_constants, partial_constants, mds, current, sparse)
+
+
+def _sbox(x):
+    x2 = x * x % FIELD_MODULUS
+    x4 = x2 * x2 % FIELD_MODULUS
+    return x4 * x % FIELD_MODULUS
+
+
+def hash_many(columns) -> np.ndarray:
+    """Hash a batch of inputs given column-wise.
+
+    `columns[i][k]` is the i-th input of the k-th message, so hashing B rows of
+    n fields takes n sequences of length B. Returns an object array of B ints.
+    """
+    n_inputs = len(columns)
+    prm = params(n_inputs + 1)
+    batch = len(columns[0])
+    p = FIELD_MODULUS
+    half = N_ROUNDS_F // 2
+
+    state = np.empty((prm.t, batch), dtype=object)
+    state[0] = 0
+    for i, col in enumerate(columns):
+        state[i + 1] = np.asarray(col, dtype=object) % p
+
+    mds = np.array(prm.mds, dtype=object)
+    pre_sparse = np.array(prm.pre_sparse, dtype=object)
+    full = [np.array(c, dtype=object)[:, None] for c in prm.full_constants]
+
+    for r in range(half):
+        state = _sbox(state + full[r])
+        state = (pre_sparse if r == half - 1 else mds).dot(state) % p
+
+    for r in range(prm.n_rounds_p):
+        m00, row0, col0 = prm.sparse[r]
+        s0 = _sbox(state[0] + prm.partial_constants[r])
+        new0 = (m00 * s0 + np.array(row0, dtype=object).dot(state[1:])) % p
+        state[1:] = (state[1:] + np.array(col0, dtype=object)[:, None] * s0) % p
+        state[0] = new0
+
+    for r in range(half, N_ROUNDS_F):
+        state = _sbox(state + full[r])
+        state = mds.dot(state) % p
+
+    return state[0]
+
+
+def poseidon(inputs: list[int]) -> int:
+    """Hash a single message of 1-16 field elements."""
+    return int(hash_many([[x] for x in inputs])[0])
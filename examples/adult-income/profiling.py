@@ -0,0 +1,411 @@
+"""Per-stage cost profile of the pipeline, and a regression diff between two profiles.
+
+`main.py --profile` wraps every stage it builds, and the phases inside those
+stages, in a measurement frame. The phases are CSV load, label encoding,
+split, fit, ONNX export and check, threshold search and artifact writes. Each
+frame records:
+
+- wall time (perf_counter);
+- CPU time of this process, and separately of the worker processes it waited
+  on (commitment hashing);
+- peak RSS. On Linux the kernel's high-water mark (VmHWM) is reset at every
+  frame boundary, so each stage and phase gets its own peak. Elsewhere the
+  value is the process's lifetime peak (ru_maxrss) and is marked as such;
+- rows processed, as reported by the phase.
+
+Phases of the same name within a stage are summed, e.g. every artifact write
+of a stage lands in one `write` phase. Phases may nest; a nested phase's cost
+is also counted in its parent. The profile is written as JSON
+(.build/profile.json by default).
+
+`--profile-dump cprofile` also writes a .build/profile/<stage>.prof per stage
+(open with `python -m pstats` or snakeviz). `--profile-dump tracemalloc`
+writes the top allocation sites of each stage to
+.build/profile/<stage>.tracemalloc.txt. Both slow the stages they wrap, so the
+timings of a dump run are not comparable with a plain one.
+
+    uv run main.py --force --profile                          # .build/profile.json
+    uv run main.py --force --profile .build/profile_new.json --profile-dump cprofile
+    uv run profiling.py show .build/profile.json
+    uv run profiling.py diff .build/profile_base.json .build/profile_new.json --tolerance 0.2
+
+`diff` exits with status 1 when a stage or phase got slower or fatter than
+the tolerance allows, so it can gate a retraining job.
+"""
+import argparse
+import contextlib
+import json
+import os
+import platform
+import resource
+import sys
+import time
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+
+PROFILE_VERSION = 1
+PROFILE_PATH = Path('.build') / 'profile.json'
+DUMP_DIR = Path('.build') / 'profile'
+DUMP_KINDS = ('cprofile', 'tracemalloc')
+
+_CLEAR_REFS = '/proc/self/clear_refs'
+_STATUS = '/proc/self/status'
+# ru_maxrss is in KiB on Linux, bytes on macOS
+_MAXRSS_UNIT = 1 if sys.platform == 'darwin' else 1024
+_MB = 1 << 20
+
+# Metrics compared by `diff`, with the absolute change below which a relative
+# change is noise: (profile key, label, default floor)
+METRICS = (
+    ('wallSeconds', 'slower', 0.05),
+    ('cpuSeconds', 'more CPU', 0.05),
+    ('peakRssMb', 'fatter', 8.0),
+)
+
+
+def _hwm_bytes() -> int | None:
+    """VmHWM of this process in bytes, or None where /proc is not available."""
+    try:
+        with open(_STATUS) as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    return None
+
+
+def _reset_hwm() -> bool:
+    """Reset the kernel's peak-RSS counter to the current RSS (Linux >= 4.0)."""
+    try:
+        with open(_CLEAR_REFS, 'w') as f:
+            f.write('5')
+        return True
+    except OSError:
+        return False
+
+
+def _cpu_seconds(who) -> float:
+    usage = resource.getrusage(who)
+    return usage.ru_utime + usage.ru_stime
+
+
+@dataclass
+class PhaseRecord:
+    name: str
+    calls: int = 0
+    wallSeconds: float = 0.0
+    cpuSeconds: float = 0.0
+    childCpuSeconds: float = 0.0
+    peakRssMb: float = 0.0
+    rows: int | None = None
+
+
+@dataclass
+class StageRecord(PhaseRecord):
+    phases: list[PhaseRecord] = field(default_factory=list)
+    # Peak of Python allocations while the stage ran (tracemalloc dumps only)
+    tracedPeakMb: float | None = None
+
+
+class _Frame:
+    """One open measurement: a stage or a phase. Callers set `rows` on it."""
+
+    def __init__(self, record: PhaseRecord):
+        self.record = record
+        self.rows = None
+        self.peak = 0
+        self._wall = time.perf_counter()
+        self._cpu = _cpu_seconds(resource.RUSAGE_SELF)
+        self._child_cpu = _cpu_seconds(resource.RUSAGE_CHILDREN)
+
+    def close(self):
+        r = self.record
+        r.calls += 1
+        r.wallSeconds += time.perf_counter() - self._wall
+        r.cpuSeconds += _cpu_seconds(resource.RUSAGE_SELF) - self._cpu
+        r.childCpuSeconds += _cpu_seconds(resource.RUSAGE_CHILDREN) - self._child_cpu
+        r.peakRssMb = max(r.peakRssMb, self.peak / _MB)
+        if self.rows is not None:
+            r.rows = (r.rows or 0) + int(self.rows)
+
+
+class _NullFrame:
+    rows = None
+
+
+# The profiler `phase` reports to; None when profiling is off
+_active = None
+
+
+@contextlib.contextmanager
+def phase(name: str, rows: int | None = None):
+    """Measure a phase of the running stage. A no-op unless a profiler is active.
+
+    `rows` can be given up front or set on the yielded frame once known:
+
+        with phase('load_csv') as p:
+            X = pd.read_csv(path)
+            p.rows = len(X)
+    """
+    profiler = _active
+    if profiler is None or profiler.stage_record is None:
+        yield _NullFrame()
+        return
+    frame = profiler._open(profiler._phase_record(name))
+    frame.rows = rows
+    try:
+        yield frame
+    finally:
+        profiler._close(frame)
+
+
+class Profiler:
+    """Collects a StageRecord for every stage run through `stage`."""
+
+    def __init__(self, dump: str | None = None, dump_dir: str | Path = DUMP_DIR):
+        if dump not in (None, *DUMP_KINDS):
+            raise ValueError(f"dump must be one of {DUMP_KINDS}, got {dump!r}")
+        self.dump = dump
+        self.dump_dir = Path(dump_dir)
+        self.stages: list[StageRecord] = []
+        self.stage_record: StageRecord | None = None
+        self.resettable = _reset_hwm() and _hwm_bytes() is not None
+        self._frames: list[_Frame] = []
+
+    # Peak tracking: every frame boundary folds the high-water mark since the
+    # previous boundary into all open frames, then resets it
+    def _checkpoint(self):
+        if self.resettable:
+            peak = _hwm_bytes()
+            _reset_hwm()
+        else:
+            peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * _MAXRSS_UNIT
+        for frame in self._frames:
+            frame.peak = max(frame.peak, peak)
+
+    def _open(self, record: PhaseRecord) -> _Frame:
+        self._checkpoint()
+        frame = _Frame(record)
+        self._frames.append(frame)
+        return frame
+
+    def _close(self, frame: _Frame):
+        self._checkpoint()
+        self._frames.remove(frame)
+        frame.close()
+
+    def _phase_record(self, name: str) -> PhaseRecord:
+        for record in self.stage_record.phases:
+            if record.name == name:
+                return record
+        record = PhaseRecord(name)
+        self.stage_record.phases.append(record)
+        return record
+
+    @contextlib.contextmanager
+    def stage(self, name: str):
+        global _active
+        record = StageRecord(name)
+        self.stages.append(record)
+        self.stage_record = record
+        _active = self
+        dumper = self._start_dump(name)
+        frame = self._open(record)
+        try:
+            yield frame
+        finally:
+            self._close(frame)
+            self._stop_dump(name, record, dumper)
+            if record.rows is None:
+                record.rows = max((p.rows for p in record.phases if p.rows is not None), default=None)
+            self.stage_record = None
+            _active = None
+
+    def _start_dump(self, name):
+        if self.dump == 'cprofile':
+            import cProfile
+
+            profile = cProfile.Profile()
+            profile.enable()
+            return profile
+        if self.dump == 'tracemalloc':
+            import tracemalloc
+
+            tracemalloc.start(10)
+            return tracemalloc
+        return None
+
+    def _stop_dump(self, name, record, dumper):
+        if dumper is None:
+            return
+        self.dump_dir.mkdir(parents=True, exist_ok=True)
+        if self.dump == 'cprofile':
+            dumper.disable()
+            dumper.dump_stats(self.dump_dir / f'{name}.prof')
+            return
+        snapshot = dumper.take_snapshot()
+        record.tracedPeakMb = dumper.get_traced_memory()[1] / _MB
+        dumper.stop()
+        stats = snapshot.statistics('lineno')
+        with open(self.dump_dir / f'{name}.tracemalloc.txt', 'w') as f:
+            f.write(f"{name}: traced peak {record.tracedPeakMb:.1f} MB, top allocations still live at stage end\n")
+            for stat in stats[:25]:
+                f.write(f"{stat}\n")
+
+    def to_dict(self, **meta) -> dict:
+        return {
+            'version': PROFILE_VERSION,
+            'createdAt': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpus': os.cpu_count(),
+            'dump': self.dump,
+            # False: peaks are lifetime maxima, not per stage
+            'peakRssPerFrame': self.resettable,
+            **meta,
+            'stages': [_rounded(asdict(s)) for s in self.stages],
+        }
+
+
+def _rounded(record: dict) -> dict:
+    out = {}
+    for key, value in record.items():
+        if isinstance(value, float):
+            value = round(value, 4 if key.endswith('Seconds') else 1)
+        elif key == 'phases':
+            value = [_rounded(p) for p in value]
+        out[key] = value
+    return out
+
+
+def load_profile(path) -> dict:
+    with open(path) as f:
+        profile = json.load(f)
+    if profile.get('version') != PROFILE_VERSION:
+        raise ValueError(f"{path}: profile version {profile.get('version')} is not supported")
+    return profile
+
+
+def _flatten(profile: dict) -> dict:
+    """{'stage' | 'stage/phase': record} of a profile."""
+    rows = {}
+    for stage in profile['stages']:
+        rows[stage['name']] = stage
+        for p in stage['phases']:
+            rows[f"{stage['name']}/{p['name']}"] = p
+    return rows
+
+
+def diff_profiles(old: dict, new: dict, tolerance: float = 0.2, floors: dict | None = None) -> dict:
+    """Compare two profiles stage by stage and phase by phase.
+
+    A metric regresses when it grew by more than `tolerance` (relative) and by
+    more than its floor (absolute, see METRICS), so that millisecond-sized
+    stages do not flag on scheduler noise. Stages built in only one of the
+    runs are listed but never flagged.
+    """
+    floors = {key: floor for key, _, floor in METRICS} | (floors or {})
+    before, after = _flatten(old), _flatten(new)
+    entries, regressions = [], []
+    for name, rec in after.items():
+        base = before.get(name)
+        if base is None:
+            continue
+        entry = {'name': name, 'changes': {}}
+        for key, label, _ in METRICS:
+            a, b = base.get(key), rec.get(key)
+            if a is None or b is None:
+                continue
+            ratio = b / a if a else float('inf') if b else 1.0
+            flagged = b - a > floors[key] and ratio > 1 + tolerance
+            entry['changes'][key] = {'old': a, 'new': b, 'ratio': ratio, 'flagged': flagged}
+            if flagged:
+                regressions.append(f"{name}: {label} {a:g} -> {b:g} ({ratio:.2f}x)")
+        entries.append(entry)
+    return {
+        'tolerance': tolerance,
+        'floors': floors,
+        'entries': entries,
+        'onlyOld': [n for n in before if n not in after and '/' not in n],
+        'onlyNew': [n for n in after if n not in before and '/' not in n],
+        'regressions': regressions,
+    }
+
+
+def _rows_str(rows):
+    return f"{rows:>11,}" if rows is not None else f"{'':>11}"
+
+
+def print_profile(profile: dict):
+    scope = 'per stage' if profile['peakRssPerFrame'] else 'lifetime'
+    print(f"\n {'stage/phase':<34}{'wall s':>9}{'cpu s':>9}{'child s':>9}{f'peak MB ({scope})':>22}{'rows':>11}")
+    for stage in profile['stages']:
+        print(f" {stage['name']:<34}{stage['wallSeconds']:>9.3f}{stage['cpuSeconds']:>9.3f}"
+              f"{stage['childCpuSeconds']:>9.3f}{stage['peakRssMb']:>22.1f}{_rows_str(stage['rows'])}")
+        for p in stage['phases']:
+            name = f"  {p['name']}" + (f" x{p['calls']}" if p['calls'] > 1 else '')
+            print(f" {name:<34}{p['wallSeconds']:>9.3f}{p['cpuSeconds']:>9.3f}"
+                  f"{p['childCpuSeconds']:>9.3f}{p['peakRssMb']:>22.1f}{_rows_str(p['rows'])}")
+
+
+def print_diff(diff: dict):
+    print(f"\n {'stage/phase':<34}" + ''.join(f"{key:>24}" for key, _, _ in METRICS))
+    for entry in diff['entries']:
+        cells = []
+        for key, _, _ in METRICS:
+            c = entry['changes'].get(key)
+            cell = f"{c['old']:g} -> {c['new']:g}{' !' if c['flagged'] else '  '}" if c else ''
+            cells.append(f"{cell:>24}")
+        print(f" {entry['name']:<34}" + ''.join(cells))
+    for label, names in (('only in old', diff['onlyOld']), ('only in new', diff['onlyNew'])):
+        if names:
+            print(f"\n Stages {label} profile (not built in the other run): {', '.join(names)}")
+    if diff['regressions']:
+        print(f"\n {len(diff['regressions'])} regression(s) beyond {diff['tolerance']:.0%}:")
+        for line in diff['regressions']:
+            print(f"    {line}")
+    else:
+        print(f"\n No regressions beyond {diff['tolerance']:.0%}.")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    sub = parser.add_subparsers(dest='command', required=True)
+    show = sub.add_parser('show', help="print a profile as a table")
+    show.add_argument('profile', nargs='?', default=str(PROFILE_PATH))
+    diff = sub.add_parser('diff', help="flag stages and phases that regressed between two profiles")
+    diff.add_argument('old')
+    diff.add_argument('new')
+    diff.add_argument('--tolerance', type=float, default=0.2, help="relative growth that counts as a regression")
+    diff.add_argument('--min-seconds', type=float, default=None,
+                      help="ignore wall/CPU growth below this many seconds (default 0.05)")
+    diff.add_argument('--min-mb', type=float, default=None, help="ignore peak RSS growth below this (default 8 MB)")
+    diff.add_argument('--json', help="also write the comparison to this file")
+    args = parser.parse_args()
+
+    if args.command == 'show':
+        print_profile(load_profile(args.profile))
+        return
+
+    floors = {}
+    if args.min_seconds is not None:
+        floors.update(wallSeconds=args.min_seconds, cpuSeconds=args.min_seconds)
+    if args.min_mb is not None:
+        floors['peakRssMb'] = args.min_mb
+    old, new = load_profile(args.old), load_profile(args.new)
+    if old['peakRssPerFrame'] != new['peakRssPerFrame']:
+        print(" Warning: only one of the profiles has per-stage peaks; peak RSS is not comparable")
+    if old.get('dump') or new.get('dump'):
+        print(" Warning: a profile was taken with a cProfile/tracemalloc dump; its timings are inflated")
+    result = diff_profiles(old, new, args.tolerance, floors)
+    print_diff(result)
+    if args.json:
+        Path(args.json).parent.mkdir(parents=True, exist_ok=True)
+        with open(args.json, 'w') as f:
+            json.dump(result, f, indent=2)
+    sys.exit(1 if result['regressions'] else 0)
+
+
+if __name__ == '__main__':
+    main()
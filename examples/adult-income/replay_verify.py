@@ -0,0 +1,273 @@
+"""Bulk self-audit of the provider's query log.
+
+Every query in zkfair_query_logs is re-scored with the model the server
+serves, and every batch in zkfair_batches has its Merkle root rebuilt.
+Receipt-by-receipt checks (fraud-detector.ts, the dispute scripts) cost a
+round trip and a tree per query. Here the log is read `--chunk-size` rows
+at a time:
+
+- the JSON `features` of a chunk are decoded with one json.loads into a
+  (rows, features) matrix and scored by onnxruntime in `--batch-size` batches,
+  with the float32 inputs the server used. The labels are compared with the
+  stored `prediction`.
+- leaves use the `hashRecordLeaf` layout: poseidon2(poseidon8(f0..f7),
+  poseidon8(f8..f13, prediction >= 0.5, sensitiveAttr)). They are hashed
+  column-wise (`poseidon.hash_many`) on a process pool.
+- once the log has been read past a batch's endSeq, its root is rebuilt like
+  `merkleRoot` (odd levels duplicate their last node). The roots of all
+  batches completed in a chunk are rebuilt together, one pooled hash call per
+  tree level, and compared with `merkleRoot` and `recordCount`.
+
+    uv run replay_verify.py                                       # ../../apps/server/zkfair.db
+    uv run replay_verify.py --workers 8 --chunk-size 200000 --json .build/replay.json
+    uv run replay_verify.py --from-seq 120000                     # only the newer part of the log
+"""
+import argparse
+import json
+import os
+import sqlite3
+import time
+from pathlib import Path
+
+import numpy as np
+
+from circuit_emulator import served_label
+from commitment import hash_batched, make_pool, to_hex
+
+SERVER_DIR = Path(__file__).resolve().parents[2] / 'apps' / 'server'
+# Fields per leaf: 14 features, the prediction and the sensitive attribute, hashed 8 at a time
+LEAF_FEATURES = 14
+MAX_REPORTED = 20
+
+
+def load_sessions(registry_path, model_path=None) -> dict:
+    """modelId -> onnxruntime session, from registry.json paths (relative to it) or one `model_path` for all."""
+    from onnx_check import make_session
+
+    registry_path = Path(registry_path)
+    with open(registry_path) as f:
+        registry = json.load(f)
+    sessions = {}
+    for entry in registry['models']:
+        path = Path(model_path) if model_path else registry_path.parent / entry['path']
+        if path.is_file():
+            sessions[entry['id']] = make_session(path)
+    return sessions
+
+
+def decode_features(texts: list[str], width: int = LEAF_FEATURES) -> np.ndarray:
+    """JSON feature arrays -> float64 matrix, padded with 0 (like hashRecordLeaf) to `width` columns."""
+    rows = json.loads('[' + ','.join(texts) + ']')
+    longest = max((len(r) for r in rows), default=0)
+    out = np.zeros((len(rows), max(width, longest)), dtype=np.float64)
+    if all(len(r) == longest for r in rows):
+        out[:, :longest] = rows
+    else:
+        for i, r in enumerate(rows):
+            out[i, :len(r)] = r
+    return out
+
+
+def score(session, features: np.ndarray, batch_size: int) -> np.ndarray:
+    inp = session.get_inputs()[0]
+    n_features = inp.shape[1] if isinstance(inp.shape[1], int) else features.shape[1]
+    # The server runs the float32 inputs it received
+    X = np.ascontiguousarray(features[:, :n_features], dtype=np.float32)
+    labels = [np.asarray(session.run(['label'], {inp.name: X[i:i + batch_size]})[0]).reshape(-1)
+              for i in range(0, len(X), batch_size)]
+    return np.concatenate(labels) if labels else np.empty(0)
+
+
+def leaf_hashes(features: np.ndarray, predictions: np.ndarray, sensitive: np.ndarray, pool=None) -> np.ndarray:
+    """hashRecordLeaf for every row; features must be integral (the SDK's BigInt() rejects anything else)."""
+    ints = features[:, :LEAF_FEATURES].astype(np.int64)
+    columns = [ints[:, j].astype(object) for j in range(LEAF_FEATURES)]
+    columns.append(served_label(predictions).astype(object))
+    columns.append(sensitive.astype(np.int64).astype(object))
+    # Both poseidon8 halves in one call, so they share the pool's tasks
+    halves = hash_batched([np.concatenate([lo, hi]) for lo, hi in zip(columns[:8], columns[8:])], pool)
+    return hash_batched([halves[:len(ints)], halves[len(ints):]], pool)
+
+
+def batch_roots(leaf_groups: list[np.ndarray], pool=None) -> list[int]:
+    """merkleRoot of every leaf list, one hash call per tree level across all of them."""
+    levels = [np.asarray(g, dtype=object) for g in leaf_groups]
+    while any(len(level) > 1 for level in levels):
+        lefts, rights, sizes = [], [], []
+        for level in levels:
+            if len(level) == 1:
+                sizes.append(0)
+                continue
+            left, right = level[0::2], level[1::2]
+            if len(right) < len(left):
+                right = np.append(right, level[-1:])
+            lefts.append(left)
+            rights.append(right)
+            sizes.append(len(left))
+        parents = hash_batched([np.concatenate(lefts), np.concatenate(rights)], pool)
+        offset = 0
+        for i, size in enumerate(sizes):
+            if size:
+                levels[i] = parents[offset:offset + size]
+                offset += size
+    return [int(level[0]) for level in levels]
+
+
+class ReplayVerifier:
+    def __init__(self, db_path, sessions: dict, pool=None, batch_size: int = 8192):
+        self.con = sqlite3.connect(f'file:{db_path}?mode=ro', uri=True)
+        self.sessions = sessions
+        self.pool = pool
+        self.batch_size = batch_size
+        # id -> (startSeq, endSeq, merkleRoot, recordCount); batches are few next to queries
+        self.batches = {row[0]: row[1:] for row in self.con.execute(
+            'SELECT id, start_seq, end_seq, merkle_root, record_count FROM zkfair_batches ORDER BY end_seq')}
+        self.open_leaves: dict[str, list] = {}
+        self.skipped: set[str] = set()
+        self.report = {
+            'queries': 0, 'scored': 0, 'unscoredModels': {}, 'predictionMismatches': 0,
+            'mismatchedQueries': [], 'nonIntegerFeatureQueries': [], 'unbatchedQueries': 0,
+            'batches': 0, 'rootMismatches': [], 'countMismatches': [], 'outOfRangeQueries': [],
+        }
+
+    def run(self, from_seq: int = 0, chunk_size: int = 100_000, on_chunk=None):
+        last_seq = from_seq
+        # Batches starting at or before from_seq would only be read in part; they are left out
+        self.skipped = {b for b, (start, *_) in self.batches.items() if start <= from_seq}
+        done = set(self.skipped)
+        while True:
+            rows = self.con.execute(
+                'SELECT seq, model_id, features, sensitive_attr, prediction, batch_id FROM zkfair_query_logs '
+                'WHERE seq > ? ORDER BY seq LIMIT ?', (last_seq, chunk_size)).fetchall()
+            if not rows:
+                break
+            last_seq = rows[-1][0]
+            self._chunk(rows, done)
+            self._close_batches(last_seq, done)
+            if on_chunk:
+                on_chunk(self.report, last_seq)
+        self._close_batches(float('inf'), done)
+        return self.report
+
+    def _chunk(self, rows, done):
+        r = self.report
+        seqs = np.array([row[0] for row in rows], dtype=np.int64)
+        model_ids = np.array([row[1] for row in rows], dtype=np.int64)
+        features = decode_features([row[2] for row in rows])
+        sensitive = np.array([row[3] for row in rows], dtype=np.int64)
+        predictions = np.array([row[4] for row in rows], dtype=np.float64)
+        batch_ids = np.array([row[5] for row in rows], dtype=object)
+        r['queries'] += len(rows)
+
+        for model_id in np.unique(model_ids):
+            mask = model_ids == model_id
+            session = self.sessions.get(int(model_id))
+            if session is None:
+                r['unscoredModels'][str(model_id)] = r['unscoredModels'].get(str(model_id), 0) + int(mask.sum())
+                continue
+            labels = score(session, features[mask], self.batch_size)
+            differs = np.flatnonzero(labels != predictions[mask])
+            r['scored'] += int(mask.sum())
+            r['predictionMismatches'] += len(differs)
+            room = MAX_REPORTED - len(r['mismatchedQueries'])
+            for i in differs[:max(room, 0)]:
+                r['mismatchedQueries'].append({'seq': int(seqs[mask][i]), 'stored': float(predictions[mask][i]),
+                                               'model': int(labels[i])})
+
+        batched = np.array([row[5] is not None for row in rows], dtype=bool)
+        r['unbatchedQueries'] += int((~batched).sum())
+        integral = (features[:, :LEAF_FEATURES] == np.round(features[:, :LEAF_FEATURES])).all(axis=1)
+        for i in np.flatnonzero(batched & ~integral)[:MAX_REPORTED - len(r['nonIntegerFeatureQueries'])]:
+            r['nonIntegerFeatureQueries'].append(int(seqs[i]))
+        hashable = batched & integral
+        leaves = leaf_hashes(features[hashable], predictions[hashable], sensitive[hashable], self.pool)
+        for seq, batch_id, leaf in zip(seqs[hashable], batch_ids[hashable], leaves):
+            if batch_id in self.skipped:
+                continue
+            if batch_id in done or batch_id not in self.batches:
+                r['outOfRangeQueries'].append({'seq': int(seq), 'batchId': batch_id})
+                continue
+            self.open_leaves.setdefault(batch_id, []).append(leaf)
+
+    def _close_batches(self, last_seq, done):
+        closing = [b for b, (start, end, *_) in self.batches.items()
+                   if b not in done and end <= last_seq]
+        if not closing:
+            return
+        roots = batch_roots([self.open_leaves.get(b) or [0] for b in closing], self.pool)
+        for batch_id, root in zip(closing, roots):
+            start, end, merkle_root, record_count = self.batches[batch_id]
+            leaves = self.open_leaves.pop(batch_id, [])
+            done.add(batch_id)
+            self.report['batches'] += 1
+            if len(leaves) != record_count:
+                self.report['countMismatches'].append({'batchId': batch_id, 'recordCount': record_count,
+                                                       'logged': len(leaves)})
+            if not leaves or '0x' + to_hex(root) != merkle_root.lower():
+                self.report['rootMismatches'].append({'batchId': batch_id, 'committed': merkle_root,
+                                                      'recomputed': '0x' + to_hex(root) if leaves else None})
+
+    def close(self):
+        self.con.close()
+
+
+def print_report(r, seconds):
+    print(f"\n Replayed {r['queries']:,} queries and {r['batches']:,} batches in {seconds:.1f}s "
+          f"({r['queries'] / seconds if seconds else 0:,.0f} queries/s)")
+    print(f"   Predictions: {r['scored']:,} re-scored, {r['predictionMismatches']:,} differ from the log")
+    for m in r['mismatchedQueries']:
+        print(f"     seq {m['seq']}: logged {m['stored']}, model {m['model']}")
+    for model_id, n in r['unscoredModels'].items():
+        print(f"     model {model_id}: {n:,} queries not scored (no model file in the registry)")
+    print(f"   Merkle roots: {r['batches'] - len(r['rootMismatches']):,} of {r['batches']:,} match")
+    for m in r['rootMismatches']:
+        print(f"     batch {m['batchId']}: committed {m['committed']}, recomputed {m['recomputed']}")
+    for m in r['countMismatches']:
+        print(f"     batch {m['batchId']}: recordCount {m['recordCount']}, {m['logged']} queries logged")
+    if r['outOfRangeQueries']:
+        print(f"   {len(r['outOfRangeQueries'])} queries point at a batch that doesn't cover their seq")
+    if r['nonIntegerFeatureQueries']:
+        print(f"   queries with non-integer features (not hashable): {r['nonIntegerFeatureQueries']}")
+    print(f"   Unbatched queries: {r['unbatchedQueries']:,}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--db', default=SERVER_DIR / 'zkfair.db', help="the provider server's SQLite database")
+    parser.add_argument('--registry', default=SERVER_DIR / 'registry.json')
+    parser.add_argument('--model', help="score every query with this ONNX file instead of the registry's")
+    parser.add_argument('--from-seq', type=int, default=0, help="start after this seq")
+    parser.add_argument('--chunk-size', type=int, default=100_000, help="queries read per chunk")
+    parser.add_argument('--batch-size', type=int, default=8192, help="rows per onnxruntime run")
+    parser.add_argument('--workers', type=int, default=None, help="hashing processes (default: all cores)")
+    parser.add_argument('--json', help="write the report to this file")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    sessions = load_sessions(args.registry, args.model)
+    workers = args.workers or os.cpu_count() or 1
+    pool = make_pool(workers, 8)
+    verifier = ReplayVerifier(args.db, sessions, pool, args.batch_size)
+
+    def progress(report, last_seq):
+        elapsed = time.perf_counter() - start
+        print(f" seq {last_seq:,}: {report['queries']:,} queries, {report['batches']:,} batches ({elapsed:.1f}s)")
+
+    try:
+        report = verifier.run(args.from_seq, args.chunk_size, on_chunk=progress)
+    finally:
+        verifier.close()
+        if pool is not None:
+            pool.shutdown()
+    seconds = time.perf_counter() - start
+    report['seconds'] = seconds
+    print_report(report, seconds)
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(report, f, indent=2)
+    if report['predictionMismatches'] or report['rootMismatches'] or report['countMismatches']:
+        raise SystemExit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,321 @@
+"""Circuit-sized shards of the committed dataset, as ready-to-prove Prover.toml files.
+
+The training circuit takes at most MAX_DATASET_SIZE rows, but its Merkle
+check is against the root of the whole committed dataset: any 10 leaves with
+their proofs (up to MAX_TREE_HEIGHT levels, 32,768 rows) can be proven. This
+splits every row of the dataset into shards of at most 10 rows and writes one
+`Prover.toml` per shard, in the format of
+packages/zk-circuits/scripts/fill-prover-toml.ts, against the root in
+commitment.py's output. Proving the full dataset is then one independent
+`nargo execute` per shard.
+
+Shards are stratified: rows are ordered by (protected group, label) with a
+seeded shuffle inside each stratum and dealt round-robin, so every shard holds
+the dataset's group and label mix as closely as 10 rows allow, and both
+groups whenever the smaller group has at least one row per shard (the circuit
+asserts group_a_total > 0 and group_b_total > 0). Each shard is also run
+through the circuit emulator, and `manifest.json` records its leaf indices,
+emulated rates and the SHA-256 of its Prover.toml next to the root.
+
+    uv run commitment.py                          # dataset_encoded.csv -> .build/commitment/
+    uv run shards.py                              # -> .build/shards/shard_00000.toml ... + manifest.json
+    cp .build/shards/shard_00042.toml ../../packages/zk-circuits/training/Prover.toml
+"""
+import argparse
+import hashlib
+import json
+import math
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import numpy as np
+
+from build import BUILD_DIR, write_bytes, write_json
+from circuit_emulator import (MAX_DATASET_SIZE, NUM_FEATURES, THRESHOLD_SCALE, circuit_predict, epsilon_percent,
+                              threshold_fields)
+from commitment import COMMITMENT_DIR, MAX_TREE_HEIGHT, read_dataset, weights_hash, weights_to_fields
+
+SHARDS_DIR = BUILD_DIR / 'shards'
+
+
+def stratified_shards(groups, labels, shard_size: int = MAX_DATASET_SIZE, seed: int = 0) -> list[np.ndarray]:
+    """Split row indices into ceil(n / shard_size) shards with matching group/label mix.
+
+    Rows are sorted by (group, label, random key) and dealt round-robin, so each
+    stratum is spread evenly and shard sizes differ by at most one.
+    """
+    n = len(groups)
+    n_shards = max(1, math.ceil(n / shard_size))
+    order = np.lexsort((np.random.default_rng(seed).random(n), np.asarray(labels), np.asarray(groups)))
+    shard_of = np.empty(n, dtype=np.int64)
+    shard_of[order] = np.arange(n) % n_shards
+    # Row indices per shard, ascending (leaf order)
+    by_shard = np.argsort(shard_of, kind='stable')
+    return np.split(by_shard, np.cumsum(np.bincount(shard_of, minlength=n_shards))[:-1])
+
+
+def shard_rates(predictions, sensitive, shards) -> dict:
+    """The training circuit's u32 group counts and rates for every shard at once."""
+    shard_of = np.empty(len(predictions), dtype=np.int64)
+    for i, rows in enumerate(shards):
+        shard_of[rows] = i
+    group_b = (np.asarray(sensitive) != 0).astype(np.int64)
+    key = shard_of * 2 + group_b
+    totals = np.bincount(key, minlength=2 * len(shards)).reshape(-1, 2)
+    positives = np.bincount(key, weights=predictions, minlength=2 * len(shards)).astype(np.int64).reshape(-1, 2)
+    rates = positives * THRESHOLD_SCALE // np.maximum(totals, 1)
+    return {'totals': totals, 'positives': positives, 'rates': rates,
+            'disparity': np.abs(rates[:, 0] - rates[:, 1])}
+
+
+def _toml_array(values) -> str:
+    return '[' + ', '.join(f'"{v}"' for v in values) + ']'
+
+
+def _decimal(node: str) -> str:
+    # Proofs store siblings as 0x-hex and padding as "0"
+    return str(int(node, 16)) if node.startswith('0x') else node
+
+
+def prover_toml(job: dict) -> str:
+    """Training-circuit Prover.toml for one shard, padded to MAX_DATASET_SIZE rows."""
+    rows = job['rows']
+    size = len(rows)
+    pad = MAX_DATASET_SIZE - size
+    features = [str(v) for row in rows for v in row[:NUM_FEATURES]] + ['0'] * (NUM_FEATURES * pad)
+    labels = [str(row[NUM_FEATURES]) for row in rows] + ['0'] * pad
+    sensitive = [str(row[job['protectedAttributeIndex']]) for row in rows] + ['0'] * pad
+    salts = job['salts'] + ['0'] * pad
+    paths = [[_decimal(node) for node in path] for path in job['merklePaths']] + [['0'] * MAX_TREE_HEIGHT] * pad
+    flags = job['isEvenFlags'] + [[False] * MAX_TREE_HEIGHT] * pad
+
+    toml = f"# Auto-generated Prover.toml for training circuit (shard {job['index']})\n\n"
+    toml += f"_model_weights = {_toml_array(job['weightFields'])}\n\n"
+    toml += f'_dataset_size = "{size}"\n\n'
+    toml += f"_dataset_features = {_toml_array(features)}\n\n"
+    toml += f"_dataset_labels = {_toml_array(labels)}\n\n"
+    toml += f"_dataset_sensitive_attrs = {_toml_array(sensitive)}\n\n"
+    toml += f'_threshold_group_a = "{job["thresholdFields"][0]}"\n'
+    toml += f'_threshold_group_b = "{job["thresholdFields"][1]}"\n\n'
+    toml += f"_dataset_salts = {_toml_array(salts)}\n\n"
+    toml += "_merkle_paths = [\n" + ",\n".join(f"  {_toml_array(p)}" for p in paths) + "\n]\n\n"
+    toml += "_is_even_flags = [\n" + ",\n".join(
+        "  [" + ", ".join('true' if f else 'false' for f in row) + "]" for row in flags) + "\n]\n\n"
+    toml += f'_weights_hash = "{job["weightsHash"]}"\n'
+    toml += f'_dataset_merkle_root = "{job["datasetMerkleRoot"]}"\n'
+    toml += f'_fairness_threshold_epsilon = "{job["epsilon"]}"\n'
+    return toml
+
+
+# The dataset rows and commitment.py's salts and Merkle proofs, loaded once per
+# worker process by `_init_witness` so that jobs only carry leaf indices
+_witness = {}
+
+
+def _init_witness(dataset_path, commitment_dir, rows=None):
+    _witness.clear()
+    _witness['rows'] = read_dataset(dataset_path) if rows is None else rows
+    _witness.update(load_commitment(commitment_dir))
+
+
+def shard_witness(leaves) -> dict:
+    """Rows, salts, Merkle paths and direction flags of a shard's leaves."""
+    return {
+        'rows': _witness['rows'][leaves].tolist(),
+        'salts': [_witness['salts'][j] for j in leaves],
+        'merklePaths': [_witness['merklePaths'][j] for j in leaves],
+        'isEvenFlags': [_witness['isEvenFlags'][j] for j in leaves],
+    }
+
+
+def write_shard(job: dict) -> tuple[str, str]:
+    toml = prover_toml({**job, **shard_witness(job['leaves'])}).encode()
+    write_bytes(job['path'], toml)
+    return job['path'], hashlib.sha256(toml).hexdigest()
+
+
+def check_shard(path) -> list[str]:
+    """Replay the training circuit's commitment checks on a written Prover.toml; returns the failures."""
+    import tomllib
+
+    import poseidon
+
+    with open(path, 'rb') as f:
+        toml = tomllib.load(f)
+    failures = []
+    weights = [int(w) for w in toml['_model_weights']]
+    if poseidon.poseidon(weights) != int(toml['_weights_hash'], 16):
+        failures.append("weights do not hash to _weights_hash")
+
+    root = int(toml['_dataset_merkle_root'], 16)
+    features = toml['_dataset_features']
+    for i in range(int(toml['_dataset_size'])):
+        row = [int(v) for v in features[i * NUM_FEATURES:(i + 1) * NUM_FEATURES]]
+        node = poseidon.poseidon(row + [int(toml['_dataset_labels'][i]), int(toml['_dataset_salts'][i])])
+        # compute_merkle_root from zk-circuits/common: zero siblings are skipped
+        for sibling, is_even in zip(toml['_merkle_paths'][i], toml['_is_even_flags'][i]):
+            sibling = int(sibling)
+            if sibling:
+                node = poseidon.poseidon([node, sibling] if is_even else [sibling, node])
+        if node != root:
+            failures.append(f"row {i} does not reach _dataset_merkle_root")
+    return failures
+
+
+def load_commitment(commitment_dir) -> dict:
+    """commitments.json, salts.json and merkle_proofs.json as written by commitment.py."""
+    commitment_dir = Path(commitment_dir)
+    missing = [name for name in ('commitments.json', 'salts.json', 'merkle_proofs.json')
+               if not (commitment_dir / name).exists()]
+    if missing:
+        raise FileNotFoundError(f"{commitment_dir} has no {', '.join(missing)}; run commitment.py first")
+    with open(commitment_dir / 'commitments.json') as f:
+        commitment = json.load(f)
+    with open(commitment_dir / 'salts.json') as f:
+        salts = json.load(f)
+    with open(commitment_dir / 'merkle_proofs.json') as f:
+        proofs = json.load(f)
+    commitment['salts'] = [salts[str(i)] for i in range(len(salts))]
+    commitment.update(proofs)
+    return commitment
+
+
+def build_shards(dataset_path, weights_path, threshold_path, commitment_dir=COMMITMENT_DIR,
+                 out_dir=SHARDS_DIR, shard_size: int = MAX_DATASET_SIZE, seed: int = 0, workers=None) -> dict:
+    """Write one Prover.toml per shard into `out_dir` and return the manifest."""
+    if not 0 < shard_size <= MAX_DATASET_SIZE:
+        raise ValueError(f"shard_size must be between 1 and {MAX_DATASET_SIZE}, got {shard_size}")
+    if workers is None:
+        workers = os.cpu_count() or 1
+    start = time.perf_counter()
+
+    rows = read_dataset(dataset_path)
+    commitment_dir = Path(commitment_dir)
+    missing = [name for name in ('commitments.json', 'salts.json', 'merkle_proofs.json')
+               if not (commitment_dir / name).exists()]
+    if missing:
+        raise FileNotFoundError(f"{commitment_dir} has no {', '.join(missing)}; run commitment.py first")
+    with open(commitment_dir / 'commitments.json') as f:
+        commitment = json.load(f)
+    # Checked here: a worker that fails while loading the commitment only reports a broken pool
+    with open(commitment_dir / 'salts.json') as f:
+        committed_rows = len(json.load(f))
+    w_hash = weights_hash(weights_path)
+    if commitment['weightsHash'] != w_hash:
+        raise ValueError(f"{commitment_dir} commits to weights {commitment['weightsHash']}, "
+                         f"but {weights_path} hashes to {w_hash}")
+    if committed_rows != len(rows):
+        raise ValueError(f"{commitment_dir} commits to {committed_rows} rows, but {dataset_path} has {len(rows)}")
+    tree_height = math.ceil(math.log2(len(rows))) if len(rows) > 1 else 0
+    if tree_height > MAX_TREE_HEIGHT:
+        raise ValueError(f"{len(rows)} rows need a tree of height {tree_height}, "
+                         f"the circuit verifies at most {MAX_TREE_HEIGHT}")
+
+    with open(threshold_path) as f:
+        config = json.load(f)
+    protected = config['protectedAttributeIndex']
+    weights = np.fromfile(weights_path, dtype='<f4')
+    fields = weights_to_fields(weights)
+
+    shards = stratified_shards(rows[:, protected], rows[:, NUM_FEATURES], shard_size, seed)
+    stats = shard_rates(circuit_predict(fields, rows[:, :NUM_FEATURES]), rows[:, protected], shards)
+    threshold = epsilon_percent(config['targetDisparity']) * 100
+
+    out_dir = Path(out_dir)
+    # The witness (rows, salts, Merkle paths) is gathered by whichever process writes the shard
+    jobs = [{
+        'index': i,
+        'path': str(out_dir / f'shard_{i:05d}.toml'),
+        'leaves': idx.tolist(),
+        'protectedAttributeIndex': protected,
+        'weightFields': fields,
+        'thresholdFields': threshold_fields(config['thresholds']),
+        'weightsHash': w_hash,
+        'datasetMerkleRoot': commitment['datasetMerkleRoot'],
+        'epsilon': epsilon_percent(config['targetDisparity']),
+    } for i, idx in enumerate(shards)]
+
+    t0 = time.perf_counter()
+    if workers > 1:
+        # Each worker reads the dataset and the commitment itself, instead of having them pickled into every job
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_witness,
+                                 initargs=(dataset_path, commitment_dir)) as pool:
+            written = list(pool.map(write_shard, jobs, chunksize=max(1, len(jobs) // (4 * workers))))
+    else:
+        _init_witness(dataset_path, commitment_dir, rows)
+        written = [write_shard(job) for job in jobs]
+    toml_seconds = time.perf_counter() - t0
+
+    entries = []
+    for i, (idx, (path, digest)) in enumerate(zip(shards, written)):
+        totals = stats['totals'][i]
+        entries.append({
+            'index': i,
+            'file': Path(path).name,
+            'sha256': digest,
+            'leaves': idx.tolist(),
+            'groupATotal': int(totals[0]),
+            'groupBTotal': int(totals[1]),
+            'rateAScaled': int(stats['rates'][i, 0]),
+            'rateBScaled': int(stats['rates'][i, 1]),
+            'disparityScaled': int(stats['disparity'][i]),
+            'passes': bool(totals.all() and stats['disparity'][i] <= threshold),
+        })
+
+    return {
+        'datasetMerkleRoot': commitment['datasetMerkleRoot'],
+        'weightsHash': w_hash,
+        'dataset': str(dataset_path),
+        'rows': len(rows),
+        'shardSize': shard_size,
+        'seed': seed,
+        'protectedAttributeIndex': protected,
+        'fairnessThresholdEpsilon': epsilon_percent(config['targetDisparity']),
+        'thresholdScaled': threshold,
+        'passing': sum(e['passes'] for e in entries),
+        'missingGroup': sum(not (e['groupATotal'] and e['groupBTotal']) for e in entries),
+        'timings': {'prover': toml_seconds, 'total': time.perf_counter() - start},
+        'shards': entries,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--dataset', default='dataset_encoded.csv')
+    parser.add_argument('--weights', default='weights.bin')
+    parser.add_argument('--fairness-threshold', default='fairness_threshold.json')
+    parser.add_argument('--commitment', default=str(COMMITMENT_DIR),
+                        help="commitment.py output (or ~/.zkfair/<weightsHash>) for the same dataset")
+    parser.add_argument('--out', default=str(SHARDS_DIR))
+    parser.add_argument('--shard-size', type=int, default=MAX_DATASET_SIZE)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--workers', type=int, default=None, help="processes writing Prover.toml files (default: all cores)")
+    parser.add_argument('--verify', type=int, default=4, metavar='N',
+                        help="re-hash N random shards' leaves up to the root (0 to skip)")
+    args = parser.parse_args()
+
+    manifest = build_shards(args.dataset, args.weights, args.fairness_threshold, args.commitment,
+                            args.out, args.shard_size, args.seed, args.workers)
+    write_json(Path(args.out) / 'manifest.json', manifest)
+
+    n = len(manifest['shards'])
+    print(f" Shards: {n} x <= {manifest['shardSize']} rows ({manifest['rows']} rows)")
+    print(f" Dataset Merkle Root: {manifest['datasetMerkleRoot']}")
+    print(f" Emulated training circuit: {manifest['passing']} of {n} shards pass "
+          f"(disparity <= {manifest['thresholdScaled']}), {manifest['missingGroup']} lack a group")
+    print(f" Time: {manifest['timings']['total']:.2f}s (Prover.toml {manifest['timings']['prover']:.2f}s)")
+    print(f" Saved: {args.out}/")
+
+    rng = np.random.default_rng(args.seed)
+    for i in sorted(rng.choice(n, size=min(args.verify, n), replace=False)):
+        failures = check_shard(Path(args.out) / manifest['shards'][i]['file'])
+        if failures:
+            raise SystemExit(f" shard {i}: {'; '.join(failures)}")
+    if args.verify:
+        print(f" Verified: {min(args.verify, n)} shards reach the committed root")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,404 @@
+"""Accuracy vs. disparity sweep over LogisticRegression settings.
+
+Trains every combination of C, class weight, solver and feature subset on the
+pipeline's train split and scores each candidate on the calibration split
+(the same `train_test_split` the train stage makes):
+
+- accuracy and the raw demographic parity / equalized odds gaps of the model;
+- the per-group thresholds of Algorithm 1 (thresholds.py) with the
+  fairness_metrics stage's objective and tolerance, and the accuracy and gap
+  after that post-processing.
+
+The encoded dataset is loaded once into shared memory and mapped by every
+worker of a process pool, so workers neither re-read the CSV nor receive a
+pickled copy of it. One task is one regularisation path: a (solver, class
+weight, features) combination fitted for every C from strongest to weakest
+regularisation, each fit warm-started from the previous coefficients
+(liblinear cannot warm-start and fits every C from scratch).
+
+The Pareto frontier (no other candidate is both more accurate and fairer)
+plots accuracy after thresholds against the raw-prediction gap of the
+pipeline's fairness.metric unless `--metric` says otherwise. It is
+printed and written with all candidates to .build/sweep/sweep.json. The
+chosen point is the most accurate frontier candidate within
+`--max-disparity`. `--apply` writes its settings to the "model" section of
+pipeline.json and runs the pipeline, which retrains it (without warm start)
+and exports weights.bin, model.onnx and the fairness config as usual.
+
+    uv run sweep.py                                   # default grid, all cores
+    uv run sweep.py --C 0.001 0.01 0.1 1 --class-weight none balanced --solver lbfgs newton-cg
+    uv run sweep.py --drop relationship,marital.status --max-disparity 0.02 --apply
+    uv run sweep.py --model ../heart-disease --metric equalized_odds
+"""
+import argparse
+import json
+import os
+import time
+import warnings
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from dataclasses import asdict, dataclass
+from multiprocessing import shared_memory
+from pathlib import Path
+
+import numpy as np
+
+from build import BUILD_DIR, write_bytes, write_json
+from main import CONFIG_FILE, DEFAULT_MODEL, FAIRNESS_METRICS, MODEL_DIR, build_model, build_pipeline, load_config
+
+SWEEP_DIR = BUILD_DIR / 'sweep'
+SWEEP_REPORT = SWEEP_DIR / 'sweep.json'
+# Disparity axis of the frontier: the gap left after the per-group thresholds,
+# or a gap of the model's own (threshold 0) predictions
+METRICS = ('thresholded', 'demographic_parity', 'equalized_odds')
+# Solvers that can continue from the previous coefficients
+WARM_START_SOLVERS = ('lbfgs', 'newton-cg', 'newton-cholesky', 'sag', 'saga')
+
+
+@dataclass
+class Candidate:
+    id: str
+    model: dict
+    nIter: int
+    converged: bool
+    warmStarted: bool
+    fitSeconds: float
+    testAccuracy: float
+    demographicParity: float
+    equalizedOdds: float
+    thresholdObjective: str
+    thresholds: list[float]
+    thresholdAccuracy: float
+    thresholdGap: float
+    maxAbsWeight: float
+
+
+def candidate_id(model: dict) -> str:
+    weight = model['classWeight'] or 'none'
+    features = f"-{'-'.join(model['dropFeatures'])}" if model['dropFeatures'] else 'all'
+    return f"{model['solver']}/{weight}/{features}/C={model['C']:g}"
+
+
+# Shared-memory views of the split, set in every worker by _attach
+_data = {}
+
+
+def _share(arrays: dict) -> tuple[list, dict]:
+    """Copy arrays into shared memory blocks; returns the blocks and their specs."""
+    blocks, specs = [], {}
+    for name, array in arrays.items():
+        array = np.ascontiguousarray(array)
+        block = shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1))
+        np.ndarray(array.shape, array.dtype, buffer=block.buf)[...] = array
+        blocks.append(block)
+        specs[name] = (block.name, array.shape, array.dtype.str)
+    return blocks, specs
+
+
+def _open_block(name):
+    # The parent owns (and unlinks) the blocks. Before Python 3.13 a worker
+    # registers them again, with the resource tracker it shares with the
+    # parent, which is harmless
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)
+    except TypeError:
+        return shared_memory.SharedMemory(name=name)
+
+
+def _attach(specs: dict, columns: list[str], settings: dict):
+    arrays = {}
+    for name, (block_name, shape, dtype) in specs.items():
+        block = _open_block(block_name)
+        arrays[name] = np.ndarray(shape, np.dtype(dtype), buffer=block.buf)
+        _data[f'_{name}_block'] = block
+    _install(arrays, columns, settings)
+
+
+def _install(arrays: dict, columns: list[str], settings: dict):
+    import pandas as pd
+
+    _data.update(arrays)
+    # DataFrames over the shared arrays (no copy), with the column names fit_model expects
+    _data['X_train_df'] = pd.DataFrame(_data['X_train'], columns=columns, copy=False)
+    _data['columns'] = columns
+    _data['settings'] = settings
+
+
+def _score(model, estimator, spec: dict, warm: bool, seconds: float) -> Candidate:
+    from fairness import confusion_matrices, disparities, group_rates
+    from thresholds import optimize_thresholds
+
+    s = _data['settings']
+    X_test, y_test, groups = _data['X_test'], _data['y_test'], _data['groups_test']
+    scores = X_test @ model.coef_[0] + model.intercept_[0]
+    y_pred = (scores > 0).astype(np.int64)
+    gaps = disparities(group_rates(confusion_matrices(groups, y_test, y_pred, n_groups=2)))
+    two_groups = (groups == 0) | (groups == 1)
+    result = optimize_thresholds(scores[two_groups], y_test[two_groups], groups[two_groups],
+                                 objective=s['threshold_objective'], tolerance=s['threshold_tolerance'],
+                                 scale=s['threshold_scale'])
+    n_iter = int(np.max(estimator.n_iter_))
+    return Candidate(
+        id=candidate_id(spec), model=spec, nIter=n_iter, converged=n_iter < s['max_iter'], warmStarted=warm,
+        fitSeconds=seconds, testAccuracy=float((y_pred == y_test).mean()),
+        demographicParity=float(gaps['demographic_parity']), equalizedOdds=float(gaps['equalized_odds']),
+        thresholdObjective=result.objective, thresholds=result.thresholds,
+        thresholdAccuracy=result.accuracy, thresholdGap=result.gap / s['threshold_scale'],
+        maxAbsWeight=float(max(np.abs(model.coef_).max(), abs(model.intercept_[0]))),
+    )
+
+
+def fit_path(path: dict, Cs: list[float], warm_start: bool = True) -> list[Candidate]:
+    """Fit one (solver, class weight, features) combination for every C, in a worker."""
+    from sklearn.exceptions import ConvergenceWarning
+
+    from main import fit_model
+
+    s = _data['settings']
+    warm_start = warm_start and path['solver'] in WARM_START_SOLVERS
+    results, estimator = [], None
+    for C in sorted(Cs):
+        spec = {**path, 'C': C}
+        start = time.perf_counter()
+        with warnings.catch_warnings():
+            # Non-converged fits are reported through nIter/converged instead
+            warnings.simplefilter('ignore', ConvergenceWarning)
+            model, fitted = fit_model(_data['X_train_df'], _data['y_train'], spec, s['max_iter'],
+                                      s['random_state'], s['standardize'], warm=estimator)
+        seconds = time.perf_counter() - start
+        results.append(_score(model, fitted, spec, estimator is not None, seconds))
+        if warm_start:
+            estimator = fitted
+    return results
+
+
+def pareto_frontier(candidates: list[Candidate], disparity) -> list[Candidate]:
+    """Candidates no other candidate beats on both accuracy and `disparity(c)`, fairest first."""
+    frontier, best = [], -1.0
+    for c in sorted(candidates, key=lambda c: (disparity(c), -accuracy(c))):
+        if accuracy(c) > best:
+            frontier.append(c)
+            best = accuracy(c)
+    return frontier
+
+
+def accuracy(c: Candidate) -> float:
+    # The deployed model applies the per-group thresholds
+    return c.thresholdAccuracy
+
+
+def disparity_of(metric: str):
+    key = {'thresholded': 'thresholdGap', 'demographic_parity': 'demographicParity',
+           'equalized_odds': 'equalizedOdds'}[metric]
+    return lambda c: getattr(c, key)
+
+
+def choose(frontier: list[Candidate], disparity, max_disparity: float) -> tuple[Candidate, bool]:
+    """Most accurate frontier point within the budget, else the fairest one.
+
+    Also returns whether the chosen point is within the budget.
+    """
+    within = [c for c in frontier if disparity(c) <= max_disparity]
+    return (max(within, key=accuracy), True) if within else (frontier[0], False)
+
+
+def load_split(config: dict, stage_params: dict):
+    """Encoded train/calibration split, exactly as the train stage makes it."""
+    import pandas as pd
+    from sklearn.model_selection import train_test_split
+
+    target = stage_params['target']
+    X = pd.read_csv('dataset_encoded.csv')
+    features = X.drop(target, axis=1)
+    train_idx, test_idx = train_test_split(np.arange(len(X)), test_size=stage_params['test_size'],
+                                           random_state=stage_params['random_state'])
+    values = features.to_numpy(dtype=np.float64)
+    y = X[target].to_numpy(dtype=np.int64)
+    groups = features[config['protectedAttribute']].to_numpy(dtype=np.int64)
+    arrays = {'X_train': values[train_idx], 'y_train': y[train_idx], 'X_test': values[test_idx],
+              'y_test': y[test_idx], 'groups_test': groups[test_idx]}
+    return list(features.columns), arrays
+
+
+def run_sweep(config: dict, paths: list[dict], Cs: list[float], workers: int, warm_start: bool = True) -> list:
+    stages = {s.name: s.params for s in build_pipeline(config).stages}
+    train, fairness = stages['train'], stages['fairness_metrics']
+    columns, arrays = load_split(config, train)
+    settings = {'max_iter': train['max_iter'], 'random_state': train['random_state'],
+                'standardize': train['standardize'], 'threshold_objective': fairness['threshold_objective'],
+                'threshold_tolerance': fairness['threshold_tolerance'],
+                'threshold_scale': fairness['threshold_scale']}
+
+    # Slowest paths first (lbfgs/newton on many C values), so no long path starts last
+    order = sorted(paths, key=lambda p: p['solver'] == 'liblinear')
+    if workers <= 1:
+        _install(arrays, columns, settings)
+        return [c for p in order for c in fit_path(p, Cs, warm_start)]
+
+    blocks, specs = _share(arrays)
+    try:
+        results = []
+        with ProcessPoolExecutor(max_workers=workers, initializer=_attach,
+                                 initargs=(specs, columns, settings)) as pool:
+            futures = {pool.submit(fit_path, p, Cs, warm_start): p for p in order}
+            for done, future in enumerate(as_completed(futures), 1):
+                results.extend(future.result())
+                print(f"    {done}/{len(futures)} paths done", flush=True)
+        return results
+    finally:
+        for block in blocks:
+            block.close()
+            block.unlink()
+
+
+def grid(config: dict, class_weights, solvers, drops: list[list[str]]) -> list[dict]:
+    features = [[]] + [d for d in drops if d]
+    unknown = {f for d in features for f in d} - _feature_columns(config)
+    if unknown:
+        raise ValueError(f"--drop names columns that are not features: {sorted(unknown)}")
+    return [{'classWeight': w, 'solver': s, 'dropFeatures': d}
+            for s in solvers for w in class_weights for d in features]
+
+
+def _feature_columns(config) -> set:
+    import pandas as pd
+
+    columns = pd.read_csv('dataset_encoded.csv', nrows=0).columns
+    return set(columns) - {config['target']['column']}
+
+
+def _value_spans(text: str) -> dict[str, tuple[int, int]]:
+    """Key -> (start, end) offsets of each top-level value of a JSON object's text."""
+    decoder = json.JSONDecoder()
+
+    def skip(i, chars=' \t\r\n'):
+        while text[i] in chars:
+            i += 1
+        return i
+
+    spans = {}
+    i = skip(text.index('{') + 1)
+    while text[i] != '}':
+        key, i = decoder.raw_decode(text, i)
+        start = skip(skip(i) + 1)
+        _, i = decoder.raw_decode(text, start)
+        spans[key] = (start, i)
+        i = skip(skip(i), ' \t\r\n,')
+    return spans
+
+
+def apply_model(model_dir: Path, model: dict):
+    """Set the "model" section of pipeline.json, keeping the rest of the hand-written file as it is."""
+    path = model_dir / CONFIG_FILE
+    text = path.read_text()
+    spans = _value_spans(text)
+    value = json.dumps(model)
+    if 'model' in spans:
+        start, end = spans['model']
+        text = text[:start] + value + text[end:]
+    else:
+        # A new key after the last one, indented like the first
+        first = min(start for start, _ in spans.values())
+        line = text[text.rindex('\n', 0, first) + 1:first]
+        indent = line[:len(line) - len(line.lstrip())]
+        end = max(end for _, end in spans.values())
+        text = text[:end] + f',\n{indent}"model": {value}' + text[end:]
+    write_bytes(path, text.encode())
+
+
+def print_frontier(frontier: list[Candidate], disparity, chosen: Candidate, metric: str):
+    print(f"\n Pareto frontier ({len(frontier)} points, accuracy after thresholds vs {metric} gap):")
+    print(f"   {'candidate':<46}{'gap':>8}{'acc':>8}{'raw acc':>9}{'DP':>8}{'EO':>8}{'iters':>7}")
+    for c in frontier:
+        mark = '*' if c is chosen else ' '
+        print(f" {mark} {c.id:<46}{disparity(c):>8.4f}{accuracy(c):>8.4f}{c.testAccuracy:>9.4f}"
+              f"{c.demographicParity:>8.4f}{c.equalizedOdds:>8.4f}{c.nIter:>6}{'' if c.converged else '!'}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--model', default=str(MODEL_DIR), help="model directory holding pipeline.json")
+    parser.add_argument('--C', type=float, nargs='+', default=[0.001, 0.01, 0.1, 1.0, 10.0],
+                        help="inverse regularisation strengths")
+    parser.add_argument('--class-weight', nargs='+', choices=['none', 'balanced'], default=['none', 'balanced'])
+    parser.add_argument('--solver', nargs='+', default=['lbfgs', 'liblinear'],
+                        choices=['lbfgs', 'liblinear', 'newton-cg', 'newton-cholesky', 'sag', 'saga'])
+    parser.add_argument('--drop', action='append', default=[],
+                        help="comma-separated features to leave out, as an extra feature subset (repeatable)")
+    parser.add_argument('--aware-only', action='store_true',
+                        help="do not add the subset without the protected attribute (added by default)")
+    parser.add_argument('--metric', choices=METRICS, default=None,
+                        help="disparity axis of the frontier (default: the raw-prediction gap of fairness.metric; "
+                             "'thresholded' is within the threshold tolerance for every candidate)")
+    parser.add_argument('--max-disparity', type=float, default=None,
+                        help="gap budget of the chosen point (default: fairness.minTargetDisparity)")
+    parser.add_argument('--workers', type=int, default=os.cpu_count(), help="training processes")
+    parser.add_argument('--cold', action='store_true', help="fit every C from scratch instead of warm-starting")
+    parser.add_argument('--apply', action='store_true',
+                        help="write the chosen settings to pipeline.json and rebuild the model's artifacts")
+    args = parser.parse_args()
+
+    model_dir = Path(args.model).resolve()
+    config = load_config(model_dir)
+    max_disparity = args.max_disparity if args.max_disparity is not None else \
+        config['fairness']['minTargetDisparity']
+    # Algorithm 1 holds every candidate's thresholded gap under its tolerance, so that axis barely separates them
+    metric = args.metric or (config['fairness']['metric'] if config['fairness']['metric'] in METRICS
+                             else 'equalized_odds')
+    previous = os.getcwd()
+    os.chdir(model_dir)
+    try:
+        if not Path('dataset_encoded.csv').exists():
+            raise SystemExit("dataset_encoded.csv is missing; run main.py first")
+        drops = [d.split(',') for d in args.drop]
+        if not args.aware_only:
+            drops.insert(0, [config['protectedAttribute']])
+        paths = grid(config, [None if w == 'none' else w for w in args.class_weight], args.solver, drops)
+
+        print(f"\n Sweeping {len(paths) * len(args.C)} candidates ({len(paths)} paths x {len(args.C)} C values) "
+              f"on {args.workers} workers...")
+        start = time.perf_counter()
+        candidates = run_sweep(config, paths, args.C, args.workers, warm_start=not args.cold)
+        elapsed = time.perf_counter() - start
+
+        disparity = disparity_of(metric)
+        frontier = pareto_frontier(candidates, disparity)
+        chosen, within_budget = choose(frontier, disparity, max_disparity)
+        print_frontier(frontier, disparity, chosen, metric)
+        print(f"\n {len(candidates)} candidates in {elapsed:.1f}s "
+              f"({sum(c.fitSeconds for c in candidates):.1f}s of fitting)")
+        if within_budget:
+            print(f" Chosen (most accurate with {metric} gap <= {max_disparity}): {chosen.id}")
+        else:
+            print(f" No candidate has a {metric} gap <= {max_disparity} (smallest: {disparity(frontier[0]):.4f})")
+            print(f" Chosen (fallback: the fairest frontier point, whatever its accuracy): {chosen.id}")
+
+        write_json(SWEEP_REPORT, {
+            'metric': metric,
+            'maxDisparity': max_disparity,
+            'warmStart': not args.cold,
+            'seconds': elapsed,
+            'chosen': chosen.id,
+            # False when no candidate met maxDisparity and the fairest frontier point was taken instead
+            'withinBudget': within_budget,
+            'frontier': [c.id for c in frontier],
+            'candidates': [asdict(c) for c in sorted(candidates, key=lambda c: c.id)],
+        })
+        print(f" Saved: {SWEEP_REPORT}")
+    finally:
+        os.chdir(previous)
+
+    if args.apply:
+        model = {**DEFAULT_MODEL, **chosen.model}
+        apply_model(model_dir, model)
+        print(f"\n Wrote \"model\": {json.dumps(model)} to {model_dir / CONFIG_FILE}; rebuilding...\n")
+        build_model(model_dir, summary=False)
+        with open(model_dir / FAIRNESS_METRICS) as f:
+            metrics = json.load(f)
+        # The pipeline refits without a warm start, so the numbers can move slightly
+        print(f"\n Rebuilt: threshold accuracy {metrics['thresholdAccuracy']:.4f} "
+              f"(sweep {chosen.thresholdAccuracy:.4f}), gap {metrics['thresholdGap']:.4f} "
+              f"(sweep {chosen.thresholdGap:.4f})")
+
+
+if __name__ == '__main__':
+    main()
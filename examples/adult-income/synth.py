@@ -0,0 +1,315 @@
+"""Synthetic datasets of any size in the schema and encoding of dataset_encoded.csv.
+
+Learns a small generative model from a model directory's encoded dataset and
+streams out as many rows as asked for, chunk by chunk, so memory is set by the
+chunk size and not the row count:
+
+- a joint table over protected attribute x label x a few strong features
+  (the ones with the highest mutual information with the label, binned into
+  quantiles). This keeps the group base rates and the main
+  feature/label/group interactions;
+- every other feature is drawn from its distribution within the row's
+  (protected attribute, label) cell, and each strong feature's exact value
+  from its distribution within the row's joint cell.
+
+Every value is one that occurs in the source column, so the output is valid
+input for training, commitment (commitment.py), sharding (shards.py) and the
+circuit emulator.
+
+Chunk i is drawn from its own generator, seeded from (seed, i), so a file is
+reproducible for a given seed, chunk size and model, whatever the number of
+workers.
+
+`--bias` sets the demographic parity gap of the labels,
+P(label=1 | group 1) - P(label=1 | group 0). The overall positive rate and the
+group sizes stay as learned. Within each (group, label) cell the other
+features keep their distribution, so a model trained on the output inherits a
+gap of about that size.
+
+    uv run synth.py --rows 1000000                              # .build/synth/dataset_encoded_1000000.csv
+    uv run synth.py --rows 100000000 --workers 8 --out /data/adult_100m.csv
+    uv run synth.py --rows 5000000 --bias 0.3 --seed 7          # label gap 0.30 instead of adult-income's 0.20
+    uv run synth.py --model ../heart-disease --rows 1000000 --key-features 3
+"""
+import argparse
+import dataclasses
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from pathlib import Path
+
+import numpy as np
+
+from build import BUILD_DIR, replace_if_changed, write_json
+from main import MODEL_DIR, load_config
+
+SYNTH_DIR = BUILD_DIR / 'synth'
+CHUNK_ROWS = 200_000
+
+
+class Conditional:
+    """Empirical distribution of one column given a small integer code.
+
+    All codes' CDFs live in one array, shifted by their code, so sampling any
+    mix of codes is a single searchsorted: code + u (u in [0, 1)) lands in
+    that code's [code, code + 1) segment.
+    """
+
+    def __init__(self, codes, values, n_codes: int):
+        order = np.lexsort((values, codes))
+        codes, values = codes[order], values[order]
+        pairs, counts = np.unique(np.stack([codes, values]), axis=1, return_counts=True)
+        self.values = pairs[1]
+        starts = np.searchsorted(pairs[0], np.arange(n_codes + 1))
+        cdf = np.empty(len(counts))
+        for code, (a, b) in enumerate(zip(starts[:-1], starts[1:])):
+            if b > a:
+                c = np.cumsum(counts[a:b], dtype=np.float64)
+                cdf[a:b] = code + c / c[-1]
+                cdf[b - 1] = code + 1.0
+        self.cdf = cdf
+
+    def sample(self, codes, rng) -> np.ndarray:
+        return self.values[np.searchsorted(self.cdf, codes + rng.random(len(codes)), side='right')]
+
+
+def quantile_bins(values, n_bins: int) -> np.ndarray:
+    """Upper bin edges of a column: each distinct value if there are few, else quantiles."""
+    distinct = np.unique(values)
+    if len(distinct) <= n_bins:
+        return distinct[:-1]
+    # Repeated quantiles (e.g. capital.gain, mostly 0) collapse into one edge
+    return np.unique(np.quantile(values, np.linspace(0, 1, n_bins + 1)[1:-1]))
+
+
+def to_bins(edges, values) -> np.ndarray:
+    # Bin k holds edges[k - 1] < v <= edges[k]
+    return np.searchsorted(edges, values, side='left')
+
+
+def mutual_information(x_bins, y) -> float:
+    joint = np.bincount(x_bins * 2 + y, minlength=(x_bins.max() + 1) * 2).reshape(-1, 2) / len(y)
+    px, py = joint.sum(1, keepdims=True), joint.sum(0, keepdims=True)
+    nz = joint > 0
+    return float((joint[nz] * np.log(joint[nz] / (px @ py)[nz])).sum())
+
+
+@dataclass
+class SynthModel:
+    columns: list[str]
+    protected: str
+    target: str
+    groups: np.ndarray  # protected attribute values, sorted
+    key_features: list[str]
+    key_edges: list[np.ndarray]
+    cells: np.ndarray  # (n_cells, 2 + len(key_features)): group index, label, key bins
+    cell_p: np.ndarray
+    key_values: dict  # feature -> Conditional on the cell
+    other_values: dict  # feature -> Conditional on group index * 2 + label
+    source_rows: int
+
+    def base_rates(self) -> dict:
+        rates = {}
+        for i, g in enumerate(self.groups):
+            in_group = self.cells[:, 0] == i
+            rates[int(g)] = float(self.cell_p[in_group & (self.cells[:, 1] == 1)].sum() / self.cell_p[in_group].sum())
+        return rates
+
+
+def learn(data, protected: str, target: str, n_key: int = 2, n_bins: int = 8,
+          key_features: list[str] | None = None) -> SynthModel:
+    """Fit the generative model to an encoded DataFrame."""
+    y = data[target].to_numpy(dtype=np.int64)
+    if not np.isin(y, (0, 1)).all():
+        raise ValueError(f"{target} must be a 0/1 label")
+    groups, g = np.unique(data[protected].to_numpy(dtype=np.int64), return_inverse=True)
+    features = [c for c in data.columns if c not in (target, protected)]
+
+    columns = {c: data[c].to_numpy(dtype=np.int64) for c in features}
+    edges = {c: quantile_bins(v, n_bins) for c, v in columns.items()}
+    if key_features is None:
+        score = {c: mutual_information(to_bins(edges[c], v), y) for c, v in columns.items()}
+        key_features = sorted(score, key=score.get, reverse=True)[:n_key]
+
+    # Joint cell of every source row: group, label, bin of each key feature
+    parts = [g, y] + [to_bins(edges[c], columns[c]) for c in key_features]
+    cells, cell_of_row, counts = np.unique(np.stack(parts, axis=1), axis=0, return_inverse=True,
+                                           return_counts=True)
+    cell_of_row = cell_of_row.reshape(-1)
+    class_of_row = g * 2 + y
+    return SynthModel(
+        columns=list(data.columns), protected=protected, target=target, groups=groups,
+        key_features=list(key_features), key_edges=[edges[c] for c in key_features],
+        cells=cells, cell_p=counts / counts.sum(),
+        key_values={c: Conditional(cell_of_row, columns[c], len(cells)) for c in key_features},
+        other_values={c: Conditional(class_of_row, columns[c], len(groups) * 2)
+                      for c in features if c not in key_features},
+        source_rows=len(data),
+    )
+
+
+def inject_bias(model: SynthModel, bias: float) -> SynthModel:
+    """Reweight the joint so that P(y=1 | group 1) - P(y=1 | group 0) == bias.
+
+    The overall positive rate, the group sizes and the distribution of the key
+    bins within each (group, label) cell are kept.
+    """
+    if len(model.groups) != 2:
+        raise ValueError(f"--bias needs a binary protected attribute, {model.protected} has {len(model.groups)} values")
+    group, label = model.cells[:, 0], model.cells[:, 1]
+    size = np.array([model.cell_p[group == i].sum() for i in (0, 1)])
+    positive = model.cell_p[label == 1].sum()
+    rates = np.array([positive - size[1] * bias, positive + size[0] * bias])
+    if (rates < 0).any() or (rates > 1).any():
+        low = max(-positive / size[0], (positive - 1) / size[1])
+        high = min(positive / size[1], (1 - positive) / size[0])
+        raise ValueError(f"bias {bias} is not reachable with a positive rate of {positive:.3f}; "
+                         f"use a value in [{low:.3f}, {high:.3f}]")
+    p = model.cell_p.copy()
+    for i in (0, 1):
+        for y, target in ((1, rates[i]), (0, 1 - rates[i])):
+            cell = (group == i) & (label == y)
+            if not cell.any():
+                raise ValueError(f"no source rows with {model.protected}={model.groups[i]} and label {y}")
+            p[cell] *= size[i] * target / p[cell].sum()
+    return dataclasses.replace(model, cell_p=p / p.sum())
+
+
+def sample(model: SynthModel, rows: int, rng) -> np.ndarray:
+    """`rows` synthetic rows, columns in `model.columns` order."""
+    cdf = np.cumsum(model.cell_p)
+    cell = np.minimum(np.searchsorted(cdf / cdf[-1], rng.random(rows), side='right'), len(cdf) - 1)
+    group, label = model.cells[cell, 0], model.cells[cell, 1]
+    out = np.empty((rows, len(model.columns)), dtype=np.int64)
+    for j, column in enumerate(model.columns):
+        if column == model.target:
+            out[:, j] = label
+        elif column == model.protected:
+            out[:, j] = model.groups[group]
+        elif column in model.key_values:
+            out[:, j] = model.key_values[column].sample(cell, rng)
+        else:
+            out[:, j] = model.other_values[column].sample(group * 2 + label, rng)
+    return out
+
+
+# The model a worker samples from, installed once per process
+_model = None
+
+
+def _install(model):
+    global _model
+    _model = model
+
+
+def _chunk(seed: int, index: int, rows: int) -> tuple[str, np.ndarray]:
+    """CSV text of chunk `index` plus its (group, label) counts."""
+    rng = np.random.default_rng([seed, index])
+    data = sample(_model, rows, rng)
+    fmt = ','.join(['%d'] * data.shape[1]) + '\n'
+    g = np.searchsorted(_model.groups, data[:, _model.columns.index(_model.protected)])
+    counts = np.bincount(g * 2 + data[:, _model.columns.index(_model.target)], minlength=len(_model.groups) * 2)
+    return (fmt * rows) % tuple(data.ravel().tolist()), counts
+
+
+def generate(model: SynthModel, path, rows: int, seed: int = 0, chunk_rows: int = CHUNK_ROWS,
+             workers: int = 1) -> dict:
+    """Stream `rows` rows to `path` (replaced only if the contents changed); returns statistics."""
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(path.name + '.tmp')
+    sizes = [min(chunk_rows, rows - start) for start in range(0, rows, chunk_rows)]
+    counts = np.zeros(len(model.groups) * 2, dtype=np.int64)
+    start = time.perf_counter()
+    try:
+        with open(tmp, 'w') as out:
+            out.write(','.join(model.columns) + '\n')
+            if workers <= 1:
+                _install(model)
+                for i, n in enumerate(sizes):
+                    text, c = _chunk(seed, i, n)
+                    out.write(text)
+                    counts += c
+            else:
+                with ProcessPoolExecutor(max_workers=workers, initializer=_install, initargs=(model,)) as pool:
+                    # At most two chunks per worker in flight, so memory stays bounded
+                    pending = {}
+                    for i, n in enumerate(sizes):
+                        pending[i] = pool.submit(_chunk, seed, i, n)
+                        if len(pending) >= 2 * workers:
+                            text, c = pending.pop(min(pending)).result()
+                            out.write(text)
+                            counts += c
+                    for i in sorted(pending):
+                        text, c = pending.pop(i).result()
+                        out.write(text)
+                        counts += c
+    except BaseException:
+        if tmp.exists():
+            os.remove(tmp)
+        raise
+    seconds = time.perf_counter() - start
+    replace_if_changed(tmp, path)
+
+    counts = counts.reshape(-1, 2)
+    return {
+        'rows': rows,
+        'seed': seed,
+        'chunkRows': chunk_rows,
+        'seconds': seconds,
+        'groupRows': {int(g): int(c.sum()) for g, c in zip(model.groups, counts)},
+        'groupBaseRates': {int(g): float(c[1] / c.sum()) if c.sum() else None for g, c in zip(model.groups, counts)},
+    }
+
+
+def main():
+    import pandas as pd
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--model', default=str(MODEL_DIR), help="model directory whose dataset_encoded.csv is learned")
+    parser.add_argument('--source', default='dataset_encoded.csv', help="encoded dataset to learn from")
+    parser.add_argument('--rows', type=int, required=True)
+    parser.add_argument('--out', help="output CSV (default .build/synth/dataset_encoded_<rows>.csv in the model directory)")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--bias', type=float, default=None,
+                        help="label base rate of group 1 minus group 0 (default: as learned)")
+    parser.add_argument('--key-features', type=int, default=2,
+                        help="strongest features kept jointly with the protected attribute and label")
+    parser.add_argument('--key-feature', action='append', dest='key_names', metavar='NAME',
+                        help="use this feature as a key feature instead of picking by mutual information (repeatable)")
+    parser.add_argument('--bins', type=int, default=8, help="quantile bins per key feature in the joint table")
+    parser.add_argument('--chunk-rows', type=int, default=CHUNK_ROWS, help="rows per chunk (sets the memory bound)")
+    parser.add_argument('--workers', type=int, default=os.cpu_count(), help="sampling processes")
+    args = parser.parse_args()
+
+    model_dir = Path(args.model).resolve()
+    config = load_config(model_dir)
+    source = model_dir / args.source
+    out = Path(args.out) if args.out else model_dir / SYNTH_DIR / f'dataset_encoded_{args.rows}.csv'
+
+    data = pd.read_csv(source)
+    model = learn(data, config['protectedAttribute'], config['target']['column'], args.key_features, args.bins,
+                  args.key_names)
+    learned = model.base_rates()
+    if args.bias is not None:
+        model = inject_bias(model, args.bias)
+    print(f"\n Learned from {source.name} ({model.source_rows} rows): {len(model.cells)} joint cells over "
+          f"{model.protected} x {model.target} x {model.key_features}")
+    print(f"    Base rates by {model.protected}: learned {_rates(learned)}, generating {_rates(model.base_rates())}")
+
+    print(f"\n Writing {args.rows:,} rows to {out} ({args.workers} workers, {args.chunk_rows:,} rows per chunk)...")
+    stats = generate(model, out, args.rows, args.seed, args.chunk_rows, args.workers)
+    stats.update(source=str(source), bias=args.bias, keyFeatures=model.key_features, bins=args.bins,
+                 learnedBaseRates={int(g): r for g, r in learned.items()})
+    write_json(out.with_suffix('.json'), stats)
+    print(f"    {stats['rows'] / stats['seconds']:,.0f} rows/s, base rates {_rates(stats['groupBaseRates'])}")
+    print(f" Saved: {out} and {out.with_suffix('.json').name}")
+
+
+def _rates(rates: dict) -> str:
+    return ', '.join(f"{g}: {r:.4f}" for g, r in rates.items() if r is not None)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,119 @@
+"""build.py: which stages a Pipeline reruns, and that unchanged artifacts are not rewritten."""
+from pathlib import Path
+
+import pytest
+
+from build import Pipeline, Stage, write_bytes, write_json
+
+# Number of times each stage's run function was called
+calls = {}
+
+
+def shout(params):
+    calls['shout'] = calls.get('shout', 0) + 1
+    with open('input.txt') as f:
+        text = f.read()
+    write_bytes('loud.txt', (text.upper() * params['times']).encode())
+
+
+def count(params):
+    calls['count'] = calls.get('count', 0) + 1
+    with open('loud.txt') as f:
+        write_json('count.json', {'chars': len(f.read())})
+
+
+def pipeline(times=1, workers=1):
+    return Pipeline([
+        Stage('shout', shout, inputs=['input.txt'], outputs=['loud.txt'], params={'times': times},
+              options={'workers': workers}),
+        Stage('count', count, inputs=['loud.txt'], outputs=['count.json']),
+    ], manifest_path='.build/manifest.json')
+
+
+def mtimes(*paths):
+    return [Path(p).stat().st_mtime_ns for p in paths]
+
+
+@pytest.fixture(autouse=True)
+def workdir(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / 'input.txt').write_text('abc')
+    calls.clear()
+    return tmp_path
+
+
+def test_second_run_builds_nothing():
+    assert pipeline().run() == ['shout', 'count']
+    before = mtimes('loud.txt', 'count.json')
+
+    assert pipeline().run() == []
+    assert calls == {'shout': 1, 'count': 1}
+    assert mtimes('loud.txt', 'count.json') == before
+
+
+def test_unchanged_output_keeps_downstream_fresh(workdir):
+    pipeline().run()
+    before = mtimes('loud.txt')
+
+    # Different input, same output: shout reruns but leaves loud.txt alone, so count stays fresh
+    (workdir / 'input.txt').write_text('ABC')
+    assert pipeline().run() == ['shout']
+    assert mtimes('loud.txt') == before
+
+
+def test_changed_input_reruns_downstream(workdir):
+    pipeline().run()
+    (workdir / 'input.txt').write_text('abcd')
+
+    assert pipeline().run() == ['shout', 'count']
+    assert (workdir / 'count.json').read_text() == '{\n  "chars": 4\n}'
+
+
+def test_params_are_part_of_the_key_options_are_not():
+    pipeline().run()
+    assert pipeline(workers=8).run() == []
+    assert pipeline(times=2).run() == ['shout', 'count']
+
+
+def test_missing_or_edited_output_reruns_its_stage(workdir):
+    pipeline().run()
+    (workdir / 'count.json').unlink()
+    assert pipeline().run() == ['count']
+
+    (workdir / 'loud.txt').write_text('edited by hand')
+    assert pipeline().run() == ['shout']
+    assert (workdir / 'loud.txt').read_text() == 'ABC'
+
+
+def test_force_reruns_everything_without_rewriting():
+    pipeline().run()
+    before = mtimes('loud.txt', 'count.json')
+
+    assert pipeline().run(force=True) == ['shout', 'count']
+    assert mtimes('loud.txt', 'count.json') == before
+
+
+def test_dry_run_reports_downstream_stale_without_building(workdir):
+    pipeline().run()
+    (workdir / 'input.txt').write_text('xyz')
+
+    assert pipeline().run(dry_run=True) == ['shout', 'count']
+    assert calls == {'shout': 1, 'count': 1}
+    assert (workdir / 'loud.txt').read_text() == 'ABC'
+
+
+def test_missing_input_is_an_error(workdir):
+    (workdir / 'input.txt').unlink()
+    with pytest.raises(FileNotFoundError, match="'shout' is missing inputs: input.txt"):
+        pipeline().run()
+
+
+def test_write_bytes_only_writes_changes(workdir):
+    path = workdir / 'out.bin'
+    assert write_bytes(path, b'data')
+    before = mtimes(path)
+
+    assert not write_bytes(path, b'data')
+    assert mtimes(path) == before
+    assert write_bytes(path, b'other')
+    assert path.read_bytes() == b'other'
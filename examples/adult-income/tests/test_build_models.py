@@ -0,0 +1,47 @@
+"""Smoke test: every registered example (../*/pipeline.json) builds end to end.
+
+Each model is built from a copy of its pipeline.json and dataset, so the test
+neither reuses the example's .build cache nor rewrites its artifacts.
+"""
+import json
+import shutil
+
+import pytest
+
+from build_models import build_models, discover
+from circuit_emulator import threshold_fields
+from main import CONFIG_FILE, load_config
+
+EXAMPLES = discover()
+
+
+@pytest.fixture(scope='module')
+def built(tmp_path_factory):
+    root = tmp_path_factory.mktemp('examples')
+    copies = []
+    for model_dir in EXAMPLES:
+        copy = root / model_dir.name
+        copy.mkdir()
+        for name in (CONFIG_FILE, load_config(model_dir)['dataset']):
+            shutil.copy(model_dir / name, copy / name)
+        copies.append(copy)
+    return dict(zip((d.name for d in EXAMPLES), zip(copies, build_models(copies))))
+
+
+def test_every_example_is_registered():
+    assert {'adult-income', 'heart-disease', 'student-performance'} <= {d.name for d in EXAMPLES}
+
+
+@pytest.mark.parametrize('name', [d.name for d in EXAMPLES])
+def test_example_builds(built, name):
+    model_dir, result = built[name]
+    assert 'error' not in result, result.get('error')
+    for artifact in ('weights.bin', 'model.onnx', 'model.ort', 'fairness_threshold.json', 'model.zkfb'):
+        assert (model_dir / artifact).is_file(), artifact
+
+    with open(model_dir / 'fairness_threshold.json') as f:
+        config = json.load(f)
+    # Signed integers (negative logit thresholds included) that encode as circuit fields
+    thresholds = config['thresholds']
+    assert all(isinstance(thresholds[g], int) for g in ('group_a', 'group_b'))
+    assert all(0 <= field < 1 << 253 for field in threshold_fields(thresholds))
@@ -0,0 +1,108 @@
+"""bundle.py: what write_bundle packs, read_bundle gives back, and a threshold-only rewrite."""
+import json
+
+import numpy as np
+import pytest
+
+from build import hash_file
+from bundle import read_bundle, write_bundle
+
+COLUMNS = ['age', 'sex', 'income']
+ROWS = np.array([[90, 0, 0], [38, 1, 1], [52, 1, 0], [2_000_000, 0, 1], [17, 1, 0]])
+WEIGHTS = np.array([0.5, -1.25, 0.75], dtype='<f4')
+FAIRNESS = {'metric': 'demographic_parity', 'targetDisparity': 0.1, 'protectedAttribute': 'sex',
+            'protectedAttributeIndex': 1, 'thresholds': {'group_a': 5000, 'group_b': -10597}}
+
+
+def _csv(path, rows):
+    path.write_text(','.join(COLUMNS) + '\n' + ''.join(','.join(map(str, r)) + '\n' for r in rows))
+    return path
+
+
+@pytest.fixture
+def sources(tmp_path):
+    WEIGHTS.tofile(tmp_path / 'weights.bin')
+    (tmp_path / 'fairness_threshold.json').write_text(json.dumps(FAIRNESS, indent=2))
+    (tmp_path / 'label_encoders.json').write_text(json.dumps({'sex': {'Female': 0, 'Male': 1}}))
+    return {
+        'weights_path': tmp_path / 'weights.bin',
+        'dataset_path': _csv(tmp_path / 'dataset.csv', ROWS),
+        'fairness_path': tmp_path / 'fairness_threshold.json',
+        'encoders_path': tmp_path / 'label_encoders.json',
+        'calibration_path': _csv(tmp_path / 'calibration.csv', ROWS[:2]),
+        'extra': {'weightsHash': None, 'thresholdScale': 10000},
+    }
+
+
+def _retune(sources, **thresholds):
+    sources['fairness_path'].write_text(json.dumps({**FAIRNESS, 'thresholds': thresholds}, indent=2))
+
+
+def test_round_trip(tmp_path, sources):
+    path = tmp_path / 'model.zkfb'
+    written = write_bundle(path, **sources)
+    bundle = read_bundle(path)
+
+    assert bundle.header == written
+    assert bundle.columns == COLUMNS
+    assert bundle.header['fairness'] == FAIRNESS
+    assert bundle.header['labelEncoders'] == {'sex': {'Female': 0, 'Male': 1}}
+    assert bundle.header['thresholdScale'] == 10000
+    assert bundle.weights.tolist() == WEIGHTS.tolist()
+    assert bundle.rows().tolist() == ROWS.tolist()
+    assert bundle.rows('calibration').tolist() == ROWS[:2].tolist()
+    assert bundle.column('sex').tolist() == [0, 1, 1, 0, 1]
+    assert bundle.header['sourceHashes'] == {'weights': hash_file(sources['weights_path']),
+                                             'dataset': hash_file(sources['dataset_path']),
+                                             'calibration': hash_file(sources['calibration_path'])}
+    # 64-byte aligned sections, the fairness config last
+    offsets = [s['offset'] for s in bundle.header['sections'].values()]
+    assert offsets == sorted(offsets) and all(o % 64 == 0 for o in offsets)
+
+
+def test_rewrite_with_same_inputs_leaves_file(tmp_path, sources):
+    path = tmp_path / 'model.zkfb'
+    write_bundle(path, **sources)
+    mtime = path.stat().st_mtime_ns
+
+    write_bundle(path, **sources)
+    assert path.stat().st_mtime_ns == mtime
+
+
+def test_threshold_change_only_rewrites_fairness(tmp_path, sources):
+    path, fresh = tmp_path / 'model.zkfb', tmp_path / 'fresh.zkfb'
+    write_bundle(path, **sources)
+    before = path.read_bytes()
+    inode = path.stat().st_ino
+
+    _retune(sources, group_a=123456, group_b=-7)
+    write_bundle(path, **sources)
+    write_bundle(fresh, **sources)
+
+    # Patched in place, and the same bytes a full write produces
+    assert path.stat().st_ino == inode
+    assert path.read_bytes() == fresh.read_bytes()
+    offset = read_bundle(path).header['sections']['fairness']['offset']
+    assert path.read_bytes()[:offset] == before[:offset]
+    assert read_bundle(path).header['fairness']['thresholds'] == {'group_a': 123456, 'group_b': -7}
+
+    # A shorter config truncates the tail
+    _retune(sources, group_a=1, group_b=2)
+    write_bundle(path, **sources)
+    write_bundle(fresh, **sources)
+    assert path.read_bytes() == fresh.read_bytes()
+
+
+def test_data_change_repacks(tmp_path, sources):
+    path = tmp_path / 'model.zkfb'
+    write_bundle(path, **sources)
+
+    _csv(sources['dataset_path'], ROWS[::-1])
+    write_bundle(path, **sources)
+    assert read_bundle(path).rows().tolist() == ROWS[::-1].tolist()
+
+
+def test_rejects_mismatched_columns(tmp_path, sources):
+    sources['calibration_path'].write_text('age,income\n1,0\n')
+    with pytest.raises(ValueError, match='does not have the columns'):
+        write_bundle(tmp_path / 'model.zkfb', **sources)
@@ -0,0 +1,115 @@
+"""encoding.py: LabelEncoder-compatible codes, frozen vocabularies and the unseen-category policies."""
+import json
+
+import pandas as pd
+import pytest
+from sklearn.preprocessing import LabelEncoder
+
+from encoding import UnseenCategoryError, build_vocabulary, encode_csv, load_vocabulary
+
+RAW = """age,sex,race,oldpeak,income
+39,Male,White,1.25,<=50K
+50,Female,Black,0.5,>50K
+38,Male,Asian-Pac-Islander,2.0,>50K
+53,Female,White,0,<=50K
+"""
+# Same columns; no Female rows, and a race the vocabulary above has never seen
+NEW = """age,sex,race,oldpeak,income
+28,Male,White,1.0,>50K
+37,Male,Other,0.25,<=50K
+49,Male,Black,3.5,>50K
+"""
+CATEGORICAL = ['sex', 'race']
+
+
+@pytest.fixture
+def raw(tmp_path):
+    (tmp_path / 'raw.csv').write_text(RAW)
+    (tmp_path / 'new.csv').write_text(NEW)
+    return tmp_path
+
+
+def encode(src, dst, vocab, **kwargs):
+    stats = encode_csv(src, dst, vocab, 'income', '>50K', **kwargs)
+    return stats, pd.read_csv(dst)
+
+
+def test_vocabulary_matches_label_encoder(raw):
+    vocab = build_vocabulary(raw / 'raw.csv', CATEGORICAL, 'income', chunk_size=1)
+    df = pd.read_csv(raw / 'raw.csv')
+    for col in CATEGORICAL:
+        classes = LabelEncoder().fit(df[col]).classes_
+        assert vocab[col] == {cls: i for i, cls in enumerate(classes)}
+
+
+def test_encodes_like_fit_transform(raw):
+    vocab = build_vocabulary(raw / 'raw.csv', CATEGORICAL, 'income')
+    stats, encoded = encode(raw / 'raw.csv', raw / 'out.csv', vocab, fixed_point={'oldpeak': 10})
+
+    df = pd.read_csv(raw / 'raw.csv')
+    for col in CATEGORICAL:
+        assert encoded[col].tolist() == LabelEncoder().fit_transform(df[col]).tolist()
+    assert encoded['oldpeak'].tolist() == [12, 5, 20, 0]
+    # The label is binarised and moved to the last column
+    assert list(encoded.columns) == ['age', 'sex', 'race', 'oldpeak', 'income']
+    assert encoded['income'].tolist() == [0, 1, 1, 0]
+    assert stats == {'rows': 4, 'written': 4, 'dropped': 0, 'unseen': {}}
+
+
+def test_chunked_output_is_byte_identical(raw):
+    vocab = build_vocabulary(raw / 'raw.csv', CATEGORICAL, 'income')
+    encode(raw / 'raw.csv', raw / 'whole.csv', vocab, chunk_size=None, small_path=raw / 'whole_small.csv',
+           small_rows=3)
+    encode(raw / 'raw.csv', raw / 'chunks.csv', vocab, chunk_size=1, small_path=raw / 'chunks_small.csv',
+           small_rows=3)
+
+    assert (raw / 'whole.csv').read_bytes() == (raw / 'chunks.csv').read_bytes()
+    assert (raw / 'whole_small.csv').read_bytes() == (raw / 'chunks_small.csv').read_bytes()
+    assert len(pd.read_csv(raw / 'chunks_small.csv')) == 3
+
+
+def test_frozen_vocabulary_keeps_codes(raw):
+    fitted = build_vocabulary(raw / 'raw.csv', CATEGORICAL, 'income')
+    (raw / 'label_encoders.json').write_text(json.dumps(fitted, indent=2))
+    frozen = load_vocabulary(raw / 'label_encoders.json')
+    assert frozen == fitted
+
+    _, encoded = encode(raw / 'new.csv', raw / 'out.csv', frozen, on_unseen='other')
+    # Male keeps code 1 although the new data has no Female rows (refitting would make it 0)
+    assert encoded['sex'].tolist() == [1, 1, 1]
+    assert build_vocabulary(raw / 'new.csv', CATEGORICAL, 'income')['sex'] == {'Male': 0}
+    assert encoded['race'].tolist() == [fitted['race']['White'], len(fitted['race']), fitted['race']['Black']]
+
+
+def test_unseen_category_error(raw):
+    vocab = build_vocabulary(raw / 'raw.csv', CATEGORICAL, 'income')
+    with pytest.raises(UnseenCategoryError, match="Column 'race' has category 'Other'"):
+        encode(raw / 'new.csv', raw / 'out.csv', vocab, chunk_size=1)
+    assert not (raw / 'out.csv').exists()
+    assert not (raw / 'out.csv.tmp').exists()
+
+
+def test_unseen_category_drop(raw):
+    vocab = build_vocabulary(raw / 'raw.csv', CATEGORICAL, 'income')
+    stats, encoded = encode(raw / 'new.csv', raw / 'out.csv', vocab, chunk_size=2, on_unseen='drop')
+
+    assert encoded['age'].tolist() == [28, 49]
+    assert stats == {'rows': 3, 'written': 2, 'dropped': 1, 'unseen': {'race': 1}}
+
+
+@pytest.mark.parametrize('chunk_size', [None, 1])
+@pytest.mark.parametrize('small_rows', [0, 10])
+def test_all_rows_dropped(raw, chunk_size, small_rows):
+    vocab = {'sex': {'Female': 0}, 'race': {'White': 0}}
+    stats, encoded = encode(raw / 'new.csv', raw / 'out.csv', vocab, chunk_size=chunk_size, on_unseen='drop',
+                            small_path=raw / 'small.csv', small_rows=small_rows)
+
+    assert stats['written'] == 0 and stats['dropped'] == 3
+    # Header-only CSVs, not a crash
+    assert encoded.empty and list(encoded.columns) == ['age', 'sex', 'race', 'oldpeak', 'income']
+    assert (raw / 'small.csv').read_text() == 'age,sex,race,oldpeak,income\n'
+
+
+def test_rejects_unknown_policy(raw):
+    with pytest.raises(ValueError, match='on_unseen must be one of'):
+        encode(raw / 'raw.csv', raw / 'out.csv', {}, on_unseen='ignore')
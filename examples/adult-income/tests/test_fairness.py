@@ -0,0 +1,85 @@
+"""fairness.py: metric values on a hand-checked example and against a per-group loop."""
+import numpy as np
+import pytest
+
+from fairness import confusion_matrices, evaluate, evaluate_all, group_codes
+
+# Group sex=0 holds one TP, TN, FN and FP; sex=1 two TPs, one FP and one TN
+DATA = {'sex': np.array([0, 0, 0, 0, 1, 1, 1, 1]),
+        'race': np.array(['a', 'a', 'b', 'b', 'a', 'b', 'b', 'b'])}
+Y_TRUE = np.array([1, 0, 1, 0, 1, 1, 0, 0])
+Y_PRED = np.array([1, 0, 0, 1, 1, 1, 1, 0])
+
+
+def test_single_attribute():
+    report = evaluate(DATA, Y_TRUE, Y_PRED, ['sex'])
+
+    a, b = report['groups']
+    assert a == {'values': {'sex': 0}, 'count': 4, 'positiveRate': 0.5, 'baseRate': 0.5, 'tpr': 0.5,
+                 'fpr': 0.5, 'accuracy': 0.5}
+    assert b == {'values': {'sex': 1}, 'count': 4, 'positiveRate': 0.75, 'baseRate': 0.5, 'tpr': 1.0,
+                 'fpr': 0.5, 'accuracy': 0.75}
+    assert report['demographicParity'] == 0.25
+    assert report['tprGap'] == 0.5
+    assert report['fprGap'] == 0.0
+    assert report['equalizedOdds'] == 0.5
+
+
+def test_intersection_skips_undefined_rates():
+    report = evaluate(DATA, Y_TRUE, Y_PRED, ['sex', 'race'])
+
+    groups = {(g['values']['sex'], g['values']['race']): g for g in report['groups']}
+    assert groups[0, 'a']['positiveRate'] == 0.5 and groups[0, 'b']['tpr'] == 0.0
+    assert groups[1, 'b']['positiveRate'] == pytest.approx(2 / 3)
+    # sex=1, race=a has no negative labels: its FPR is undefined and left out of the gap
+    assert groups[1, 'a']['fpr'] is None
+    assert report['fprGap'] == 1.0
+    assert report['demographicParity'] == 0.5
+    assert report['equalizedOdds'] == 1.0
+
+
+def test_group_codes_only_code_present_combinations():
+    codes, labels = group_codes({'sex': np.array([0, 1, 1]), 'race': np.array(['a', 'b', 'b'])})
+
+    assert labels == [(0, 'a'), (1, 'b')]
+    assert codes.tolist() == [0, 1, 1]
+
+
+def test_matches_a_per_group_loop():
+    rng = np.random.default_rng(7)
+    n = 5000
+    data = {'sex': rng.integers(0, 2, n), 'race': rng.choice(['w', 'b', 'o'], n, p=[0.7, 0.2, 0.1])}
+    y_true, y_pred = rng.integers(0, 2, n), rng.integers(0, 2, n)
+
+    reports = evaluate_all(data, y_true, y_pred, [['sex'], ['race'], ['sex', 'race']])
+    assert list(reports) == ['sex', 'race', 'sex+race']
+    for report in reports.values():
+        attrs = report['attributes']
+        positive = []
+        for group in report['groups']:
+            rows = np.logical_and.reduce([data[a] == v for a, v in group['values'].items()])
+            t, p = y_true[rows], y_pred[rows]
+            assert group['count'] == rows.sum()
+            assert group['positiveRate'] == pytest.approx(p.mean())
+            assert group['tpr'] == pytest.approx(p[t == 1].mean())
+            assert group['fpr'] == pytest.approx(p[t == 0].mean())
+            assert group['accuracy'] == pytest.approx((t == p).mean())
+            positive.append(p.mean())
+        assert report['demographicParity'] == pytest.approx(max(positive) - min(positive)), attrs
+
+
+def test_bootstrap_intervals_bracket_the_estimate():
+    report = evaluate(DATA, Y_TRUE, Y_PRED, ['sex'], n_boot=500, seed=3)
+
+    assert report['confidence'] == 0.95
+    low, high = report['intervals']['demographicParity']
+    assert 0 <= low <= high <= 1
+    for group in report['groups']:
+        low, high = group['intervals']['positiveRate']
+        assert low <= group['positiveRate'] <= high
+    assert evaluate(DATA, Y_TRUE, Y_PRED, ['sex'], n_boot=500, seed=3) == report
+
+
+def test_rejects_non_binary_predictions():
+    with pytest.raises(ValueError, match='binary'):
+        confusion_matrices(np.zeros(2, dtype=int), [0, 1], [0, 2], 1)
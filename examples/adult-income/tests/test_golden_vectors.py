@@ -0,0 +1,58 @@
+"""Golden vectors shared with packages/sdk/tests and the committed training Prover.toml.
+
+poseidon.py and commitment.py must reproduce the SDK and the circuits bit for bit;
+these are the values they are checked against.
+
+    uv run --with pytest pytest
+"""
+import tomllib
+
+import numpy as np
+import pytest
+
+import poseidon
+from commitment import PROVER_TOML, build_levels, hash_leaves, merkle_proofs, to_hex
+
+
+# packages/sdk/tests/hash.test.ts
+@pytest.mark.parametrize('inputs, expected', [
+    ([1, 2], 0x115cc0f5e7d690413df64c6b9662e9cf2a3617f2743245519e19607a4417189a),
+    ([90, 0, 77053, 11, 9, 6, 0, 1, 4, 0, 0, 4356, 40, 39],
+     0x1d3bd4071f0da9ed47ac1f93087c6ba8160907a8cbad3a35339893e17ff1b470),
+    ([82, 4, 132870, 11, 9, 6, 4, 1, 4, 0, 0, 4356, 18, 39],
+     0x020e7f792d3fc3b059d40bfea45ee7dc363a1565f6484c8593691c7c02d534f1),
+])
+def test_poseidon_matches_sdk(inputs, expected):
+    assert poseidon.poseidon(inputs) == expected
+
+
+@pytest.fixture(scope='module')
+def prover():
+    with open(PROVER_TOML, 'rb') as f:
+        return tomllib.load(f)
+
+
+@pytest.fixture(scope='module')
+def levels(prover):
+    size = int(prover['_dataset_size'])
+    features = np.array(prover['_dataset_features'], dtype=np.int64).reshape(size, -1)
+    rows = np.column_stack([features, np.array(prover['_dataset_labels'], dtype=np.int64)])
+    return build_levels(hash_leaves(rows, [int(s) for s in prover['_dataset_salts']]))
+
+
+def test_weights_hash(prover):
+    weights = [int(w) for w in prover['_model_weights']]
+    assert '0x' + to_hex(poseidon.poseidon(weights)) == prover['_weights_hash']
+
+
+def test_dataset_merkle_root(prover, levels):
+    assert '0x' + to_hex(levels[-1][0]) == prover['_dataset_merkle_root']
+
+
+def test_merkle_proofs(prover, levels):
+    size = int(prover['_dataset_size'])
+    merkle_paths, is_even_flags = merkle_proofs(levels)
+    # fill-prover-toml.ts writes siblings as decimal strings
+    decimal_paths = [[str(int(p, 16)) if p != '0' else '0' for p in path] for path in merkle_paths]
+    assert decimal_paths == prover['_merkle_paths'][:size]
+    assert is_even_flags == prover['_is_even_flags'][:size]
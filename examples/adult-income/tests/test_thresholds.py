@@ -0,0 +1,131 @@
+"""thresholds.py: the sorted sweep against brute force over every pair of thresholds."""
+import itertools
+
+import numpy as np
+import pytest
+
+from thresholds import THRESHOLD_SCALE, _RangeArgmax, optimize_thresholds, quantize_scores
+
+OBJECTIVES = ('demographic_parity', 'equal_opportunity', 'equalized_odds')
+
+
+def dataset(seed, sizes=(14, 9)):
+    """Scores on a coarse grid (so thresholds tie) for groups of the given sizes."""
+    rng = np.random.default_rng(seed)
+    groups = np.repeat(np.arange(len(sizes)), sizes)
+    y = rng.integers(0, 2, len(groups))
+    scores = np.round(np.clip(0.3 * y + rng.normal(0.35 + 0.1 * groups, 0.25), 0, 1), 1)
+    return scores, y, groups
+
+
+def rates(q, y, threshold):
+    """The circuit's integer rates and the correct count for one group at one threshold."""
+    pred = (q >= threshold).astype(np.int64)
+    pos, neg = int(y.sum()), int(len(y) - y.sum())
+    return {
+        'positive_rate': int(pred.sum()) * THRESHOLD_SCALE // len(y),
+        'tpr': int(pred[y == 1].sum()) * THRESHOLD_SCALE // pos if pos else None,
+        'fpr': int(pred[y == 0].sum()) * THRESHOLD_SCALE // neg if neg else None,
+        'correct': int((pred == y).sum()),
+    }
+
+
+def gap(per_group, objective):
+    def spread(key):
+        values = [r[key] for r in per_group if r[key] is not None]
+        return max(values) - min(values) if values else 0
+
+    if objective == 'demographic_parity':
+        return spread('positive_rate')
+    if objective == 'equal_opportunity':
+        return spread('tpr')
+    return max(spread('tpr'), spread('fpr'))
+
+
+def brute_force(scores, y, groups, objective, tolerance):
+    """Best correct count over every combination of per-group thresholds whose gap is within the tolerance."""
+    q = quantize_scores(scores)
+    tol = int(round(tolerance * THRESHOLD_SCALE))
+    members = [groups == g for g in np.unique(groups)]
+    # Every distinct score, plus one above them all (nothing positive)
+    candidates = [np.append(np.unique(q[m]), q[m].max() + 1) for m in members]
+    best = -1
+    for combo in itertools.product(*candidates):
+        per_group = [rates(q[m], y[m], t) for m, t in zip(members, combo)]
+        if gap(per_group, objective) <= tol:
+            best = max(best, sum(r['correct'] for r in per_group))
+    return best
+
+
+def check_result(result, scores, y, groups, objective, tolerance):
+    """The reported thresholds reproduce the reported rates, gap and accuracy, and meet the tolerance."""
+    q = quantize_scores(scores)
+    per_group = [rates(q[groups == g], y[groups == g], t) for g, t in zip(result.groups, result.thresholds_scaled)]
+    assert result.positive_rate == [r['positive_rate'] for r in per_group]
+    assert result.tpr == [r['tpr'] for r in per_group]
+    assert result.fpr == [r['fpr'] for r in per_group]
+    assert result.gap == gap(per_group, objective) <= round(tolerance * THRESHOLD_SCALE)
+    correct = sum(r['correct'] for r in per_group)
+    assert result.accuracy == correct / len(y)
+    return correct
+
+
+@pytest.mark.parametrize('objective', OBJECTIVES)
+@pytest.mark.parametrize('tolerance', [0.0, 0.05, 0.2])
+@pytest.mark.parametrize('seed', range(6))
+def test_two_groups_match_brute_force(seed, tolerance, objective):
+    scores, y, groups = dataset(seed)
+    result = optimize_thresholds(scores, y, groups, objective, tolerance)
+
+    assert check_result(result, scores, y, groups, objective, tolerance) == \
+        brute_force(scores, y, groups, objective, tolerance)
+
+
+@pytest.mark.parametrize('objective', ['demographic_parity', 'equal_opportunity'])
+@pytest.mark.parametrize('seed', range(3))
+def test_three_groups_match_brute_force(seed, objective):
+    scores, y, groups = dataset(seed, sizes=(8, 6, 5))
+    result = optimize_thresholds(scores, y, groups, objective, 0.1)
+
+    assert check_result(result, scores, y, groups, objective, 0.1) == \
+        brute_force(scores, y, groups, objective, 0.1)
+
+
+@pytest.mark.parametrize('seed', range(3))
+def test_three_groups_equalized_odds_is_feasible(seed):
+    # Anchoring on half the tolerance always satisfies it, but is not guaranteed optimal
+    scores, y, groups = dataset(seed, sizes=(8, 6, 5))
+    result = optimize_thresholds(scores, y, groups, 'equalized_odds', 0.1)
+
+    assert check_result(result, scores, y, groups, 'equalized_odds', 0.1) <= \
+        brute_force(scores, y, groups, 'equalized_odds', 0.1)
+
+
+def test_group_without_positives_is_unconstrained_for_tpr():
+    scores = np.array([0.9, 0.2, 0.7, 0.4, 0.6, 0.1])
+    y = np.array([1, 0, 1, 0, 0, 0])
+    groups = np.array(['a', 'a', 'a', 'b', 'b', 'b'])
+    result = optimize_thresholds(scores, y, groups, 'equal_opportunity', 0.0)
+
+    assert result.groups == ['a', 'b']
+    assert result.tpr[1] is None
+    assert check_result(result, scores, y, groups, 'equal_opportunity', 0.0) == 6
+
+
+def test_range_argmax_matches_numpy():
+    rng = np.random.default_rng(0)
+    values = rng.integers(0, 20, 257)
+    lo = rng.integers(0, len(values), 1000)
+    hi = rng.integers(0, len(values), 1000)
+    found = _RangeArgmax(values).query(lo, hi)
+
+    for a, b, i in zip(lo, hi, found):
+        if a > b:
+            assert i == -1
+        else:
+            assert a <= i <= b and values[i] == values[a:b + 1].max()
+
+
+def test_rejects_unknown_objective():
+    with pytest.raises(ValueError, match='objective must be one of'):
+        optimize_thresholds([0.5], [1], [0], 'accuracy')
@@ -0,0 +1,241 @@
+"""Exact per-group decision thresholds by sorted sweep.
+
+For each group the scores are quantised the way the circuit config stores
+thresholds (integers at THRESHOLD_SCALE) and sorted once. A cumulative sum
+then gives the confusion counts at every distinct threshold, so each group is
+described by a curve of candidate thresholds with monotone rates. The
+optimiser picks one candidate per group that maximises accuracy while the
+chosen fairness gap stays within `tolerance`.
+
+Rates are compared as `count * THRESHOLD_SCALE // total`, which is the integer
+arithmetic the circuits use, so the reported gap is the one the proof sees.
+
+Objectives:
+- demographic_parity: positive rates.
+- equal_opportunity: true positive rates.
+- equalized_odds: true and false positive rates.
+
+The first two are exact for any number of groups. The optimal solution has
+its smallest rate at some candidate value, so the optimiser sweeps a window
+[r, r + tolerance] over all candidate rates. Each group takes its best
+candidate inside the window, found with a range-maximum query.
+
+Equalized odds anchors on each candidate of the largest group. The other
+groups must fall within the tolerance of the anchor's TPR and FPR. This is
+exact for two groups. With more groups it uses half the tolerance around the
+anchor, which always satisfies the constraint but may not be optimal.
+"""
+from dataclasses import dataclass
+
+import numpy as np
+
+THRESHOLD_SCALE = 10000  # Same as the circuits
+OBJECTIVES = ('demographic_parity', 'equal_opportunity', 'equalized_odds')
+
+
+@dataclass
+class GroupCurve:
+    thresholds: np.ndarray  # scaled thresholds, descending; prediction is positive iff score * scale >= threshold
+    positive_rate: np.ndarray  # scaled, like the circuit's pos * SCALE / total
+    tpr: np.ndarray | None  # None when the group has no positive labels
+    fpr: np.ndarray | None  # None when the group has no negative labels
+    correct: np.ndarray
+    size: int
+
+
+@dataclass
+class ThresholdResult:
+    objective: str
+    groups: list
+    thresholds_scaled: list[int]
+    positive_rate: list[int]
+    tpr: list[int | None]
+    fpr: list[int | None]
+    gap: int  # scaled; max - min of the objective's rate(s)
+    accuracy: float
+    scale: int = THRESHOLD_SCALE
+
+    @property
+    def thresholds(self) -> list[float]:
+        return [t / self.scale for t in self.thresholds_scaled]
+
+
+def quantize_scores(scores, scale: int = THRESHOLD_SCALE) -> np.ndarray:
+    # score >= q / scale  <=>  ceil(score * scale) >= q  for integer q
+    return np.ceil(np.asarray(scores, dtype=np.float64) * scale).astype(np.int64)
+
+
+def group_curve(q, y, scale: int = THRESHOLD_SCALE) -> GroupCurve:
+    """Confusion counts at every distinct quantised threshold of one group.
+
+    Index 0 is the threshold above every score (nothing positive). Each later
+    index lowers the threshold to the next distinct score, so all rates are
+    non-decreasing along the curve.
+    """
+    values, inverse = np.unique(q, return_inverse=True)
+    per_value_total = np.bincount(inverse, minlength=len(values))[::-1]
+    per_value_pos = np.bincount(inverse, weights=y, minlength=len(values)).astype(np.int64)[::-1]
+    pp = np.concatenate([[0], np.cumsum(per_value_total)])
+    tp = np.concatenate([[0], np.cumsum(per_value_pos)])
+    fp = pp - tp
+
+    n = len(q)
+    positives = int(tp[-1])
+    negatives = n - positives
+    return GroupCurve(
+        thresholds=np.concatenate([[values[-1] + 1], values[::-1]]),
+        positive_rate=pp * scale // n,
+        tpr=tp * scale // positives if positives else None,
+        fpr=fp * scale // negatives if negatives else None,
+        correct=tp + (negatives - fp),
+        size=n,
+    )
+
+
+class _RangeArgmax:
+    """Sparse table answering argmax over index ranges [lo, hi] in O(1), vectorised."""
+
+    def __init__(self, values: np.ndarray):
+        self.values = values
+        self.levels = [np.arange(len(values), dtype=np.int32)]
+        span = 1
+        while 2 * span <= len(values):
+            prev = self.levels[-1]
+            a, b = prev[:-span], prev[span:]
+            self.levels.append(np.where(values[b] > values[a], b, a))
+            span *= 2
+
+    def query(self, lo: np.ndarray, hi: np.ndarray) -> np.ndarray:
+        """Index of the maximum in each [lo, hi] (inclusive), or -1 where the range is empty."""
+        empty = lo > hi
+        lo = np.where(empty, 0, lo)
+        hi = np.where(empty, 0, hi)
+        level = np.frexp((hi - lo + 1).astype(np.float64))[1] - 1
+        out = np.full(len(lo), -1, dtype=np.int64)
+        for j in np.unique(level):
+            sel = level == j
+            a = self.levels[j][lo[sel]]
+            b = self.levels[j][hi[sel] - (1 << int(j)) + 1]
+            out[sel] = np.where(self.values[b] > self.values[a], b, a)
+        out[empty] = -1
+        return out
+
+
+def _band(rate, low, high):
+    """Index range of a non-decreasing curve whose values lie in [low, high]."""
+    return np.searchsorted(rate, low, 'left'), np.searchsorted(rate, high, 'right') - 1
+
+
+def _pick(curves, tables, ranges):
+    # ranges: per group (lo, hi) arrays over the candidate windows; returns (idx per group, total correct)
+    picks = []
+    total = np.zeros(len(ranges[0][0]), dtype=np.int64)
+    feasible = np.ones(len(total), dtype=bool)
+    for curve, table, (lo, hi) in zip(curves, tables, ranges):
+        idx = table.query(lo, hi)
+        feasible &= idx >= 0
+        total += np.where(idx >= 0, curve.correct[np.maximum(idx, 0)], 0)
+        picks.append(idx)
+    return picks, np.where(feasible, total, -1)
+
+
+def _rate(curve, objective):
+    if objective == 'demographic_parity':
+        return curve.positive_rate
+    return curve.tpr
+
+
+def _sweep_1d(curves, tables, objective, tol):
+    rates = [_rate(c, objective) for c in curves]
+    starts = np.unique(np.concatenate([r for r in rates if r is not None] or [[0]]))
+    ranges = []
+    for curve, rate in zip(curves, rates):
+        if rate is None:
+            # Undefined for this group (e.g. TPR without positives): unconstrained
+            ranges.append((np.zeros(len(starts), dtype=np.int64), np.full(len(starts), len(curve.correct) - 1)))
+        else:
+            ranges.append(_band(rate, starts, starts + tol))
+    return _pick(curves, tables, ranges)
+
+
+def _sweep_equalized_odds(curves, tables, tol):
+    defined = [i for i, c in enumerate(curves) if c.tpr is not None and c.fpr is not None]
+    if not defined:
+        raise ValueError("equalized_odds needs a group with both positive and negative labels")
+    ref = max(defined, key=lambda i: curves[i].size)
+    # Within +-tol of the anchor is exactly |gap| <= tol for two groups; with
+    # more groups +-tol/2 keeps every pairwise gap within tol
+    half = tol if len(curves) == 2 else tol // 2
+    anchor = curves[ref]
+    n_anchor = len(anchor.correct)
+    ranges = []
+    for i, curve in enumerate(curves):
+        if i == ref:
+            ranges.append((np.arange(n_anchor), np.arange(n_anchor)))
+            continue
+        lo = np.zeros(n_anchor, dtype=np.int64)
+        hi = np.full(n_anchor, len(curve.correct) - 1)
+        for rate, anchor_rate in ((curve.tpr, anchor.tpr), (curve.fpr, anchor.fpr)):
+            if rate is not None:
+                band_lo, band_hi = _band(rate, anchor_rate - half, anchor_rate + half)
+                lo, hi = np.maximum(lo, band_lo), np.minimum(hi, band_hi)
+        ranges.append((lo, hi))
+    return _pick(curves, tables, ranges)
+
+
+def _spread(values):
+    values = [v for v in values if v is not None]
+    return max(values) - min(values) if values else 0
+
+
+def optimize_thresholds(scores, y_true, groups, objective: str = 'demographic_parity',
+                        tolerance: float = 0.0, scale: int = THRESHOLD_SCALE) -> ThresholdResult:
+    """Most accurate per-group thresholds whose fairness gap is at most `tolerance`.
+
+    `groups` holds any hashable group value per row; the result lists groups in
+    sorted order. `tolerance` is a rate difference (0.01 = one percentage
+    point) and is applied at `scale` resolution.
+    """
+    if objective not in OBJECTIVES:
+        raise ValueError(f"objective must be one of {OBJECTIVES}, got {objective!r}")
+    q = quantize_scores(scores, scale)
+    y = np.asarray(y_true, dtype=np.int64)
+    labels, codes = np.unique(np.asarray(groups), return_inverse=True)
+    codes = codes.reshape(-1)
+
+    # One stable sort by group splits the rows into per-group slices
+    order = np.argsort(codes, kind='stable')
+    bounds = np.searchsorted(codes[order], np.arange(len(labels) + 1))
+    curves = [group_curve(q[order[a:b]], y[order[a:b]], scale) for a, b in zip(bounds[:-1], bounds[1:])]
+    tables = [_RangeArgmax(c.correct) for c in curves]
+
+    tol = int(round(tolerance * scale))
+    if objective == 'equalized_odds':
+        picks, total = _sweep_equalized_odds(curves, tables, tol)
+    else:
+        picks, total = _sweep_1d(curves, tables, objective, tol)
+    # The all-positive candidate is always feasible (every rate is 1), so best >= 0
+    best = int(np.argmax(total))
+    chosen = [int(p[best]) for p in picks]
+
+    positive_rate = [int(c.positive_rate[i]) for c, i in zip(curves, chosen)]
+    tpr = [int(c.tpr[i]) if c.tpr is not None else None for c, i in zip(curves, chosen)]
+    fpr = [int(c.fpr[i]) if c.fpr is not None else None for c, i in zip(curves, chosen)]
+    if objective == 'demographic_parity':
+        gap = _spread(positive_rate)
+    elif objective == 'equal_opportunity':
+        gap = _spread(tpr)
+    else:
+        gap = max(_spread(tpr), _spread(fpr))
+
+    return ThresholdResult(
+        objective=objective,
+        groups=[label.item() for label in labels],
+        thresholds_scaled=[int(c.thresholds[i]) for c, i in zip(curves, chosen)],
+        positive_rate=positive_rate,
+        tpr=tpr,
+        fpr=fpr,
+        gap=gap,
+        accuracy=int(total[best]) / len(q),
+        scale=scale,
+    )
@@ -58,8 +58,9 @@ export function parseFairnessThresholdFile(
 		"thresholds missing",
 	);
 	const t = d.thresholds as Record<string, unknown>;
-	assert(typeof t.group_a === "number", "thresholds.group_a missing");
-	assert(typeof t.group_b === "number", "thresholds.group_b missing");
+	// Signed integers at THRESHOLD_SCALE; negatives are valid logit thresholds
+	assert(Number.isInteger(t.group_a), "thresholds.group_a missing");
+	assert(Number.isInteger(t.group_b), "thresholds.group_b missing");
 
 	const calc = d.calculatedMetrics as Record<string, unknown> | undefined;
 	const calculatedMetrics = calc
@@ -13,7 +13,12 @@ import type { ContractClient } from "./contract";
 import type { AuditRequestedEvent } from "./events";
 import { createMerkleProof, merkleRoot } from "./merkle";
 import { type DrizzleDB, type QueryLog, zkfairQueryLogs } from "./schema";
-import { getArtifactDir, weightsToFields } from "./utils";
+import {
+	getArtifactDir,
+	readWeights,
+	signedToField,
+	weightsToFields,
+} from "./utils";
 
 /**
  * Canonical query record for audit trail
@@ -158,9 +163,8 @@ export class AuditAPI {
 		const paths = parsePathsFile(await pathsFile.json());
 
 		// Load model weights
-		const weightsBuffer = await Bun.file(paths.weights).arrayBuffer();
 		const modelWeightsFields = await weightsToFields(
-			new Float32Array(weightsBuffer),
+			await readWeights(paths.weights),
 		);
 
 		// Load fairness thresholds
@@ -250,8 +254,12 @@ export class AuditAPI {
 			_sample_sensitive_attrs: sampleSensitiveAttrs,
 			_merkle_proofs: circuitMerkleProofs,
 			_merkle_path_indices: circuitPathIndices,
-			_threshold_group_a: String(fairnessConfig.thresholds.group_a),
-			_threshold_group_b: String(fairnessConfig.thresholds.group_b),
+			_threshold_group_a: String(
+				signedToField(fairnessConfig.thresholds.group_a),
+			),
+			_threshold_group_b: String(
+				signedToField(fairnessConfig.thresholds.group_b),
+			),
 			_batch_merkle_root: root.startsWith("0x")
 				? BigInt(root).toString()
 				: BigInt(`0x${root}`).toString(),
@@ -0,0 +1,144 @@
+/**
+ * Reader for the memory-mappable model bundle written by
+ * examples/adult-income/bundle.py (`model.zkfb`).
+ *
+ * Layout: 8-byte magic "ZKFAIRB\0", uint32 version, uint32 header length,
+ * a UTF-8 JSON header, then 64-byte aligned little-endian sections:
+ * float32 `weights` and int32 column-major `dataset`/`calibration` tables
+ * (column c of a table starts at offset + c * stride * 4), and last the
+ * JSON `fairness` config, which runs to the end of the file so that a
+ * threshold change only rewrites the tail. It is parsed into
+ * `header.fairness`; the typed arrays are views over the mapped file,
+ * nothing else is parsed or copied.
+ */
+
+export const BUNDLE_MAGIC = "ZKFAIRB\0";
+export const BUNDLE_VERSION = 2;
+
+export type BundleSection =
+	| { offset: number; dtype: "float32"; shape: [number] }
+	| {
+			offset: number;
+			dtype: "int32";
+			shape: [columns: number, stride: number];
+			rows: number;
+	  }
+	| { offset: number; dtype: "json" };
+
+export interface BundleHeader {
+	columns: string[];
+	label: string;
+	features: number;
+	protectedAttribute: string | null;
+	protectedAttributeIndex: number | null;
+	/** Parsed from the `fairness` section */
+	fairness: Record<string, unknown>;
+	labelEncoders: Record<string, Record<string, number>> | null;
+	/** Source file name of each section */
+	sources?: Record<string, string>;
+	/** SHA-256 (hex) of each section's source file */
+	sourceHashes: Record<string, string>;
+	weightsHash?: `0x${string}` | null;
+	weightScale?: number;
+	thresholdScale?: number;
+	fixedPoint?: Record<string, number>;
+	sections: Record<string, BundleSection>;
+}
+
+export interface Bundle {
+	header: BundleHeader;
+	weights: Float32Array;
+	/** Column `name` of a table as an Int32Array view (length = row count) */
+	column(name: string, table?: string): Int32Array;
+	/** Number of rows of a table */
+	rowCount(table?: string): number;
+	/** Row-major rows (features then label), like parseCSV's output but numeric */
+	rows(table?: string): number[][];
+}
+
+const PREAMBLE_SIZE = 16;
+
+export function isBundle(bytes: Uint8Array): boolean {
+	if (bytes.byteLength < PREAMBLE_SIZE) return false;
+	for (let i = 0; i < BUNDLE_MAGIC.length; i++) {
+		if (bytes[i] !== BUNDLE_MAGIC.charCodeAt(i)) return false;
+	}
+	return true;
+}
+
+export function parseBundle(bytes: Uint8Array): Bundle {
+	if (!isBundle(bytes)) throw new Error("Not a model bundle (bad magic)");
+	const view = new DataView(bytes.buffer, bytes.byteOffset, bytes.byteLength);
+	const version = view.getUint32(8, true);
+	if (version !== BUNDLE_VERSION) {
+		throw new Error(
+			`Bundle version ${version} is not supported (expected ${BUNDLE_VERSION})`,
+		);
+	}
+	const headerLength = view.getUint32(12, true);
+	const header = JSON.parse(
+		new TextDecoder().decode(
+			bytes.subarray(PREAMBLE_SIZE, PREAMBLE_SIZE + headerLength),
+		),
+	) as BundleHeader;
+	const fairnessSection = header.sections.fairness;
+	if (!fairnessSection || fairnessSection.dtype !== "json") {
+		throw new Error("Bundle has no fairness section");
+	}
+	header.fairness = JSON.parse(
+		new TextDecoder().decode(bytes.subarray(fairnessSection.offset)),
+	);
+
+	const weightsSection = header.sections.weights;
+	if (!weightsSection || weightsSection.dtype !== "float32") {
+		throw new Error("Bundle has no float32 weights section");
+	}
+	const weights = new Float32Array(
+		bytes.buffer,
+		bytes.byteOffset + weightsSection.offset,
+		weightsSection.shape[0],
+	);
+
+	const table = (name: string) => {
+		const section = header.sections[name];
+		if (!section || section.dtype !== "int32") {
+			throw new Error(`Bundle has no int32 table '${name}'`);
+		}
+		return section;
+	};
+
+	const column = (name: string, tableName = "dataset") => {
+		const section = table(tableName);
+		const index = header.columns.indexOf(name);
+		if (index < 0) throw new Error(`Bundle has no column '${name}'`);
+		const stride = section.shape[1];
+		return new Int32Array(
+			bytes.buffer,
+			bytes.byteOffset + section.offset + index * stride * 4,
+			section.rows,
+		);
+	};
+
+	return {
+		header,
+		weights,
+		column,
+		rowCount: (tableName = "dataset") => table(tableName).rows,
+		rows(tableName = "dataset") {
+			const n = table(tableName).rows;
+			const columns = header.columns.map((name) => column(name, tableName));
+			const out: number[][] = new Array(n);
+			for (let r = 0; r < n; r++) {
+				const row = new Array<number>(columns.length);
+				for (let c = 0; c < columns.length; c++) row[c] = columns[c]![r]!;
+				out[r] = row;
+			}
+			return out;
+		},
+	};
+}
+
+/** Memory-map a bundle file */
+export function readBundle(filePath: string): Bundle {
+	return parseBundle(Bun.mmap(filePath));
+}
@@ -4,7 +4,13 @@ import type { FairnessFile, PathsFile } from "./artifacts";
 import type { ContractClient } from "./contract";
 import { generateAllMerkleProofs, merkleRoot } from "./merkle";
 import type { CommitOptions } from "./types";
-import { getArtifactDir, parseCSV, weightsToFields } from "./utils";
+import {
+	getArtifactDir,
+	readDatasetRows,
+	readWeights,
+	sourceSha256,
+	weightsToFields,
+} from "./utils";
 
 const FIELD_MODULUS =
 	21888242871839275222246405745257275088548364400416034343698204186575808495617n;
@@ -18,14 +24,15 @@ export class CommitAPI {
 		fairnessThresholdPath: string,
 		options: CommitOptions,
 	): Promise<Hash> {
-		const datasetRows = await parseCSV(dataSetPath);
-		const weights = await Bun.file(weightsPath).arrayBuffer();
+		// Either may be a model bundle (model.zkfb) instead of CSV/weights.bin
+		const datasetRows = await readDatasetRows(dataSetPath);
+		const weights = await readWeights(weightsPath);
 		const fairnessThreshold = (await Bun.file(
 			fairnessThresholdPath,
 		).json()) as FairnessFile;
 
 		// Compute weights hash first (used for cache directory)
-		const weightsHash = await this.hashWeights(new Uint8Array(weights));
+		const weightsHash = await this.hashWeights(weights);
 
 		// Check for cached commitments
 		const cachedData = await this.loadCachedCommitments(
@@ -60,7 +67,7 @@ export class CommitAPI {
 
 			const commitments = await this.getCommitments(
 				datasetRows,
-				new Uint8Array(weights),
+				weights,
 				masterSalt,
 				weightsHash, // Pass already-computed hash to avoid recomputation
 			);
@@ -122,6 +129,8 @@ export class CommitAPI {
 	 * Uses SHA-256 only (circuit receives pre-computed salts from salts.json).
 	 * Outputs integer representation (first 31 bytes as Field element)
 	 * master_salt = SHA-256(weights_hash || dataset_hash || metadata_hash)
+	 * For a model bundle the weights and dataset hashes are those of its
+	 * source files, so a config-only rebuild keeps the salts and the root.
 	 */
 	private async generateMasterSalt(
 		weightsPath: string,
@@ -129,13 +138,8 @@ export class CommitAPI {
 		metadata: CommitOptions["model"],
 	): Promise<string> {
 		// Hash each file/data independently
-		const weightsBuffer = await Bun.file(weightsPath).arrayBuffer();
-		const weightsHashBuf = await crypto.subtle.digest("SHA-256", weightsBuffer);
-		const weightsHash = Buffer.from(weightsHashBuf).toString("hex");
-
-		const datasetBuffer = await Bun.file(datasetPath).arrayBuffer();
-		const datasetHashBuf = await crypto.subtle.digest("SHA-256", datasetBuffer);
-		const datasetHash = Buffer.from(datasetHashBuf).toString("hex");
+		const weightsHash = await sourceSha256(weightsPath, "weights");
+		const datasetHash = await sourceSha256(datasetPath, "dataset");
 
 		const metadataString = JSON.stringify({
 			name: metadata.name,
@@ -231,8 +235,8 @@ export class CommitAPI {
 	}
 
 	private async getCommitments(
-		datasetRows: string[][],
-		weights: Uint8Array,
+		datasetRows: Array<Array<string | number>>,
+		weights: Float32Array,
 		masterSalt: string,
 		weightsHash?: Hash,
 	): Promise<{
@@ -371,10 +375,7 @@ export class CommitAPI {
 		console.log(` Artifacts saved to ${dir}`);
 	}
 
-	private async hashWeights(weightsBuffer: Uint8Array): Promise<Hash> {
-		// Parse binary weights file (float32 array)
-		const weightsFloat32 = new Float32Array(weightsBuffer.buffer);
-
+	private async hashWeights(weightsFloat32: Float32Array): Promise<Hash> {
 		// Convert to Field array
 		const weightsFields = await weightsToFields(weightsFloat32);
 
@@ -13,7 +13,13 @@ import {
 } from "./artifacts";
 import { getDefaultConfig } from "./config";
 import type { ContractClient } from "./contract";
-import { getArtifactDir, parseCSV, weightsToFields } from "./utils";
+import {
+	getArtifactDir,
+	readDatasetRows,
+	readWeights,
+	signedToField,
+	weightsToFields,
+} from "./utils";
 
 export class ProofAPI {
 	private readonly attestationUrl: string;
@@ -42,9 +48,8 @@ export class ProofAPI {
 		const paths = parsePathsFile(rawPaths);
 
 		// Load dataset & weights
-		const weights_data = await Bun.file(paths.weights).arrayBuffer();
-		const weightsFields = await weightsToFields(new Float32Array(weights_data));
-		const dataset = await parseCSV(paths.dataset);
+		const weightsFields = await weightsToFields(await readWeights(paths.weights));
+		const dataset = await readDatasetRows(paths.dataset);
 
 		const salts = (await Bun.file(`${dir}/salts.json`).json()) as Record<
 			number,
@@ -85,8 +90,8 @@ export class ProofAPI {
 			_dataset_sensitive_attrs: dataset.map((row) =>
 				String(row[thresholds.protectedAttributeIndex] ?? "0"),
 			),
-			_threshold_group_a: String(thresholds.thresholds.group_a),
-			_threshold_group_b: String(thresholds.thresholds.group_b),
+			_threshold_group_a: String(signedToField(thresholds.thresholds.group_a)),
+			_threshold_group_b: String(signedToField(thresholds.thresholds.group_b)),
 			_dataset_salts: Object.values(salts),
 			_merkle_paths: merklePathsDecimal,
 			_is_even_flags: merkleProofs.isEvenFlags,
@@ -0,0 +1,158 @@
+import { describe, expect, it } from "bun:test";
+import path from "node:path";
+import {
+	BUNDLE_MAGIC,
+	BUNDLE_VERSION,
+	isBundle,
+	parseBundle,
+	readBundle,
+} from "../bundle";
+import { parseCSV, readDatasetRows, readWeights } from "../utils";
+
+const fixture = (name: string) => path.join(import.meta.dir, "fixtures", name);
+
+// Same layout as examples/adult-income/bundle.py writes
+function makeBundle(
+	columns: string[],
+	rows: number[][],
+	weights: number[],
+): Uint8Array {
+	const align = (n: number) => Math.ceil(n / 64) * 64;
+	const stride = Math.ceil(rows.length / 16) * 16;
+	const dataStart = 256;
+	const weightsOffset = dataStart;
+	const datasetOffset = align(weightsOffset + weights.length * 4);
+	const fairnessOffset = align(datasetOffset + columns.length * stride * 4);
+	const fairness = new TextEncoder().encode(
+		JSON.stringify({ targetDisparity: 0.1 }),
+	);
+	const header = {
+		columns,
+		label: columns[columns.length - 1],
+		features: columns.length - 1,
+		protectedAttribute: "sex",
+		protectedAttributeIndex: 1,
+		labelEncoders: null,
+		sourceHashes: {},
+		sections: {
+			weights: { offset: weightsOffset, dtype: "float32", shape: [weights.length] },
+			dataset: {
+				offset: datasetOffset,
+				dtype: "int32",
+				shape: [columns.length, stride],
+				rows: rows.length,
+			},
+			fairness: { offset: fairnessOffset, dtype: "json" },
+		},
+	};
+	const headerBytes = new TextEncoder().encode(JSON.stringify(header));
+	expect(16 + headerBytes.length).toBeLessThanOrEqual(dataStart);
+
+	const bytes = new Uint8Array(fairnessOffset + fairness.length);
+	const view = new DataView(bytes.buffer);
+	for (let i = 0; i < BUNDLE_MAGIC.length; i++) {
+		bytes[i] = BUNDLE_MAGIC.charCodeAt(i);
+	}
+	view.setUint32(8, BUNDLE_VERSION, true);
+	view.setUint32(12, headerBytes.length, true);
+	bytes.set(headerBytes, 16);
+	bytes.set(fairness, fairnessOffset);
+	weights.forEach((w, i) => view.setFloat32(weightsOffset + i * 4, w, true));
+	rows.forEach((row, r) =>
+		row.forEach((value, c) =>
+			view.setInt32(datasetOffset + (c * stride + r) * 4, value, true),
+		),
+	);
+	return bytes;
+}
+
+describe("Model bundle", () => {
+	const columns = ["age", "sex", "income"];
+	const rows = [
+		[90, 0, 0],
+		[38, 1, 1],
+		[-5, 1, 0],
+	];
+	const weights = [0.5, -1.25, 0.75];
+
+	it("reads weights and rows without copying", () => {
+		const bundle = parseBundle(makeBundle(columns, rows, weights));
+
+		expect(Array.from(bundle.weights)).toEqual(weights);
+		expect(bundle.rowCount()).toBe(3);
+		expect(bundle.rows()).toEqual(rows);
+		expect(Array.from(bundle.column("age"))).toEqual([90, 38, -5]);
+		expect(bundle.header.protectedAttributeIndex).toBe(1);
+		expect(bundle.header.fairness).toEqual({ targetDisparity: 0.1 });
+	});
+
+	it("rejects files that are not bundles", () => {
+		const csv = new TextEncoder().encode("age,sex,income\n90,0,0\n");
+		expect(isBundle(csv)).toBe(false);
+		expect(() => parseBundle(csv)).toThrow("bad magic");
+	});
+
+	it("rejects unknown versions", () => {
+		const bytes = makeBundle(columns, rows, weights);
+		new DataView(bytes.buffer).setUint32(8, BUNDLE_VERSION + 1, true);
+		expect(() => parseBundle(bytes)).toThrow("not supported");
+	});
+});
+
+// tests/fixtures/model.zkfb: bundle.py over dataset.csv and weights.bin
+describe("Bundle written by bundle.py", () => {
+	it("holds the rows of its CSV", async () => {
+		const csv = (await parseCSV(fixture("dataset.csv"))).map((row) =>
+			row.map(Number),
+		);
+		const bundle = readBundle(fixture("model.zkfb"));
+
+		expect(bundle.rowCount()).toBe(csv.length);
+		expect(bundle.rows()).toEqual(csv);
+		expect(bundle.rows("calibration")).toEqual(csv);
+		expect(await readDatasetRows(fixture("model.zkfb"))).toEqual(csv);
+	});
+
+	it("holds the weights of its weights.bin", async () => {
+		const weights = await readWeights(fixture("weights.bin"));
+
+		expect(Array.from(await readWeights(fixture("model.zkfb")))).toEqual(
+			Array.from(weights),
+		);
+	});
+
+	it("reads the header bundle.py writes", async () => {
+		const { header } = readBundle(fixture("model.zkfb"));
+		const csvHeader = (await Bun.file(fixture("dataset.csv")).text())
+			.split("\n")[0]
+			?.split(",");
+
+		expect(header.columns).toEqual(csvHeader);
+		expect(header.label).toBe("income");
+		expect(header.protectedAttribute).toBe("sex");
+		expect(header.protectedAttributeIndex).toBe(9);
+		expect(header.sources).toEqual({
+			weights: "weights.bin",
+			dataset: "dataset.csv",
+			calibration: "dataset.csv",
+		});
+	});
+
+	it("only differs in the fairness section after a threshold change", async () => {
+		const bundle = readBundle(fixture("model.zkfb"));
+		const retuned = readBundle(fixture("model_retuned.zkfb"));
+		const offset = bundle.header.sections.fairness!.offset;
+		const bytes = (name: string) => Bun.file(fixture(name)).bytes();
+
+		expect(retuned.header).toEqual({
+			...bundle.header,
+			fairness: retuned.header.fairness,
+		});
+		expect((await bytes("model_retuned.zkfb")).subarray(0, offset)).toEqual(
+			(await bytes("model.zkfb")).subarray(0, offset),
+		);
+		expect(retuned.header.fairness).toEqual(
+			await Bun.file(fixture("fairness_threshold_retuned.json")).json(),
+		);
+	});
+});
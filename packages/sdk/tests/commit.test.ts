@@ -0,0 +1,86 @@
+import { describe, expect, it } from "bun:test";
+import path from "node:path";
+import { CommitAPI } from "../commit";
+import type { ContractClient } from "../contract";
+import type { CommitOptions } from "../types";
+import { readDatasetRows, readWeights, sourceSha256 } from "../utils";
+
+// Written by examples/adult-income/bundle.py from weights.bin and dataset.csv;
+// model_retuned.zkfb only differs in its fairness thresholds
+const fixture = (name: string) => path.join(import.meta.dir, "fixtures", name);
+
+const metadata: CommitOptions["model"] = {
+	name: "Adult Income Prediction Model",
+	description: "fixture",
+	creator: "",
+	inferenceUrl: "http://localhost:5000",
+};
+
+// The salt and root steps of makeCommitment, private to CommitAPI
+interface CommitSteps {
+	generateMasterSalt(
+		weightsPath: string,
+		datasetPath: string,
+		metadata: CommitOptions["model"],
+	): Promise<string>;
+	getCommitments(
+		datasetRows: Array<Array<string | number>>,
+		weights: Float32Array,
+		masterSalt: string,
+	): Promise<{ dataSetMerkleRoot: string }>;
+}
+
+async function commitment(datasetPath: string, weightsPath: string) {
+	// The contracts are only needed to register the model
+	const api = new CommitAPI({} as ContractClient) as unknown as CommitSteps;
+	const masterSalt = await api.generateMasterSalt(
+		weightsPath,
+		datasetPath,
+		metadata,
+	);
+	const { dataSetMerkleRoot } = await api.getCommitments(
+		await readDatasetRows(datasetPath),
+		await readWeights(weightsPath),
+		masterSalt,
+	);
+	return { masterSalt, dataSetMerkleRoot };
+}
+
+describe("Commitment master salt", () => {
+	it("hashes a bundle's sections like their source files", async () => {
+		for (const [section, source] of [
+			["weights", "weights.bin"],
+			["dataset", "dataset.csv"],
+		] as const) {
+			expect(await sourceSha256(fixture("model.zkfb"), section)).toBe(
+				await sourceSha256(fixture(source), section),
+			);
+		}
+	});
+
+	it("keeps the root when only the thresholds are rebuilt", async () => {
+		const bundle = await commitment(
+			fixture("model.zkfb"),
+			fixture("model.zkfb"),
+		);
+		const retuned = await commitment(
+			fixture("model_retuned.zkfb"),
+			fixture("model_retuned.zkfb"),
+		);
+
+		expect(retuned).toEqual(bundle);
+	});
+
+	it("commits a bundle to the same root as its CSV and weights.bin", async () => {
+		const bundle = await commitment(
+			fixture("model.zkfb"),
+			fixture("model.zkfb"),
+		);
+		const files = await commitment(
+			fixture("dataset.csv"),
+			fixture("weights.bin"),
+		);
+
+		expect(bundle).toEqual(files);
+	});
+});
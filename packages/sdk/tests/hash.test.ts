@@ -1,6 +1,11 @@
 import { describe, expect, it } from "bun:test";
 import { poseidon2 } from "poseidon-lite";
-import { hashBytes, hashPoseidonFields } from "../utils";
+import {
+	hashBytes,
+	hashPoseidonFields,
+	signedToField,
+	weightsToFields,
+} from "../utils";
 
 describe("Poseidon compatibility with Noir", () => {
 	it("matches Noir circuit hash for [1, 2]", () => {
@@ -119,3 +124,16 @@ fn test_adult_income_row_hash() {
 }
 
  */
+
+describe("Signed field encoding", () => {
+	const MAX_FIELD = (1n << 253n) - 1n;
+
+	it("wraps negative thresholds like negative weights", async () => {
+		// student-performance's group A threshold at THRESHOLD_SCALE
+		expect(signedToField(-10597)).toBe(MAX_FIELD - 10597n);
+		expect(signedToField(16751)).toBe(16751n);
+		expect(await weightsToFields([-0.010597])).toEqual([
+			signedToField(-10597),
+		]);
+	});
+});
@@ -10,6 +10,7 @@ export default defineConfig({
 		"merkle.ts",
 		"hash.ts",
 		"utils.ts",
+		"bundle.ts",
 		"dispute",
 		"schema/index.ts",
 		"provider.ts",
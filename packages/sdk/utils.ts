@@ -20,6 +20,7 @@ import {
 	poseidon16,
 } from "poseidon-lite";
 import type { Hash } from "viem";
+import { isBundle, readBundle } from "./bundle";
 
 /**
  * Call the appropriate Poseidon hash function based on input length
@@ -79,6 +80,51 @@ export async function parseCSV(filePath: string): Promise<string[][]> {
 	return dataRows;
 }
 
+/**
+ * Dataset rows from an encoded CSV or a model bundle (model.zkfb).
+ * Bundles are memory-mapped and read from their int32 columns, with no text parsing.
+ */
+export async function readDatasetRows(
+	filePath: string,
+): Promise<Array<Array<string | number>>> {
+	if (await isBundleFile(filePath)) return readBundle(filePath).rows();
+	return parseCSV(filePath);
+}
+
+/**
+ * Model weights from a headerless float32 weights.bin or a model bundle
+ */
+export async function readWeights(filePath: string): Promise<Float32Array> {
+	if (await isBundleFile(filePath)) return readBundle(filePath).weights;
+	return new Float32Array(await Bun.file(filePath).arrayBuffer());
+}
+
+/**
+ * SHA-256 (hex) of a weights.bin or dataset CSV. For a model bundle, the hash
+ * of the file its `section` was built from (header.sourceHashes), so a bundle
+ * hashes like its sources and not like the whole file, config included.
+ */
+export async function sourceSha256(
+	filePath: string,
+	section: "weights" | "dataset",
+): Promise<string> {
+	if (await isBundleFile(filePath)) {
+		const hash = readBundle(filePath).header.sourceHashes[section];
+		if (!hash) throw new Error(`Bundle has no source hash for '${section}'`);
+		return hash;
+	}
+	const digest = await crypto.subtle.digest(
+		"SHA-256",
+		await Bun.file(filePath).arrayBuffer(),
+	);
+	return Buffer.from(digest).toString("hex");
+}
+
+async function isBundleFile(filePath: string): Promise<boolean> {
+	const head = await Bun.file(filePath).slice(0, 16).arrayBuffer();
+	return isBundle(new Uint8Array(head));
+}
+
 export function bytesToHash(bytes: Uint8Array): Hash {
 	return `0x${[...bytes].map((b) => b.toString(16).padStart(2, "0")).join("")}` as Hash;
 }
@@ -139,23 +185,30 @@ export async function weightsToFields(
 	weightsFloat32: Float32Array | number[],
 ): Promise<bigint[]> {
 	const SCALE = 1_000_000n;
-	const MAX_FIELD = (1n << 253n) - 1n; // BN254 field size
 
 	const fieldsArray: bigint[] = [];
 	for (const weight of weightsFloat32) {
 		// Scale to fixed-point integer
-		const scaled = BigInt(Math.round(weight * Number(SCALE)));
-		// Ensure it fits in field
-		const field =
-			scaled >= 0n
-				? scaled % MAX_FIELD
-				: (MAX_FIELD + (scaled % MAX_FIELD)) % MAX_FIELD;
-		fieldsArray.push(field);
+		fieldsArray.push(signedToField(Math.round(weight * Number(SCALE))));
 	}
 
 	return fieldsArray;
 }
 
+/**
+ * A signed fixed-point integer as a field element, negatives wrapped below
+ * 2^253 - 1 as for the weights. Used for the weights and the per-group
+ * thresholds of fairness_threshold.json, which may be negative logits.
+ */
+export function signedToField(value: number | bigint): bigint {
+	const MAX_FIELD = (1n << 253n) - 1n; // BN254 field size
+	const scaled = BigInt(value);
+	// Ensure it fits in field
+	return scaled >= 0n
+		? scaled % MAX_FIELD
+		: (MAX_FIELD + (scaled % MAX_FIELD)) % MAX_FIELD;
+}
+
 /**
  * Hash field elements directly using Poseidon (ZK-friendly)
  * Converts numeric values to field elements with fixed-point scaling for floats